@@ -0,0 +1,61 @@
+import sys
+sys.path.append('../')
+from util import draw_ellipse, draw_ball_circle, draw_camera_movement_panel, draw_speed_and_distance_label, profile
+
+class AnnotationRenderer:
+    # Draws every overlay in one pass over the video instead of one pass per stage
+    def __init__(self, copy_frames=False):
+        # With copy_frames=False the frames are drawn on in place, so there is no copy at all
+        self.copy_frames = copy_frames
+        self.player_color = (0,0,255)
+        self.referee_color = (255,0,255)
+        self.ball_color = (255,255,255)
+        self.panel_alpha = 0.6
+
+    def draw_frame(self, frame, frame_num, tracks, camera_movement_per_frame=None):
+        with profile('draw', 1):
+            if self.copy_frames:
+                frame = frame.copy()
+
+            # Draw Players, their speed and distance go on top after the panel
+            player_dict = tracks["players"][frame_num]
+            for track_id, player in player_dict.items():
+                # Give Players their team colors
+                color = player.get("team_color", self.player_color)
+                draw_ellipse(frame, player["bbox"], color, track_id)
+
+            # Draw Refs
+            for _, ref in tracks["referees"][frame_num].items():
+                draw_ellipse(frame, ref["bbox"], self.referee_color)
+
+            # Draw Ball
+            for _, ball in tracks["ball"][frame_num].items():
+                draw_ball_circle(frame, ball["bbox"], self.ball_color)
+
+            # Draw Camera Movement
+            if camera_movement_per_frame is not None:
+                draw_camera_movement_panel(frame, camera_movement_per_frame[frame_num], self.panel_alpha)
+
+            # Draw Speed and Distance
+            for _, player in player_dict.items():
+                speed = player.get('speed', None)
+                distance = player.get('distance', None)
+                if speed is None or distance is None:
+                    continue
+                draw_speed_and_distance_label(frame, player["bbox"], speed, distance)
+
+            return frame
+
+    def render(self, video_frames, tracks, camera_movement_per_frame=None):
+        # Generator, so the frames can go straight to save_video without building a list
+        for frame_num, frame in enumerate(video_frames):
+            yield self.draw_frame(frame, frame_num, tracks, camera_movement_per_frame)
+
+    def render_to_writer(self, video_frames, tracks, writer, camera_movement_per_frame=None):
+        # writer is anything with a write(frame) method like cv2.VideoWriter
+        frame_count = 0
+        for frame in self.render(video_frames, tracks, camera_movement_per_frame):
+            writer.write(frame)
+            frame_count += 1
+
+        return frame_count
@@ -0,0 +1,247 @@
+# Analyzes many clips at once, run from the AI folder:
+#   python batch.py video/ --model models/basketbal_computer_vision.pt --workers 2
+#   python batch.py games.txt --output-dir batch_output --mode pipelined
+# Inputs are video files, folders of videos or manifests (.txt with one path per line, or .json)
+# Every clip gets its own folder in --output-dir, clips that finished before are skipped
+# Heavy imports (torch, ultralytics) only happen in the workers, see init_worker
+import argparse
+import json
+import multiprocessing
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.m4v')
+DONE_MARKER = 'done.json'
+
+# Set in every worker process by init_worker
+worker_tracker = None
+worker_options = None
+worker_error = None
+
+
+def read_manifest(path):
+    # .json: a list of paths or of {"video": path, "name": name}, anything else: one path per line, # comments
+    base_dir = os.path.dirname(os.path.abspath(path))
+    if path.lower().endswith('.json'):
+        with open(path) as f:
+            entries = json.load(f)
+    else:
+        with open(path) as f:
+            entries = [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
+
+    jobs = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {'video': entry}
+        video = entry['video'] if os.path.isabs(entry['video']) else os.path.join(base_dir, entry['video'])
+        jobs.append({'video': video, 'name': entry.get('name')})
+    return jobs
+
+
+def collect_jobs(inputs):
+    jobs = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for file_name in sorted(os.listdir(path)):
+                if file_name.lower().endswith(VIDEO_EXTENSIONS):
+                    jobs.append({'video': os.path.join(path, file_name), 'name': None})
+        elif path.lower().endswith(VIDEO_EXTENSIONS):
+            jobs.append({'video': path, 'name': None})
+        elif os.path.exists(path):
+            jobs.extend(read_manifest(path))
+        else:
+            print(f"Warning: {path} doesn't exist, skipped")
+
+    # Job names are the output folder names, they have to be unique
+    seen = {}
+    for job in jobs:
+        name = job['name'] or os.path.splitext(os.path.basename(job['video']))[0]
+        seen[name] = seen.get(name, 0) + 1
+        job['name'] = name if seen[name] == 1 else f"{name}_{seen[name]}"
+    return jobs
+
+
+def get_video_signature(video_path):
+    # A finished job is only skipped while the video is the same file
+    stat = os.stat(video_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def is_job_done(job_dir, video_path):
+    marker_path = os.path.join(job_dir, DONE_MARKER)
+    if not os.path.exists(marker_path) or not os.path.exists(video_path):
+        return False
+    try:
+        with open(marker_path) as f:
+            marker = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return marker.get('video_signature') == get_video_signature(video_path)
+
+
+def init_worker(model_path, options, threads_per_worker):
+    # Runs once per process, the model is loaded here and reused for every job of the worker
+    global worker_tracker, worker_options, worker_error
+    worker_options = options
+    if threads_per_worker:
+        # Workers share the CPU, without this every one of them starts a thread per core
+        for variable in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+            os.environ[variable] = str(threads_per_worker)
+        import cv2
+        cv2.setNumThreads(threads_per_worker)
+
+    # An exception here would kill the pool, the jobs report it instead
+    try:
+        from trackers import Tracker
+        from view_transformer import ViewTransformer
+
+        court_roi = ViewTransformer().get_court_roi() if options['court_roi'] else None
+        worker_tracker = Tracker(model_path, backend=options['backend'], keyframe_interval=options['keyframe_interval'],
+                                 court_roi=court_roi)
+    except Exception as e:
+        worker_error = f"Loading the model failed: {type(e).__name__}: {e}"
+
+
+def run_job(job, model_path, output_dir):
+    if worker_error is not None:
+        return {'name': job['name'], 'video': job['video'], 'status': 'failed', 'error': worker_error, 'seconds': 0.0, 'pid': os.getpid()}
+
+    from main import analyze_video
+
+    job_dir = os.path.join(output_dir, job['name'])
+    os.makedirs(job_dir, exist_ok=True)
+    start = time.perf_counter()
+    try:
+        summary = analyze_video(job['video'], model_path,
+                                output_video_path=os.path.join(job_dir, 'analyzed.avi'),
+                                output_tracks_path=os.path.join(job_dir, 'analyzed.tracks'),
+                                output_report_dir=os.path.join(job_dir, 'reports'),
+                                streaming=worker_options['mode'] == 'streaming',
+                                pipelined=worker_options['mode'] == 'pipelined',
+                                tracker=worker_tracker,
+                                cache_dir=worker_options['cache_dir'],
+                                profile_dir=os.path.join(job_dir, 'profile') if worker_options['profile'] else None,
+                                cprofile_stage=worker_options['cprofile_stage'],
+                                database_path=worker_options['database'], game_name=job['name'])
+    except Exception as e:
+        return {'name': job['name'], 'video': job['video'], 'status': 'failed', 'error': f"{type(e).__name__}: {e}",
+                'traceback': traceback.format_exc(), 'seconds': time.perf_counter() - start, 'pid': os.getpid()}
+
+    result = {'name': job['name'], 'video': job['video'], 'status': 'done', 'frames': summary['frames'],
+              'seconds': summary['seconds'], 'fps': summary['fps'], 'outputs': summary['outputs'], 'pid': os.getpid(),
+              'video_signature': get_video_signature(job['video'])}
+
+    # The marker goes last, a job without it runs again next time
+    with open(os.path.join(job_dir, DONE_MARKER), 'w') as f:
+        json.dump(result, f, indent=4)
+    return result
+
+
+def run_batch_jobs(jobs, model_path, output_dir, workers=1, mode='batch', backend='auto', keyframe_interval=1,
+                   court_roi=False, cache_dir='cache', force=False, profile=False, cprofile_stage=None, database=None):
+    os.makedirs(output_dir, exist_ok=True)
+    start = time.perf_counter()
+
+    results = []
+    pending = []
+    for job in jobs:
+        if not force and is_job_done(os.path.join(output_dir, job['name']), job['video']):
+            print(f"Skipping {job['name']}, already done")
+            results.append({'name': job['name'], 'video': job['video'], 'status': 'skipped'})
+        else:
+            pending.append(job)
+
+    if pending:
+        options = {'mode': mode, 'backend': backend, 'keyframe_interval': keyframe_interval,
+                   'court_roi': court_roi, 'cache_dir': cache_dir,
+                   'profile': profile or cprofile_stage is not None, 'cprofile_stage': cprofile_stage,
+                   'database': os.path.abspath(database) if database else None}
+        workers = max(1, min(workers, len(pending)))
+        threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+
+        # spawn, forking a process that already started torch or OpenCV threads can hang
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker,
+                                 initargs=(model_path, options, threads_per_worker)) as executor:
+            futures = {executor.submit(run_job, job, model_path, output_dir): job for job in pending}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # The worker process itself died, e.g. killed for running out of memory
+                    result = {'name': job['name'], 'video': job['video'], 'status': 'failed', 'error': f"{type(e).__name__}: {e}"}
+
+                results.append(result)
+                if result['status'] == 'done':
+                    print(f"Done {result['name']}: {result['frames']} frames in {result['seconds']:.1f}s ({result['fps']:.1f} fps)")
+                else:
+                    print(f"Failed {result['name']}: {result['error']}")
+
+    summary = get_summary(results, time.perf_counter() - start, workers)
+    with open(os.path.join(output_dir, 'summary.json'), 'w') as f:
+        json.dump(summary, f, indent=4)
+    return summary
+
+
+def get_summary(results, seconds, workers):
+    done = [result for result in results if result['status'] == 'done']
+    frames = sum(result['frames'] for result in done)
+    return {
+        'jobs': len(results),
+        'done': len(done),
+        'skipped': sum(result['status'] == 'skipped' for result in results),
+        'failed': sum(result['status'] == 'failed' for result in results),
+        'workers': workers,
+        'frames': frames,
+        'seconds': seconds,
+        'fps': frames / seconds if seconds > 0 else 0.0,
+        'job_seconds': sum(result['seconds'] for result in done),
+        'failures': [{'name': result['name'], 'video': result['video'], 'error': result['error']}
+                     for result in results if result['status'] == 'failed'],
+        'results': results
+    }
+
+
+def print_summary(summary):
+    print(f"Jobs: {summary['jobs']} ({summary['done']} done, {summary['skipped']} skipped, {summary['failed']} failed)")
+    print(f"Frames: {summary['frames']} in {summary['seconds']:.1f}s with {summary['workers']} workers ({summary['fps']:.1f} fps)")
+    for failure in summary['failures']:
+        print(f"  {failure['name']}: {failure['error']}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Analyze many clips in parallel")
+    parser.add_argument('inputs', nargs='+', help="video files, folders of videos or manifests")
+    parser.add_argument('--model', default='models/basketbal_computer_vision.pt')
+    parser.add_argument('--output-dir', default='batch_output')
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 4))
+    parser.add_argument('--mode', choices=['batch', 'streaming', 'pipelined'], default='streaming',
+                        help="batch keeps the whole clip in memory, streaming and pipelined only a window")
+    parser.add_argument('--backend', default='auto', help="auto, torch, onnx or openvino")
+    parser.add_argument('--keyframe-interval', type=int, default=1, help="only with --mode batch")
+    parser.add_argument('--court-roi', action='store_true')
+    parser.add_argument('--cache-dir', default='cache')
+    parser.add_argument('--force', action='store_true', help="also rerun clips that are already done")
+    parser.add_argument('--profile', action='store_true', help="write run_report.json and metrics.prom per clip")
+    parser.add_argument('--cprofile-stage', help="also run this stage under cProfile, e.g. detect or draw")
+    parser.add_argument('--database', help="also add every clip to this game database (SQLite file)")
+    args = parser.parse_args()
+
+    if args.keyframe_interval > 1 and args.mode != 'batch':
+        # streaming and pipelined detect every frame, the interval would be ignored
+        parser.error("--keyframe-interval needs --mode batch")
+
+    jobs = collect_jobs(args.inputs)
+    if not jobs:
+        parser.error("no videos found")
+
+    summary = run_batch_jobs(jobs, args.model, args.output_dir, workers=args.workers, mode=args.mode,
+                             backend=args.backend, keyframe_interval=args.keyframe_interval,
+                             court_roi=args.court_roi, cache_dir=args.cache_dir, force=args.force,
+                             profile=args.profile, cprofile_stage=args.cprofile_stage, database=args.database)
+    print_summary(summary)
+    if summary['failed']:
+        raise SystemExit(1)
@@ -0,0 +1,134 @@
+# Game database on a synthetic season: time to add games and to answer per player / season queries
+# Run from the AI folder:
+#   python benchmarks/bench_database.py                  20 games of 2 minutes
+#   python benchmarks/bench_database.py --games 60 --minutes 10
+# The same season questions are also answered the old way, by loading every game's pickled tracks
+import argparse
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'Database'))
+from synthetic import SyntheticGame, copy_tracks
+from db import GameDatabase
+from trackers import Tracker
+from view_transformer import ViewTransformer
+from speed_and_distance_estimator import SpeedAndDistance_Estimator
+from scouting_report_generator import ReportAggregator
+from track_store import TrackStore
+
+
+def make_game_tracks(game_num, number_of_frames, fps):
+    # Tracks with positions, court coordinates and speeds, without rendering any frames
+    game = SyntheticGame(number_of_frames=number_of_frames, width=640, height=360, fps=fps, seed=game_num)
+    tracks = copy_tracks(game.tracks)
+    Tracker.__new__(Tracker).add_position_to_tracks(tracks)
+    camera_movement = game.get_camera_movement()
+    offset = np.cumsum(np.asarray(camera_movement), axis=0)
+    for object_tracks in tracks.values():
+        for frame_num, frame_tracks in enumerate(object_tracks):
+            for track_info in frame_tracks.values():
+                track_info['position_adjusted'] = (np.asarray(track_info['position']) + offset[frame_num]).tolist()
+    ViewTransformer().add_transformed_position_to_tracks(tracks)
+    SpeedAndDistance_Estimator(frame_rate=fps).add_speed_and_distance_to_tracks(tracks)
+    for frame_tracks in tracks['players']:
+        for player_id, track_info in frame_tracks.items():
+            track_info['team'] = 1 + player_id % 2
+    return tracks, camera_movement
+
+
+def timed(fn, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, float(np.median(times))
+
+
+def main(args):
+    work_dir = tempfile.mkdtemp(prefix='bench_database_')
+    try:
+        number_of_frames = int(args.minutes * 60 * args.fps)
+        db = GameDatabase(os.path.join(work_dir, 'season.db'))
+        pickle_paths = []
+        ingest_seconds = []
+        rows = 0
+
+        for game_num in range(args.games):
+            tracks, camera_movement = make_game_tracks(game_num, number_of_frames, args.fps)
+            if args.track_store:
+                tracks = TrackStore.from_tracks(tracks)
+            aggregator = ReportAggregator(min_frames=0, fps=args.fps)
+            aggregator.add_tracks(tracks)
+            name = f"game {game_num:03d}"
+
+            start = time.perf_counter()
+            db.ingest_game(name, tracks, fps=args.fps, camera_movement=camera_movement, report=aggregator.get_report(),
+                           season='synthetic', played_on=f"2025-01-{1 + game_num % 28:02d}")
+            ingest_seconds.append(time.perf_counter() - start)
+            rows += sum(len(frame_tracks) for object_tracks in tracks.values() for frame_tracks in object_tracks)
+
+            # The synthetic games use the same track ids for the same players
+            for track_id in range(1, 11):
+                db.assign_player(name, track_id, f"Player {track_id}")
+
+            path = os.path.join(work_dir, f"{name}.pkl")
+            with open(path, 'wb') as f:
+                pickle.dump(tracks if not args.track_store else tracks.to_tracks(), f)
+            pickle_paths.append(path)
+
+        print(f"{args.games} games of {number_of_frames} frames, {rows} positions, "
+              f"database {os.path.getsize(os.path.join(work_dir, 'season.db')) / 1024**2:.1f} MB")
+        print(f"Add a game: {np.median(ingest_seconds) * 1000:.0f} ms median "
+              f"({rows / sum(ingest_seconds):,.0f} positions/s)")
+
+        game = f"game {args.games // 2:03d}"
+        queries = [
+            ("30 s of one player", lambda: db.get_track_frames(game, 3, start_time=60, end_time=90)),
+            ("one frame", lambda: db.get_frame(game, number_of_frames // 2)),
+            ("season per player", lambda: db.get_season_player_stats('synthetic')),
+            ("season per game", lambda: db.get_season_game_stats('synthetic')),
+            ("one player's games", lambda: db.get_player_games('Player 3')),
+            ("game report", lambda: db.get_report(game)),
+        ]
+        print(f"{'query':<22} {'ms':>8} {'rows':>6}")
+        for name, query in queries:
+            result, seconds = timed(query)
+            print(f"{name:<22} {seconds * 1000:>8.2f} {len(result):>6}")
+
+        # The season per player question without the database: load every game and sum the distances
+        def from_pickles():
+            totals = {}
+            for path in pickle_paths:
+                with open(path, 'rb') as f:
+                    tracks = pickle.load(f)
+                aggregator = ReportAggregator(min_frames=0, fps=args.fps)
+                aggregator.add_tracks(tracks)
+                for player_id, player in aggregator.players.items():
+                    totals[player_id] = totals.get(player_id, 0.0) + player.distance
+            return totals
+
+        totals, seconds = timed(from_pickles, repeat=1)
+        season = {row['player']: row['total_distance'] for row in db.get_season_player_stats('synthetic')}
+        same = all(abs(season[f"Player {player_id}"] - distance) < 1e-6 for player_id, distance in totals.items())
+        print(f"{'season from pickles':<22} {seconds * 1000:>8.2f} {len(totals):>6}   same totals: {same}")
+        db.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return 0 if same else 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Game database on a synthetic season")
+    parser.add_argument('--games', type=int, default=20)
+    parser.add_argument('--minutes', type=float, default=2)
+    parser.add_argument('--fps', type=int, default=24)
+    parser.add_argument('--track-store', action='store_true', help="add the games from TrackStores")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,183 @@
+# Startup time of the entry points, every import runs in a fresh interpreter
+# Run from the AI folder:
+#   python benchmarks/bench_import_time.py                       compare with benchmarks/baselines.json
+#   python benchmarks/bench_import_time.py --update-baseline     store the current numbers as the baseline
+#   python benchmarks/bench_import_time.py --importtime main     the slowest modules of one entry (python -X importtime)
+# An entry regresses when it loads a module it shouldn't (the report path never needs torch, importing main
+# doesn't need sklearn yet, ...) or when it is more than --threshold times slower than its baseline
+# Times are divided by a fixed stdlib import workload measured in the same run, like bench_suite.py does
+# Exits with 1 when an entry regressed
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+AI_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+BASELINE_NAME = 'import_time'
+
+# Only loaded on first use, by the stage that needs them
+DETECTOR_MODULES = ['torch', 'ultralytics', 'supervision', 'onnxruntime', 'openvino']
+HEAVY_MODULES = DETECTOR_MODULES + ['sklearn', 'scipy', 'reportlab', 'svglib', 'pandas', 'bs4', 'requests', 'lxml']
+
+# Entry point -> modules importing it must not load
+ENTRIES = {
+    'main': HEAVY_MODULES,
+    'report': HEAVY_MODULES,
+    'batch': HEAVY_MODULES,
+    'chunked': HEAVY_MODULES,
+    'live': HEAVY_MODULES,
+    'util': HEAVY_MODULES,
+    'track_store': HEAVY_MODULES,
+    'trackers': HEAVY_MODULES,
+    'team_assigner': HEAVY_MODULES,
+    'scouting_report_generator': HEAVY_MODULES,
+}
+
+# Fixed stdlib imports, the unit the entry times are measured in
+CALIBRATION_MODULES = 'decimal, email.mime.multipart, http.server, xml.dom.minidom, logging.handlers, unittest, asyncio'
+
+IMPORT_CODE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{'seconds': time.perf_counter() - start, 'modules': sorted(sys.modules)}}))
+"""
+
+
+def time_import(module, repeat=5):
+    # Fastest of repeat fresh interpreters, and the modules that were loaded
+    times = []
+    modules = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-c', IMPORT_CODE.format(module=module)], cwd=AI_DIR,
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{result.stderr.strip()}")
+        output = json.loads(result.stdout.strip().splitlines()[-1])
+        times.append(output['seconds'])
+        modules = output['modules']
+    return min(times), modules
+
+
+def get_loaded(modules, names):
+    # Top level packages from names that are in sys.modules
+    loaded = {module.split('.')[0] for module in modules}
+    return [name for name in names if name in loaded]
+
+
+def bench(entries, repeat=5):
+    calibration_seconds, _ = time_import(CALIBRATION_MODULES, repeat)
+    results = {}
+    for entry in entries:
+        seconds, modules = time_import(entry, repeat)
+        results[entry] = {'seconds': seconds, 'modules': len(modules),
+                          'forbidden': get_loaded(modules, ENTRIES[entry])}
+    return {
+        'calibration_seconds': calibration_seconds,
+        'repeat': repeat,
+        'entries': results,
+        'machine': {'processor': platform.processor(), 'cpus': os.cpu_count(), 'python': platform.python_version()},
+        'date': datetime.now(timezone.utc).isoformat()
+    }
+
+
+def compare(result, baseline, threshold=1.5, min_seconds=0.05):
+    # Returns a list of (entry, seconds, baseline seconds scaled to this machine, ratio, regressed)
+    scale = result['calibration_seconds'] / baseline['calibration_seconds'] if baseline else 1.0
+    rows = []
+    for entry, values in result['entries'].items():
+        seconds = values['seconds']
+        regressed = bool(values['forbidden'])
+        if not baseline or entry not in baseline['entries']:
+            rows.append((entry, seconds, None, None, regressed))
+            continue
+        expected = baseline['entries'][entry]['seconds'] * scale
+        ratio = seconds / expected if expected > 0 else float('inf')
+        regressed = regressed or (ratio > threshold and seconds - expected > min_seconds)
+        rows.append((entry, seconds, expected, ratio, regressed))
+    return rows
+
+
+def print_importtime(module, top=15):
+    # Cumulative import time per module, slowest first
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=AI_DIR,
+                            capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative), name.strip()))
+    for cumulative, name in sorted(rows, reverse=True)[:top]:
+        print(f"{cumulative / 1e6:8.3f}s  {name}")
+
+
+def load_baselines(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def main(args):
+    if args.importtime:
+        print_importtime(args.importtime)
+        return 0
+
+    entries = args.entries or list(ENTRIES)
+    result = bench(entries, args.repeat)
+    print(f"Calibration {result['calibration_seconds'] * 1000:.1f}ms, {args.repeat} repeats")
+
+    baselines = load_baselines(args.baseline)
+    baseline = baselines.get(BASELINE_NAME)
+    regressions = []
+
+    print(f"{'entry':<28} {'seconds':>9} {'baseline':>9} {'ratio':>7} {'modules':>8}")
+    for entry, seconds, expected, ratio, regressed in compare(result, baseline, args.threshold, args.min_seconds):
+        values = result['entries'][entry]
+        forbidden = f"  LOADS {', '.join(values['forbidden'])}" if values['forbidden'] else ''
+        if expected is None:
+            print(f"{entry:<28} {seconds:>9.3f} {'-':>9} {'-':>7} {values['modules']:>8}{forbidden}")
+        else:
+            flag = '  REGRESSION' if regressed and not forbidden else ''
+            print(f"{entry:<28} {seconds:>9.3f} {expected:>9.3f} {ratio:>6.2f}x {values['modules']:>8}{flag}{forbidden}")
+        if regressed:
+            regressions.append(entry)
+    if baseline is None:
+        print(f"No {BASELINE_NAME} baseline in {args.baseline}, run with --update-baseline to store one")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=4)
+
+    if args.update_baseline and not any(values['forbidden'] for values in result['entries'].values()):
+        baselines[BASELINE_NAME] = result
+        with open(args.baseline, 'w') as f:
+            json.dump(baselines, f, indent=4, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+    elif regressions:
+        print(f"Regressed: {', '.join(regressions)} (threshold {args.threshold}x)")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Import time of the entry points")
+    parser.add_argument('entries', nargs='*', help=f"default: {', '.join(ENTRIES)}")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--threshold', type=float, default=1.5, help="slower than baseline by this factor is a regression")
+    parser.add_argument('--min-seconds', type=float, default=0.05, help="smaller differences are ignored")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--json', help="also write the results to this file")
+    parser.add_argument('--importtime', metavar='ENTRY', help="print the slowest modules of one entry and exit")
+    args = parser.parse_args()
+
+    for entry in args.entries:
+        if entry not in ENTRIES:
+            parser.error(f"unknown entry {entry}, one of {', '.join(ENTRIES)}")
+    raise SystemExit(main(args))
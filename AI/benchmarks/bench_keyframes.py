@@ -0,0 +1,138 @@
+# Accuracy vs speed of keyframe detection against detecting every frame
+# Run from the AI folder:
+#   python benchmarks/bench_keyframes.py --video video/test_clip_3.mp4 --model models/basketbal_computer_vision.pt
+#   python benchmarks/bench_keyframes.py --tracks stubs/track_stubs.pkl --camera stubs/camera_movement_stub.pkl
+# With --tracks the stub tracks stand in for the detector, that measures the error of the
+# propagation alone, with --video the real detector and ByteTrack run for every interval
+# The ball error is the median, false ball detections far away from the ball would dominate a mean
+import argparse
+import json
+import os
+import pickle
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from trackers import Tracker
+from trackers.backends import AdaptiveBatcher
+from util import read_video, get_bbox_iou_matrix, get_center_of_bbox
+
+
+class StubTracker(Tracker):
+    # The "detector" returns the stub tracks of the frame, frames are frame numbers
+    def __init__(self, stub_tracks, keyframe_interval=1, min_association=0.5, max_camera_shift=40):
+        self.stub_tracks = stub_tracks
+        self.batcher = AdaptiveBatcher(adaptive=False)
+        self.init_tracking(keyframe_interval, min_association, max_camera_shift)
+
+    def track_batch(self, frames, frame_nums=None):
+        return [{object: {track_id: {'bbox': list(track_info['bbox'])} for track_id, track_info in self.stub_tracks[object][frame_num].items()}
+                 for object in self.stub_tracks} for frame_num in frames]
+
+
+def match_frame(reference, predicted, iou_threshold=0.5):
+    # Greedy IoU matching regardless of track ids, returns (matches, mean IoU of the matches)
+    if not reference or not predicted:
+        return 0, 0.0
+    iou = get_bbox_iou_matrix([info['bbox'] for info in reference.values()], [info['bbox'] for info in predicted.values()])
+    matches = []
+    while iou.size and iou.max() >= iou_threshold:
+        i, j = np.unravel_index(np.argmax(iou), iou.shape)
+        matches.append(iou[i, j])
+        iou[i, :] = -1
+        iou[:, j] = -1
+    return len(matches), float(np.mean(matches)) if matches else 0.0
+
+
+def compare_tracks(reference, predicted):
+    references = predictions = matched = 0
+    iou_sum = 0.0
+    ball_errors = []
+    ball_found = ball_frames = 0
+
+    for reference_frame, predicted_frame in zip(reference['players'], predicted['players']):
+        number_of_matches, mean_iou = match_frame(reference_frame, predicted_frame)
+        references += len(reference_frame)
+        predictions += len(predicted_frame)
+        matched += number_of_matches
+        iou_sum += mean_iou * number_of_matches
+
+    for reference_frame, predicted_frame in zip(reference['ball'], predicted['ball']):
+        if not reference_frame:
+            continue
+        ball_frames += 1
+        if predicted_frame:
+            ball_found += 1
+            reference_center = get_center_of_bbox(next(iter(reference_frame.values()))['bbox'])
+            predicted_center = get_center_of_bbox(next(iter(predicted_frame.values()))['bbox'])
+            ball_errors.append(np.hypot(reference_center[0] - predicted_center[0], reference_center[1] - predicted_center[1]))
+
+    return {
+        'player_recall': matched / references if references else 1.0,
+        'player_precision': matched / predictions if predictions else 1.0,
+        'player_mean_iou': iou_sum / matched if matched else 0.0,
+        'ball_recall': ball_found / ball_frames if ball_frames else 1.0,
+        'ball_center_error_px': float(np.median(ball_errors)) if ball_errors else 0.0,
+    }
+
+
+def run_interval(make_tracker, frames, camera_movement, interval):
+    tracker = make_tracker(interval)
+    start = time.perf_counter()
+    tracks = tracker.get_obj_tracks(frames, camera_movement=camera_movement)
+    seconds = time.perf_counter() - start
+    detector_calls = len(tracker.keyframes) if interval > 1 else len(frames)
+    return tracks, seconds, detector_calls
+
+
+def bench(args):
+    camera_movement = None
+    if args.camera:
+        with open(args.camera, 'rb') as f:
+            camera_movement = pickle.load(f)
+
+    if args.tracks:
+        with open(args.tracks, 'rb') as f:
+            stub_tracks = pickle.load(f)
+        frames = list(range(len(stub_tracks['players'])))
+        make_tracker = lambda interval: StubTracker(stub_tracks, interval)
+    else:
+        frames, _ = read_video(args.video)
+        if camera_movement is None:
+            from camera_movement_estimator import CameraMovementEstimator
+            camera_movement = CameraMovementEstimator(frames[0], fast_mode=True).get_camera_movement(frames)
+        make_tracker = lambda interval: Tracker(args.model, backend=args.backend, keyframe_interval=interval)
+
+    reference, reference_seconds, reference_calls = run_interval(make_tracker, frames, camera_movement, 1)
+
+    results = []
+    print(f"{'interval':>8} {'detections':>10} {'seconds':>8} {'speedup':>7} {'recall':>7} {'precision':>9} {'iou':>6} {'ball':>6} {'ball px':>8}")
+    for interval in [1] + args.intervals:
+        if interval == 1:
+            tracks, seconds, calls = reference, reference_seconds, reference_calls
+        else:
+            tracks, seconds, calls = run_interval(make_tracker, frames, camera_movement, interval)
+
+        result = {'interval': interval, 'detector_calls': calls, 'seconds': seconds,
+                  'speedup': reference_calls / calls if calls else 0.0, **compare_tracks(reference, tracks)}
+        results.append(result)
+        print(f"{interval:>8} {calls:>10} {seconds:>8.2f} {result['speedup']:>6.1f}x {result['player_recall']:>7.3f} "
+              f"{result['player_precision']:>9.3f} {result['player_mean_iou']:>6.3f} {result['ball_recall']:>6.3f} {result['ball_center_error_px']:>8.1f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=4)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Keyframe detection accuracy vs speed")
+    parser.add_argument('--video', default='video/test_clip_3.mp4')
+    parser.add_argument('--model', default='models/basketbal_computer_vision.pt')
+    parser.add_argument('--backend', default='auto')
+    parser.add_argument('--tracks', help="stub tracks to use instead of the detector")
+    parser.add_argument('--camera', help="camera movement stub, computed from the video when missing")
+    parser.add_argument('--intervals', type=int, nargs='+', default=[2, 3, 5, 8])
+    parser.add_argument('--json', help="also write the results to this file")
+    bench(parser.parse_args())
@@ -0,0 +1,186 @@
+# Box score fetching against a local fixture server, no internet needed
+# Run from the AI folder:
+#   python benchmarks/bench_scraper.py                         generated pages, 100 ms latency per request
+#   python benchmarks/bench_scraper.py --pages saved_pages/    serve saved .html pages instead
+#   python benchmarks/bench_scraper.py --games 40 --workers 8 --rate 20 --latency 0.2
+# Compares the old way (requests.get per page, whole page through html.parser) with GameStatsScraper
+# cold (concurrent, empty cache), warm (revalidated, the server answers 304) and fresh (max_age, no requests)
+# The server sends ETag and Last-Modified and answers conditional requests like the real site
+import argparse
+import email.utils
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+import requests
+from bs4 import BeautifulSoup
+import pandas as pd
+from io import StringIO
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scouting_report_generator.stats_scraper import GameStatsScraper
+
+TABLE_IDS = ['box-score-advanced-florida', 'box-score-advanced-houston']
+
+
+def make_fixture_page(game, rng):
+    # Looks like a sports-reference box score: big page, the florida table in the page,
+    # the houston one inside an HTML comment like the site does for most tables
+    def table(table_id, rows):
+        header = ('<thead><tr class="over_header"><th colspan="2">Basic</th><th colspan="3">Advanced</th></tr>'
+                  '<tr><th>Starters</th><th>MP</th><th>TS%</th><th>USG%</th><th>ORtg</th></tr></thead>')
+        body = ''.join(f"<tr><th>Player {game}-{i}</th><td>{rng.integers(5, 40)}</td><td>{rng.random():.3f}</td>"
+                       f"<td>{rng.uniform(5, 35):.1f}</td><td>{rng.integers(80, 140)}</td></tr>" for i in range(rows))
+        return f'<table class="stats_table" id="{table_id}">{header}<tbody>{body}</tbody></table>'
+
+    play_by_play = ''.join(f"<tr><td>{i // 60}:{i % 60:02d}</td><td>Event {i} of game {game}</td><td>{rng.integers(0, 100)}</td></tr>"
+                           for i in range(1500))
+    return (f"<html><head><title>Game {game}</title>{'<script>var x = 1;</script>' * 50}</head><body>"
+            f"<div id='nav'>{'<a href=/x>link</a>' * 300}</div>"
+            f"<div class='table_container'>{table(TABLE_IDS[0], 12)}</div>"
+            f"<div class='placeholder'></div><!--\n<div class='table_container'>{table(TABLE_IDS[1], 12)}</div>\n-->"
+            f"<table id='pbp'>{play_by_play}</table></body></html>").encode('utf-8')
+
+
+class FixtureServer:
+    # Serves the .html files of pages_dir at /<file name>, with latency seconds of delay per request
+    def __init__(self, pages_dir, latency=0.0):
+        self.pages_dir = pages_dir
+        self.latency = latency
+        self.requests = 0
+        self.not_modified = 0
+        self.lock = threading.Lock()
+
+        fixture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                time.sleep(fixture.latency)
+                with fixture.lock:
+                    fixture.requests += 1
+                path = os.path.join(fixture.pages_dir, os.path.basename(self.path))
+                if not os.path.isfile(path):
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                with open(path, 'rb') as f:
+                    body = f.read()
+                etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+                last_modified = email.utils.formatdate(os.path.getmtime(path), usegmt=True)
+
+                if self.headers.get('If-None-Match') == etag:
+                    with fixture.lock:
+                        fixture.not_modified += 1
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', etag)
+                self.send_header('Last-Modified', last_modified)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def fetch_naive(urls, table_id):
+    # What the scraper did before: new connection per page, whole page through html.parser
+    tables = {}
+    for url in urls:
+        response = requests.get(url)
+        response.raise_for_status()
+        soup = BeautifulSoup(response.content, 'html.parser')
+        table = soup.find('table', {'id': table_id})
+        tables[url] = pd.read_html(StringIO(str(table)))[0] if table else None
+    return tables
+
+
+def main(args):
+    work_dir = tempfile.mkdtemp(prefix='bench_scraper_')
+    try:
+        pages_dir = args.pages
+        if pages_dir is None:
+            pages_dir = os.path.join(work_dir, 'pages')
+            os.makedirs(pages_dir)
+            rng = np.random.default_rng(0)
+            for game in range(args.games):
+                with open(os.path.join(pages_dir, f"game_{game:03d}.html"), 'wb') as f:
+                    f.write(make_fixture_page(game, rng))
+        files = sorted(name for name in os.listdir(pages_dir) if name.endswith('.html'))[:args.games]
+        page_kb = np.mean([os.path.getsize(os.path.join(pages_dir, name)) for name in files]) / 1024
+        print(f"{len(files)} pages of {page_kb:.0f} KB, {args.latency * 1000:.0f} ms latency, "
+              f"{args.workers} workers, {args.rate} requests/s")
+
+        with FixtureServer(pages_dir, args.latency) as fixture:
+            urls = [f"{fixture.base_url}/{name}" for name in files]
+            results = []
+
+            def run(name, fn):
+                requests_before = fixture.requests
+                start = time.perf_counter()
+                tables = fn()
+                seconds = time.perf_counter() - start
+                results.append((name, seconds, fixture.requests - requests_before))
+                return tables
+
+            naive = run('naive', lambda: fetch_naive(urls, TABLE_IDS[0]))
+
+            cache_dir = os.path.join(work_dir, 'http_cache')
+            scraper = GameStatsScraper(table_ids=TABLE_IDS, cache_dir=cache_dir, max_workers=args.workers,
+                                       requests_per_second=args.rate)
+            cold = run('cold', lambda: scraper.get_many_game_stats(urls))
+            run('warm (304)', lambda: scraper.get_many_game_stats(urls))
+            fresh_scraper = GameStatsScraper(table_ids=TABLE_IDS, cache_dir=cache_dir, max_age=3600,
+                                             max_workers=args.workers, requests_per_second=args.rate)
+            run('fresh (cache)', lambda: fresh_scraper.get_many_game_stats(urls))
+
+        # Same table as the old way, and the table inside the comment is found too
+        same = all((naive[url] is None and cold[url][TABLE_IDS[0]] is None) or
+                   (naive[url] is not None and naive[url].equals(cold[url][TABLE_IDS[0]])) for url in urls)
+        commented = sum(cold[url][TABLE_IDS[1]] is not None for url in urls)
+
+        print(f"{'run':<16} {'seconds':>8} {'per game':>9} {'requests':>9}")
+        for name, seconds, number_of_requests in results:
+            print(f"{name:<16} {seconds:>8.2f} {seconds / len(urls) * 1000:>7.1f}ms {number_of_requests:>9}")
+        print(f"Scraper stats: {scraper.stats}, 304 answers: {fixture.not_modified}")
+        print(f"Tables match the old parser: {same}, commented out tables found: {commented}/{len(urls)}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return 0 if same else 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Box score scraping against a local fixture server")
+    parser.add_argument('--pages', help="folder with saved .html pages, generated pages by default")
+    parser.add_argument('--games', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=10.0, help="requests per second")
+    parser.add_argument('--latency', type=float, default=0.1, help="seconds the server waits per request")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,267 @@
+# Times every analysis stage on synthetic footage and compares against stored baselines
+# Run from the AI folder:
+#   python benchmarks/bench_suite.py                       compare the 'small' config with benchmarks/baselines.json
+#   python benchmarks/bench_suite.py --config default      1080p, more frames
+#   python benchmarks/bench_suite.py --frames 600 --width 1280 --height 720 --players 12
+#   python benchmarks/bench_suite.py --update-baseline     store the current numbers as the baseline
+# Times are divided by a fixed calibration workload measured in the same run, so a baseline from
+# another machine still compares roughly. A stage regresses when it is more than --threshold times
+# slower than its baseline (and slower by at least --min-seconds, tiny stages are mostly noise)
+# Exits with 1 when a stage regressed, or when the report of the whole game and the merged reports of its halves differ
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+import numpy as np
+import cv2
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from synthetic import SyntheticGame, copy_tracks
+from util import save_video
+from trackers import Tracker
+from camera_movement_estimator import CameraMovementEstimator
+from view_transformer import ViewTransformer
+from speed_and_distance_estimator import SpeedAndDistance_Estimator
+from team_assigner import TeamAssigner
+from annotation_renderer import AnnotationRenderer
+from scouting_report_generator import ScoutingReportGenerator, ReportAggregator
+from track_store import TrackStore
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+# All frames are kept in memory (plus a copy for drawing), 240 frames of 1080p is about 3 GB
+CONFIGS = {
+    'small': {'number_of_frames': 120, 'width': 1280, 'height': 720, 'number_of_players': 10},
+    'default': {'number_of_frames': 240, 'width': 1920, 'height': 1080, 'number_of_players': 10},
+    'long': {'number_of_frames': 1440, 'width': 640, 'height': 360, 'number_of_players': 10},
+    'crowded': {'number_of_frames': 120, 'width': 1920, 'height': 1080, 'number_of_players': 24},
+}
+
+STAGES = ['positions', 'camera_movement', 'view_transform', 'speed_and_distance', 'teams', 'draw', 'save_video', 'report']
+
+
+def calibrate(repeat=5):
+    # Fixed mix of OpenCV and NumPy work, the unit the stage times are measured in
+    image = np.random.default_rng(0).integers(0, 255, size=(1080, 1920, 3), dtype=np.uint8)
+    matrix = np.random.default_rng(1).random((300, 300))
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(10):
+            cv2.GaussianBlur(image, (9, 9), 0)
+        for _ in range(20):
+            matrix @ matrix
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def run_stages(game, frames, output_dir, use_track_store=False):
+    # One pass of the pipeline in the order main.py runs it, returns {stage: seconds}
+    tracks = copy_tracks(game.tracks)
+    if use_track_store:
+        tracks = TrackStore.from_tracks(tracks)
+    times = {}
+
+    def timed(name, fn):
+        start = time.perf_counter()
+        result = fn()
+        times[name] = time.perf_counter() - start
+        return result
+
+    # Positions don't touch the model, so the tracker is made without loading one
+    tracker = Tracker.__new__(Tracker)
+    timed('positions', lambda: tracker.add_position_to_tracks(tracks))
+
+    camera_movement_estimator = CameraMovementEstimator(frames[0], fast_mode=True)
+    def camera_movement():
+        movement = camera_movement_estimator.get_camera_movement(frames, tracks=tracks)
+        camera_movement_estimator.add_adjust_positions_to_tracks(tracks, movement)
+        return movement
+    camera_movement_per_frame = timed('camera_movement', camera_movement)
+
+    view_transformer = ViewTransformer()
+    timed('view_transform', lambda: view_transformer.add_transformed_position_to_tracks(tracks))
+
+    speed_and_distance_estimator = SpeedAndDistance_Estimator(frame_rate=game.fps)
+    timed('speed_and_distance', lambda: speed_and_distance_estimator.add_speed_and_distance_to_tracks(tracks))
+
+    team_assigner = TeamAssigner()
+    def teams():
+        team_assigner.assign_team_color(frames[0], tracks["players"][0])
+        team_assigner.add_team_to_tracks(frames, tracks)
+    timed('teams', teams)
+
+    # Drawing is in place, it gets copies so the next repeat starts from clean frames
+    draw_frames = [frame.copy() for frame in frames]
+    renderer = AnnotationRenderer()
+    output_frames = timed('draw', lambda: list(renderer.render(draw_frames, tracks, camera_movement_per_frame)))
+
+    timed('save_video', lambda: save_video(output_frames, os.path.join(output_dir, 'bench.avi'), game.fps))
+
+    report = ScoutingReportGenerator()
+    timed('report', lambda: report.generate_report(tracks, min_frames=len(frames) // 4, fps=game.fps))
+
+    return times, tracks
+
+
+def check_report_merge(tracks, min_frames, parts=2):
+    # The report of the whole game has to be the same as the merged reports of its parts, like parallel workers make
+    number_of_frames = len(tracks['players'])
+    whole = ReportAggregator(min_frames=min_frames)
+    whole.add_tracks(tracks)
+
+    cuts = np.linspace(0, number_of_frames, parts + 1).astype(int)
+    merged = ReportAggregator(min_frames=min_frames)
+    for start, end in zip(cuts[:-1], cuts[1:]):
+        part = ReportAggregator(min_frames=min_frames)
+        part.add_tracks(tracks, start, end)
+        merged.merge(part)
+    return whole.get_report() == merged.get_report()
+
+
+def get_camera_error(game, frames):
+    # Mean pixel error of the estimated camera movement, a sanity check that the footage is usable
+    estimated = CameraMovementEstimator(frames[0], fast_mode=True).get_camera_movement(frames, tracks=game.tracks)
+    return float(np.abs(np.asarray(estimated) - np.asarray(game.get_camera_movement())).mean())
+
+
+def bench(config, repeat=3, use_track_store=False):
+    game = SyntheticGame(**config)
+
+    start = time.perf_counter()
+    frames = game.get_frames()
+    generate_seconds = time.perf_counter() - start
+
+    output_dir = tempfile.mkdtemp(prefix='bench_suite_')
+    try:
+        # Untimed, the first run loads what the stages import on first use (sklearn for the teams...)
+        # and warms their caches, otherwise --repeat 1 times that too
+        run_stages(game, frames, output_dir, use_track_store)
+        runs = []
+        for _ in range(repeat):
+            times, tracks = run_stages(game, frames, output_dir, use_track_store)
+            runs.append(times)
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    stages = {name: float(np.median([run[name] for run in runs])) for name in STAGES}
+    return {
+        'config': config,
+        'repeat': repeat,
+        'track_store': use_track_store,
+        'generate_seconds': generate_seconds,
+        'camera_error_px': get_camera_error(game, frames),
+        'report_merge_equal': check_report_merge(tracks, len(frames) // 4),
+        'calibration_seconds': calibrate(),
+        'stages': stages,
+        'total_seconds': sum(stages.values()),
+        'machine': {'processor': platform.processor(), 'cpus': os.cpu_count(),
+                    'python': platform.python_version(), 'numpy': np.__version__, 'opencv': cv2.__version__},
+        'date': datetime.now(timezone.utc).isoformat()
+    }
+
+
+def compare(result, baseline, threshold=1.25, min_seconds=0.005):
+    # Returns a list of (stage, seconds, baseline seconds scaled to this machine, ratio, regressed)
+    scale = result['calibration_seconds'] / baseline['calibration_seconds']
+    rows = []
+    for name, seconds in result['stages'].items():
+        if name not in baseline['stages']:
+            rows.append((name, seconds, None, None, False))
+            continue
+        expected = baseline['stages'][name] * scale
+        ratio = seconds / expected if expected > 0 else float('inf')
+        regressed = ratio > threshold and seconds - expected > min_seconds
+        rows.append((name, seconds, expected, ratio, regressed))
+    return rows
+
+
+def load_baselines(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def get_config_name(args):
+    if args.frames or args.width or args.height or args.players:
+        config = dict(CONFIGS[args.config])
+        config['number_of_frames'] = args.frames or config['number_of_frames']
+        config['width'] = args.width or config['width']
+        config['height'] = args.height or config['height']
+        config['number_of_players'] = args.players or config['number_of_players']
+        name = f"{config['number_of_frames']}f_{config['width']}x{config['height']}_{config['number_of_players']}p"
+    else:
+        name, config = args.config, CONFIGS[args.config]
+    if args.track_store:
+        name += '_track_store'
+    return name, config
+
+
+def main(args):
+    name, config = get_config_name(args)
+    print(f"Config {name}: {config}, {args.repeat} repeats")
+    result = bench(config, args.repeat, args.track_store)
+    print(f"Footage generated in {result['generate_seconds']:.2f}s, camera error {result['camera_error_px']:.2f}px, "
+          f"calibration {result['calibration_seconds'] * 1000:.1f}ms")
+    if not result['report_merge_equal']:
+        print("The merged report of the game halves differs from the report of the whole game")
+
+    baselines = load_baselines(args.baseline)
+    baseline = baselines.get(name)
+    regressions = []
+
+    print(f"{'stage':<20} {'seconds':>9} {'baseline':>9} {'ratio':>7}")
+    if baseline is None:
+        for stage, seconds in result['stages'].items():
+            print(f"{stage:<20} {seconds:>9.4f} {'-':>9} {'-':>7}")
+        print(f"No baseline for {name} in {args.baseline}, run with --update-baseline to store one")
+    else:
+        for stage, seconds, expected, ratio, regressed in compare(result, baseline, args.threshold, args.min_seconds):
+            if expected is None:
+                print(f"{stage:<20} {seconds:>9.4f} {'-':>9} {'-':>7}")
+                continue
+            flag = '  REGRESSION' if regressed else ''
+            print(f"{stage:<20} {seconds:>9.4f} {expected:>9.4f} {ratio:>6.2f}x{flag}")
+            if regressed:
+                regressions.append(stage)
+    print(f"{'total':<20} {result['total_seconds']:>9.4f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=4)
+
+    if not result['report_merge_equal']:
+        return 1
+    if args.update_baseline:
+        baselines[name] = result
+        with open(args.baseline, 'w') as f:
+            json.dump(baselines, f, indent=4, sort_keys=True)
+        print(f"Baseline for {name} saved to {args.baseline}")
+    elif regressions:
+        print(f"Regressed: {', '.join(regressions)} (threshold {args.threshold}x)")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Stage benchmarks on synthetic footage")
+    parser.add_argument('--config', choices=list(CONFIGS), default='small')
+    parser.add_argument('--frames', type=int)
+    parser.add_argument('--width', type=int)
+    parser.add_argument('--height', type=int)
+    parser.add_argument('--players', type=int)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--track-store', action='store_true', help="run the stages on a TrackStore instead of dicts")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--threshold', type=float, default=1.25)
+    parser.add_argument('--min-seconds', type=float, default=0.005)
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--json', help="also write this run's numbers to a file")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,50 @@
+# Per point vs batched court projection
+# Run from the AI folder: python benchmarks/bench_view_transformer.py [number_of_points]
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from view_transformer import ViewTransformer
+
+
+def make_points(number_of_points, seed=0):
+    # Spread over a 1080p frame so part of the points land outside the court
+    rng = np.random.default_rng(seed)
+    return rng.uniform((0, 0), (1920, 1080), size=(number_of_points, 2))
+
+
+def bench(number_of_points=200_000):
+    view_transformer = ViewTransformer()
+    points = make_points(number_of_points)
+
+    start = time.perf_counter()
+    per_point = []
+    for point in points:
+        transformed = view_transformer.transform_point(point)
+        per_point.append(None if transformed is None else transformed.squeeze())
+    per_point_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = view_transformer.transform_points(points)
+    batch_time = time.perf_counter() - start
+
+    # Both paths have to agree before the timing means anything
+    for expected, actual in zip(per_point, batched):
+        if expected is None:
+            assert np.isnan(actual).all()
+        else:
+            assert np.allclose(expected, actual)
+
+    inside = int((~np.isnan(batched[:, 0])).sum())
+    print(f"Points: {number_of_points} ({inside} inside the court)")
+    print(f"Per point: {per_point_time:.3f}s")
+    print(f"Batched:   {batch_time:.3f}s")
+    print(f"Speedup:   {per_point_time / batch_time:.1f}x")
+
+    return per_point_time, batch_time
+
+
+if __name__ == '__main__':
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,161 @@
+# Synthetic court footage with known tracks, so the benchmarks run without a video or a model
+# A textured court is drawn once on a canvas wider than the frame, the camera pans over it and
+# the players (two jersey colors), referees and the ball are drawn on top at their true boxes
+# Everything comes from one seed, the same config always gives the same frames and tracks
+import numpy as np
+import cv2
+
+# ViewTransformer.pixel_vertices for 1920x1080, scaled to the frame size
+COURT_VERTICES = np.array([[110, 1035], [265, 275], [910, 260], [1640, 915]], dtype=np.float64)
+
+TEAM_COLORS = [(40, 40, 200), (235, 235, 235)]
+REFEREE_COLOR = (30, 30, 30)
+BALL_COLOR = (0, 120, 255)
+
+
+class SyntheticGame:
+    def __init__(self, number_of_frames=240, width=1280, height=720, number_of_players=10, number_of_referees=2,
+                 fps=24, pan_amplitude=0.08, pan_period=8.0, seed=0):
+        # pan_amplitude is a fraction of the width, pan_period in seconds
+        self.number_of_frames = number_of_frames
+        self.width = width
+        self.height = height
+        self.number_of_players = number_of_players
+        self.number_of_referees = number_of_referees
+        self.fps = fps
+        self.rng = np.random.default_rng(seed)
+
+        self.margin = int(np.ceil(pan_amplitude * width)) + 2
+        self.court = COURT_VERTICES * [width / 1920, height / 1080] + [self.margin, 0]
+        self.background = self.make_background()
+
+        t = np.arange(number_of_frames) / fps
+        self.camera_x = np.round(self.margin + pan_amplitude * width * np.sin(2 * np.pi * t / pan_period)).astype(int)
+        self.camera_y = np.zeros(number_of_frames, dtype=int)
+
+        self.tracks = self.make_tracks()
+
+    def make_background(self):
+        # Wood colored floor with texture for the optical flow, court lines and a crowd strip on top
+        height, width = self.height, self.width + 2 * self.margin
+        noise = self.rng.integers(-25, 25, size=(height // 8 + 1, width // 8 + 1, 1))
+        noise = cv2.resize(noise.astype(np.float32), (width, height), interpolation=cv2.INTER_NEAREST)[:, :, None]
+        background = np.clip(np.array([70, 140, 190], dtype=np.float32) + noise, 0, 255).astype(np.uint8)
+
+        crowd_height = int(self.court[:, 1].min() * 0.8)
+        crowd = self.rng.integers(0, 255, size=(crowd_height // 6 + 1, width // 6 + 1, 3)).astype(np.uint8)
+        background[:crowd_height] = cv2.resize(crowd, (width, crowd_height), interpolation=cv2.INTER_NEAREST)
+
+        court = np.round(self.court).astype(np.int32)
+        cv2.polylines(background, [court], True, (255, 255, 255), 3)
+        top_mid = (court[1] + court[2]) // 2
+        bottom_mid = (court[0] + court[3]) // 2
+        cv2.line(background, tuple(int(v) for v in top_mid), tuple(int(v) for v in bottom_mid), (255, 255, 255), 3)
+        return background
+
+    def court_point(self, u, v):
+        # Bilinear point in the court quad, u across (left to right), v along (far to near)
+        near_left, far_left, far_right, near_right = self.court
+        far = far_left + (far_right - far_left) * u[..., None]
+        near = near_left + (near_right - near_left) * u[..., None]
+        return far + (near - far) * v[..., None]
+
+    def walk(self, number_of_walkers, speed):
+        # Random walks in (u, v) court coordinates that bounce off the edges
+        position = self.rng.uniform(0.1, 0.9, size=(number_of_walkers, 2))
+        velocity = self.rng.normal(0, speed, size=(number_of_walkers, 2))
+        positions = np.empty((self.number_of_frames, number_of_walkers, 2))
+        for frame_num in range(self.number_of_frames):
+            velocity = 0.95 * velocity + self.rng.normal(0, speed * 0.3, size=velocity.shape)
+            position = position + velocity
+            outside = (position < 0.05) | (position > 0.95)
+            velocity[outside] *= -1
+            position = np.clip(position, 0.05, 0.95)
+            positions[frame_num] = position
+        return positions
+
+    def make_tracks(self):
+        players = self.walk(self.number_of_players, 0.004)
+        referees = self.walk(self.number_of_referees, 0.003)
+
+        # The ball follows a random player and switches every two seconds
+        holders = self.rng.integers(0, self.number_of_players, size=self.number_of_frames // (2 * self.fps) + 1)
+
+        tracks = {"players": [], "referees": [], "ball": []}
+        for frame_num in range(self.number_of_frames):
+            camera = np.array([self.camera_x[frame_num], self.camera_y[frame_num]])
+
+            frame_players = {}
+            for player_id, (u, v) in enumerate(players[frame_num], start=1):
+                frame_players[player_id] = {"bbox": self.person_bbox(u, v, camera)}
+            frame_referees = {}
+            for referee_id, (u, v) in enumerate(referees[frame_num], start=self.number_of_players + 1):
+                frame_referees[referee_id] = {"bbox": self.person_bbox(u, v, camera)}
+
+            holder = frame_players[holders[frame_num // (2 * self.fps)] + 1]["bbox"]
+            ball_size = max(4, self.height // 90)
+            ball_x = holder[2] + ball_size
+            ball_y = (holder[1] + holder[3]) / 2 + 8 * np.sin(frame_num / 2)
+            frame_ball = {1: {"bbox": [ball_x - ball_size, ball_y - ball_size, ball_x + ball_size, ball_y + ball_size]}}
+
+            tracks["players"].append(frame_players)
+            tracks["referees"].append(frame_referees)
+            tracks["ball"].append(frame_ball)
+        return tracks
+
+    def person_bbox(self, u, v, camera):
+        # Feet on the court point, farther players are smaller
+        foot = self.court_point(np.array(u), np.array(v)) - camera
+        person_height = self.height * (0.08 + 0.1 * v)
+        person_width = person_height * 0.4
+        return [float(foot[0] - person_width / 2), float(foot[1] - person_height), float(foot[0] + person_width / 2), float(foot[1])]
+
+    def get_camera_movement(self):
+        # True (old - new) shift of every frame, what CameraMovementEstimator should find
+        movement = np.zeros((self.number_of_frames, 2))
+        movement[1:, 0] = np.diff(self.camera_x)
+        movement[1:, 1] = np.diff(self.camera_y)
+        return movement.tolist()
+
+    def get_frame(self, frame_num):
+        x, y = self.camera_x[frame_num], self.camera_y[frame_num]
+        frame = self.background[y:y + self.height, x:x + self.width].copy()
+
+        for player_id, player in self.tracks["players"][frame_num].items():
+            self.draw_person(frame, player["bbox"], TEAM_COLORS[player_id % 2])
+        for _, referee in self.tracks["referees"][frame_num].items():
+            self.draw_person(frame, referee["bbox"], REFEREE_COLOR)
+        for _, ball in self.tracks["ball"][frame_num].items():
+            x1, y1, x2, y2 = ball["bbox"]
+            cv2.circle(frame, (int((x1 + x2) / 2), int((y1 + y2) / 2)), int((x2 - x1) / 2), BALL_COLOR, -1)
+        return frame
+
+    def draw_person(self, frame, bbox, jersey_color):
+        x1, y1, x2, y2 = (int(round(v)) for v in bbox)
+        height = y2 - y1
+        head = y1 + height // 6
+        waist = y1 + int(height * 0.6)
+        cv2.circle(frame, ((x1 + x2) // 2, y1 + height // 12), max(height // 12, 1), (120, 160, 210), -1)
+        cv2.rectangle(frame, (x1, head), (x2, waist), jersey_color, -1)
+        cv2.rectangle(frame, (x1, waist), (x2, y2), tuple(c // 2 for c in jersey_color), -1)
+
+    def frames(self):
+        # Generator, long videos don't have to fit in memory
+        for frame_num in range(self.number_of_frames):
+            yield self.get_frame(frame_num)
+
+    def get_frames(self):
+        return list(self.frames())
+
+    def write_video(self, path, codec='mp4v'):
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*codec), self.fps, (self.width, self.height))
+        for frame in self.frames():
+            writer.write(frame)
+        writer.release()
+        return path
+
+
+def copy_tracks(tracks):
+    # Only the boxes, like Tracker.get_obj_tracks returns them
+    return {object: [{track_id: {"bbox": list(track_info["bbox"])} for track_id, track_info in frame.items()}
+                     for frame in object_tracks] for object, object_tracks in tracks.items()}
@@ -4,12 +4,20 @@ import numpy as np
 import os
 import sys 
 sys.path.append('../')
-from util import measure_distance, measure_xy_distance
+from track_store import TrackStore
+from util import measure_distance, measure_xy_distance, draw_camera_movement_panel
 
 class CameraMovementEstimator():
-    def __init__(self, frame):
+    def __init__(self, frame, fast_mode=False, pyramid_level=1, min_features=100):
         self.minimum_distance = 1  # Lower threshold for subtle basketball camera shifts
 
+        # Fast mode: flow on a downscaled pyramid level, features are tracked on until
+        # fewer than min_features survive and players/refs are masked out
+        self.fast_mode = fast_mode
+        self.pyramid_level = pyramid_level
+        self.scale = 2 ** pyramid_level
+        self.min_features = min_features
+
         self.lk_params = dict(
             winSize=(21, 21),
             maxLevel=3,
@@ -27,7 +35,40 @@ class CameraMovementEstimator():
             mask=mask_features
         )
 
+        # Same settings for the fast mode, the mask is built per frame from the bboxes
+        self.fast_features = dict(
+            maxCorners=300,
+            qualityLevel=0.01,
+            minDistance=1,
+            blockSize=5
+        )
+        self.fast_lk_params = dict(
+            winSize=(21, 21),
+            maxLevel=max(3 - pyramid_level, 0),
+            criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 30, 0.01)
+        )
+
+        self.reset()
+
+    def get_cache_params(self):
+        features = {key: value for key, value in self.features.items() if key != 'mask'}
+        return {
+            'minimum_distance': self.minimum_distance,
+            'lk_params': self.lk_params,
+            'features': features,
+            'fast_mode': self.fast_mode,
+            'pyramid_level': self.pyramid_level,
+            'min_features': self.min_features
+        }
+
     def add_adjust_positions_to_tracks(self, tracks, camera_movement_per_frame):
+        if isinstance(tracks, TrackStore):
+            camera_movement = np.asarray(camera_movement_per_frame, dtype=np.float64).reshape(-1, 2)
+            for table in tracks.tables.values():
+                position_adjusted = table.column('position') - camera_movement[table.frame]
+                table.set_column('position_adjusted', position_adjusted)
+            return
+
         for object, object_tracks in tracks.items():
             for frame_num, track in enumerate(object_tracks):
                 for track_id, track_info in track.items():
@@ -39,70 +80,146 @@ class CameraMovementEstimator():
                     )
                     tracks[object][frame_num][track_id]['position_adjusted'] = position_adjusted
 
-    def get_camera_movement(self, frames, read_from_stub=False, stub_path=None):
+    def get_camera_movement(self, frames, read_from_stub=False, stub_path=None, tracks=None):
         if read_from_stub and stub_path is not None and os.path.exists(stub_path):
             with open(stub_path, 'rb') as f:
                 return pickle.load(f)
 
-        camera_movement = [[0, 0]] * len(frames)
-        old_gray = cv2.cvtColor(frames[0], cv2.COLOR_BGR2GRAY)
-        old_features = cv2.goodFeaturesToTrack(old_gray, **self.features)
+        # Works on a list or a stream of frames, only the previous frame is kept
+        # In fast mode the tracks are used to mask out the players and refs
+        self.reset()
+        camera_movement = []
+        for frame_num, frame in enumerate(frames):
+            frame_tracks = None
+            if tracks is not None:
+                frame_tracks = {object: tracks[object][frame_num] for object in ('players', 'referees')}
+            camera_movement.append(self.get_frame_camera_movement(frame, frame_tracks))
+
+        if stub_path is not None:
+            with open(stub_path, 'wb') as f:
+                pickle.dump(camera_movement, f)
+
+        return camera_movement
+
+    def reset(self):
+        self.old_gray = None
+        self.old_features = None
+        self.last_movement = [0, 0]
+
+    def get_frame_camera_movement(self, frame, frame_tracks=None):
+        # Movement of the next frame in the sequence relative to the previous one
+        if self.fast_mode:
+            return self.get_frame_camera_movement_fast(frame, frame_tracks)
+
+        frame_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        if self.old_gray is None:
+            self.old_gray = frame_gray
+            self.old_features = cv2.goodFeaturesToTrack(frame_gray, **self.features)
+            self.last_movement = [0, 0]
+            return self.last_movement
+
+        new_features, status, _ = cv2.calcOpticalFlowPyrLK(
+            self.old_gray, frame_gray, self.old_features, None, **self.lk_params
+        )
 
-        for frame_num in range(1, len(frames)):
-            frame_gray = cv2.cvtColor(frames[frame_num], cv2.COLOR_BGR2GRAY)
+        if new_features is None or status is None:
+            self.old_gray = frame_gray
+            self.old_features = cv2.goodFeaturesToTrack(frame_gray, **self.features)
+            return self.last_movement
+
+        displacements = []
+
+        for new, old, valid in zip(new_features, self.old_features, status):
+            if valid[0] == 1:
+                dx, dy = measure_xy_distance(old.ravel(), new.ravel())
+                dist = measure_distance(new.ravel(), old.ravel())
+                if dist > self.minimum_distance:
+                    displacements.append((dx, dy))
+
+        if displacements:
+            dx_median = np.median([d[0] for d in displacements])
+            dy_median = np.median([d[1] for d in displacements])
+            self.last_movement = [dx_median, dy_median]
+
+        self.old_gray = frame_gray.copy()
+        self.old_features = cv2.goodFeaturesToTrack(frame_gray, **self.features)
+
+        return self.last_movement
+
+    def get_body_bboxes(self, frame_tracks):
+        # Player and ref bboxes in the downscaled image as an (N, 4) array
+        if not frame_tracks:
+            return np.zeros((0, 4))
+
+        bboxes = [track_info['bbox'] for object_track in frame_tracks.values() for track_info in object_track.values()]
+        if not bboxes:
+            return np.zeros((0, 4))
+        return np.asarray(bboxes, dtype=np.float64) / self.scale
+
+    def get_feature_mask(self, frame_gray, bboxes):
+        mask = np.ones_like(frame_gray)
+        for x1, y1, x2, y2 in bboxes.astype(int):
+            mask[max(y1, 0):max(y2, 0), max(x1, 0):max(x2, 0)] = 0
+        return mask
+
+    def get_frame_camera_movement_fast(self, frame, frame_tracks=None):
+        frame_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        for _ in range(self.pyramid_level):
+            frame_gray = cv2.pyrDown(frame_gray)
+
+        bboxes = self.get_body_bboxes(frame_tracks)
+
+        if self.old_gray is None:
+            self.old_gray = frame_gray
+            self.old_features = cv2.goodFeaturesToTrack(frame_gray, mask=self.get_feature_mask(frame_gray, bboxes), **self.fast_features)
+            self.last_movement = [0, 0]
+            return self.last_movement
+
+        new_features = status = None
+        if self.old_features is not None and len(self.old_features) > 0:
             new_features, status, _ = cv2.calcOpticalFlowPyrLK(
-                old_gray, frame_gray, old_features, None, **self.lk_params
+                self.old_gray, frame_gray, self.old_features, None, **self.fast_lk_params
             )
 
-            if new_features is None or status is None:
-                camera_movement[frame_num] = camera_movement[frame_num - 1]
-                old_gray = frame_gray
-                old_features = cv2.goodFeaturesToTrack(frame_gray, **self.features)
-                continue
+        if new_features is None or status is None:
+            self.old_gray = frame_gray
+            self.old_features = cv2.goodFeaturesToTrack(frame_gray, mask=self.get_feature_mask(frame_gray, bboxes), **self.fast_features)
+            return self.last_movement
 
-            displacements = []
+        old_points = self.old_features.reshape(-1, 2)
+        new_points = new_features.reshape(-1, 2)
+        tracked = status.ravel() == 1
 
-            for new, old, valid in zip(new_features, old_features, status):
-                if valid[0] == 1:
-                    dx, dy = measure_xy_distance(old.ravel(), new.ravel())
-                    dist = measure_distance(new.ravel(), old.ravel())
-                    if dist > self.minimum_distance:
-                        displacements.append((dx, dy))
+        # Points that ended up on a player or ref move with them, not with the camera
+        if len(bboxes):
+            x, y = new_points[:, 0, None], new_points[:, 1, None]
+            on_body = ((x >= bboxes[:, 0]) & (x <= bboxes[:, 2]) & (y >= bboxes[:, 1]) & (y <= bboxes[:, 3])).any(axis=1)
+            tracked &= ~on_body
 
-            if displacements:
-                dx_median = np.median([d[0] for d in displacements])
-                dy_median = np.median([d[1] for d in displacements])
-                camera_movement[frame_num] = [dx_median, dy_median]
-            else:
-                camera_movement[frame_num] = camera_movement[frame_num - 1]
+        # Back in full resolution pixels
+        displacements = (old_points - new_points) * self.scale
+        moved = tracked & (np.linalg.norm(displacements, axis=1) > self.minimum_distance)
 
-            old_gray = frame_gray.copy()
-            old_features = cv2.goodFeaturesToTrack(frame_gray, **self.features)
+        if moved.any():
+            dx_median, dy_median = np.median(displacements[moved], axis=0)
+            self.last_movement = [float(dx_median), float(dy_median)]
 
-        if stub_path is not None:
-            with open(stub_path, 'wb') as f:
-                pickle.dump(camera_movement, f)
+        # Keep following the surviving features, only look for new ones when too many are lost
+        self.old_gray = frame_gray
+        if tracked.sum() >= self.min_features:
+            self.old_features = new_points[tracked].reshape(-1, 1, 2)
+        else:
+            self.old_features = cv2.goodFeaturesToTrack(frame_gray, mask=self.get_feature_mask(frame_gray, bboxes), **self.fast_features)
 
-        return camera_movement
+        return self.last_movement
 
     def draw_camera_movement(self, frames, camera_movement_per_frame):
         output_frames = []
 
         for frame_num, frame in enumerate(frames):
             frame = frame.copy()
-            overlay = frame.copy()
-
-            # Overlay rectangle for info box
-            cv2.rectangle(overlay, (0, 0), (500, 100), (255, 255, 255), -1)
-            alpha = 0.6
-            cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0, frame)
-
-            x_movement, y_movement = camera_movement_per_frame[frame_num]
-            frame = cv2.putText(frame, f"Camera Movement X: {x_movement:.2f}", (10, 30),
-                                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 3)
-            frame = cv2.putText(frame, f"Camera Movement Y: {y_movement:.2f}", (10, 60),
-                                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 3)
-
+            frame = draw_camera_movement_panel(frame, camera_movement_per_frame[frame_num])
             output_frames.append(frame)
 
         return output_frames
@@ -0,0 +1,29 @@
+# Analyzes one long video (e.g. a whole game) on several cores, run from the AI folder:
+#   python chunked.py video/full_game.mp4 --workers 4
+#   python chunked.py video/full_game.mp4 --workers 8 --segment-minutes 5 --overlap 3
+# The video is cut into segments that overlap by --overlap seconds, every worker process analyzes its segments
+# and the track ids are matched over the overlaps, so a player keeps one id for the whole game
+# Teams, speed and distance are computed once over the stitched tracks, the output is the same as main.py's
+import argparse
+import os
+from main import analyze_video
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Analyze one long video in parallel segments")
+    parser.add_argument('video')
+    parser.add_argument('--model', default='models/basketbal_computer_vision.pt')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--segment-minutes', type=float, help="default is one segment per worker")
+    parser.add_argument('--overlap', type=float, default=2.0, help="seconds every segment shares with the one before")
+    parser.add_argument('--output-video', default='output_videos/chunked_analyzed.avi')
+    parser.add_argument('--tracks', help="also save the tracks as a track file")
+    parser.add_argument('--report-dir', default='output_reports')
+    parser.add_argument('--database', help="also add the game to this game database (SQLite file)")
+    args = parser.parse_args()
+
+    summary = analyze_video(args.video, args.model, args.output_video, output_tracks_path=args.tracks,
+                            output_report_dir=args.report_dir, database_path=args.database, chunk_workers=args.workers,
+                            segment_seconds=args.segment_minutes * 60 if args.segment_minutes else None,
+                            overlap_seconds=args.overlap)
+    print(f"{summary['frames']} frames in {summary['seconds']:.1f}s ({summary['fps']:.1f} fps)")
@@ -0,0 +1,116 @@
+# Live mode for the bench, analyzes a stream while it comes in, run from the AI folder:
+#   python live.py 0 --show                            first capture device, annotated frames in a window
+#   python live.py rtsp://192.168.1.20/stream --output-video output_videos/live.avi
+#   python live.py /tmp/court.pipe                     named pipe, e.g. mkfifo /tmp/court.pipe and
+#                                                      ffmpeg -i <camera> -f mpegts -y /tmp/court.pipe
+#   python live.py video/test_clip_3.mp4               a file, read at its own fps like a camera would deliver it
+# Frames are analyzed one at a time and should be out within --max-latency seconds of being captured,
+# when the analysis falls behind frames are dropped by --policy, the buffer never holds more than --buffer frames
+# Rolling stats (fps, latency, drops, players per team, distance leaders) are printed every --stats-interval seconds
+import argparse
+import json
+import signal
+import threading
+import time
+from util import save_video
+from trackers import Tracker
+from view_transformer import ViewTransformer
+from scouting_report_generator import ReportAggregator
+from pipeline import LiveAnalyzer, LiveSource, FrameBuffer, DROP_POLICIES, show_frames
+from track_store import save_track_file
+from main import generate_scouting_report, REPORT_MIN_FRAMES
+
+
+def print_stats(stats):
+    teams = ", ".join(f"team {team}: {values['players']} players"
+                      + (f" {values['average_speed']:.1f} km/h" if values['average_speed'] is not None else "")
+                      for team, values in sorted(stats['teams'].items()))
+    print(f"{stats['seconds']:6.1f}s {stats['fps']:5.1f} fps, latency p50 {stats['latency_p50'] * 1000:.0f} ms "
+          f"p95 {stats['latency_p95'] * 1000:.0f} ms, dropped {stats['dropped_buffer']} + {stats['dropped_stale']} stale, "
+          f"buffer {stats['buffer']}" + (f" | {teams}" if teams else ""))
+
+
+def run_live(source, model_path, output_video_path=None, show=False, policy='drop_oldest', buffer_size=2,
+             max_latency=0.5, realtime=None, fps=None, court_roi=False, backend='auto', imgsz=640, seconds=None,
+             stats_interval=1.0, stats_path=None, output_report_dir=None, output_tracks_path=None, tracker=None):
+    # Runs until the source ends, seconds have passed or stop() (Ctrl-C), returns the final stats
+    if tracker is None:
+        tracker = Tracker(model_path, backend=backend, imgsz=imgsz,
+                          court_roi=ViewTransformer().get_court_roi() if court_roi else None)
+    tracker.reset()
+
+    live_source = LiveSource(source, FrameBuffer(buffer_size, policy), realtime=realtime, fps=fps)
+    stats_file = open(stats_path, 'a') if stats_path else None
+
+    def on_stats(stats):
+        print_stats(stats)
+        if stats_file is not None:
+            stats_file.write(json.dumps(stats) + '\n')
+            stats_file.flush()
+
+    report_aggregator = ReportAggregator(min_frames=REPORT_MIN_FRAMES, fps=live_source.fps)
+    analyzer = LiveAnalyzer(tracker, live_source, max_latency=max_latency, report_aggregator=report_aggregator,
+                            keep_tracks=output_tracks_path is not None, stats_interval=stats_interval, on_stats=on_stats)
+
+    # Ctrl-C and the time limit end the stream, what is analyzed so far is still saved
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGINT, lambda signum, frame: analyzer.stop())
+    timer = threading.Timer(seconds, analyzer.stop) if seconds else None
+    if timer is not None:
+        timer.start()
+
+    try:
+        frames = analyzer.frames()
+        if show:
+            frames = show_frames(frames, on_quit=analyzer.stop)
+        if output_video_path is not None:
+            save_video(frames, output_video_path, live_source.fps)
+        else:
+            for _ in frames:
+                pass
+    finally:
+        if timer is not None:
+            timer.cancel()
+        if stats_file is not None:
+            stats_file.close()
+
+    stats = analyzer.get_stats()
+    print_stats(stats)
+    print(f"Read {stats['frames_read']} frames, analyzed {stats['frames_analyzed']}, "
+          f"max latency {stats['latency_max'] * 1000:.0f} ms")
+
+    if output_report_dir is not None:
+        generate_scouting_report(analyzer.tracks, output_dir=output_report_dir, report_aggregator=report_aggregator)
+    if output_tracks_path is not None:
+        save_track_file(analyzer.tracks, output_tracks_path)
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Analyze a live stream")
+    parser.add_argument('source', help="capture device index, stream URL, named pipe or video file")
+    parser.add_argument('--model', default='models/basketbal_computer_vision.pt')
+    parser.add_argument('--output-video', help="also save the annotated frames")
+    parser.add_argument('--show', action='store_true', help="show the annotated frames, q quits")
+    parser.add_argument('--policy', choices=DROP_POLICIES, default='drop_oldest',
+                        help="what happens to new frames while the analysis is behind")
+    parser.add_argument('--buffer', type=int, default=2, help="frames that can wait for the analysis")
+    parser.add_argument('--max-latency', type=float, default=0.5,
+                        help="seconds after capture a frame is still analyzed, older ones are skipped")
+    parser.add_argument('--no-realtime', action='store_true', help="read a file as fast as possible instead of at its fps")
+    parser.add_argument('--fps', type=float, help="for sources that don't know their fps")
+    parser.add_argument('--court-roi', action='store_true')
+    parser.add_argument('--backend', default='auto', help="auto, torch, onnx or openvino")
+    parser.add_argument('--imgsz', type=int, default=640, help="inference resolution, lower is faster")
+    parser.add_argument('--seconds', type=float, help="stop after this many seconds")
+    parser.add_argument('--stats-interval', type=float, default=1.0)
+    parser.add_argument('--stats-file', help="append the rolling stats as JSON lines")
+    parser.add_argument('--report-dir', help="write the scouting report of the session at the end")
+    parser.add_argument('--tracks', help="keep every track and save them as a track file at the end")
+    args = parser.parse_args()
+
+    run_live(args.source, args.model, output_video_path=args.output_video, show=args.show, policy=args.policy,
+             buffer_size=args.buffer, max_latency=args.max_latency, realtime=False if args.no_realtime else None,
+             fps=args.fps, court_roi=args.court_roi, backend=args.backend, imgsz=args.imgsz, seconds=args.seconds,
+             stats_interval=args.stats_interval, stats_path=args.stats_file, output_report_dir=args.report_dir,
+             output_tracks_path=args.tracks)
@@ -1,85 +1,390 @@
 # Very dependant on the quality of the footage
 
-from util import read_video, save_video
+import json
+import os
+import sys
+import time
+from contextlib import nullcontext
+from util import read_video, save_video, VideoReader, StageCache, StageProfiler, profile, get_profiler
 from trackers import Tracker
 from team_assigner import TeamAssigner
 from camera_movement_estimator import CameraMovementEstimator
 from view_transformer import ViewTransformer
 from speed_and_distance_estimator import SpeedAndDistance_Estimator
-from scouting_report_generator import ScoutingReportGenerator, GameStatsScraper
+from scouting_report_generator import ScoutingReportGenerator, ReportAggregator
+from annotation_renderer import AnnotationRenderer
+from track_store import TrackStore, save_track_file
+from pipeline import FrameProcessor, ThreadedPipeline, SegmentedVideoAnalyzer
 
+GAME_STATS_URL = 'https://www.sports-reference.com/cbb/boxscores/2025-04-07-20-houston.html#box-score-advanced-florida'
+GAME_STATS_TABLES = ['box-score-advanced-florida']
+# Players seen in fewer frames are left out of the report as false detections
+REPORT_MIN_FRAMES = 300
 
-def main():
-    # Read Videos and fps
-    video_frames, fps = read_video('video/test_clip_3.mp4')
 
-    # Init the tracker
-    tracker = Tracker('models/basketbal_computer_vision.pt')
+def main(streaming=False, pipelined=False, keyframe_interval=1, court_roi=False, profile_dir=None, cprofile_stage=None):
+    # The clip this was built on, batch.py runs analyze_video over many clips
+    analyze_video('video/test_clip_3.mp4',
+                  'models/basketbal_computer_vision.pt',
+                  output_video_path='output_videos/Bolt_atletics_analyzed.avi',
+                  output_tracks_path='output_tracks/Bolt_atletics_analyzed.tracks',
+                  output_report_dir='output_reports',
+                  streaming=streaming, pipelined=pipelined,
+                  keyframe_interval=keyframe_interval, court_roi=court_roi,
+                  stats_url=GAME_STATS_URL, profile_dir=profile_dir, cprofile_stage=cprofile_stage)
+    print("Done...")
+
+
+def analyze_video(video_path, model_path, output_video_path, output_tracks_path=None, output_report_dir='output_reports',
+                  streaming=False, pipelined=False, keyframe_interval=1, court_roi=False,
+                  tracker=None, cache_dir='cache', stats_url=None, profile_dir=None, cprofile_stage=None,
+                  database_path=None, game_name=None, progress=None, chunk_workers=None, segment_seconds=None,
+                  overlap_seconds=2.0):
+    # Whole analysis of one clip, returns a summary with the frame count, timing and output paths
+    # A tracker can be passed in so the model is loaded once for many clips, its tracking state is reset here
+    # With profile_dir the time and memory of every stage go to run_report.json and metrics.prom in it,
+    # cprofile_stage also runs that one stage (e.g. 'detect') under cProfile
+    # With database_path the tracks and the report are also added to the game database as game_name
+    # progress(stage, frames) is called as the stages start and for every frame drawn, raising in it stops the run
+    # chunk_workers cuts the video into segments that are analyzed on that many processes, see pipeline.segments
+    profiler = None
+    if profile_dir is not None:
+        profiler = StageProfiler(cprofile_stage=cprofile_stage, profile_dir=profile_dir)
+
+    with profiler or nullcontext():
+        start = time.perf_counter()
+        with VideoReader(video_path) as reader:
+            if not reader.is_opened():
+                raise IOError(f"Unable to open video file: {video_path}")
+            fps = reader.fps
+
+        view_transformer = ViewTransformer()
+        if tracker is None and not chunk_workers:
+            # keyframe_interval > 1 only runs the detector every few frames and fills the rest in
+            # court_roi only shows the detector the court, not the crowd
+            tracker = Tracker(model_path, keyframe_interval=keyframe_interval,
+                              court_roi=view_transformer.get_court_roi() if court_roi else None)
+        if tracker is not None:
+            tracker.reset()
+
+        # Keyframes need the camera movement of the whole clip first, only run_batch has it
+        interval = tracker.keyframe_interval if tracker is not None else keyframe_interval
+        if interval > 1 and (streaming or pipelined or chunk_workers):
+            print(f"Warning: keyframe_interval {interval} is only used in batch mode, every frame goes through the detector")
+
+        if chunk_workers:
+            # Every worker loads its own model, the segments are stitched into one game
+            tracks = run_chunked(video_path, model_path, output_video_path, chunk_workers, segment_seconds,
+                                 overlap_seconds, court_roi=court_roi, progress=progress)
+            report_progress(progress, 'report', len(tracks['players']))
+            generate_scouting_report(tracks, output_dir=output_report_dir, stats_url=stats_url, fps=fps)
+        elif streaming or pipelined:
+            # One pass over the video, only a small window of frames is kept in memory
+            # The report is aggregated while the frames go by, it is ready when the last one is drawn
+            run = run_pipelined if pipelined else run_streaming
+            report_aggregator = ReportAggregator(min_frames=REPORT_MIN_FRAMES, fps=fps)
+            tracks = run(video_path, model_path, output_video_path, tracker=tracker, report_aggregator=report_aggregator,
+                         progress=progress)
+            report_progress(progress, 'report', len(tracks['players']))
+            generate_scouting_report(tracks, output_dir=output_report_dir, stats_url=stats_url, report_aggregator=report_aggregator)
+        else:
+            tracks = run_batch(video_path, model_path, output_video_path, output_report_dir,
+                               tracker, view_transformer, cache_dir, stats_url, progress=progress)
+
+        if output_tracks_path is not None:
+            report_progress(progress, 'save_tracks', len(tracks['players']))
+            # Binary track file, memory mapped on load so reports and tools can open the game instantly
+            with profile('save_tracks', len(tracks['players'])):
+                save_track_file(tracks, output_tracks_path)
+
+        if database_path is not None:
+            report_progress(progress, 'database', len(tracks['players']))
+            with profile('database', len(tracks['players'])):
+                add_to_database(database_path, game_name or os.path.splitext(os.path.basename(video_path))[0],
+                                tracks, fps, video_path, output_report_dir)
+
+        number_of_frames = len(tracks['players'])
+        seconds = time.perf_counter() - start
+        summary = {
+            'video': video_path,
+            'frames': number_of_frames,
+            'seconds': seconds,
+            'fps': number_of_frames / seconds if seconds > 0 else 0.0,
+            'outputs': {'video': output_video_path, 'tracks': output_tracks_path, 'reports': output_report_dir,
+                        'database': database_path}
+        }
+
+    if profiler is not None:
+        profiler.info.update({'video': video_path, 'frames': summary['frames'],
+                              'mode': 'pipelined' if pipelined else 'streaming' if streaming else 'batch'})
+        profiler.save_json(os.path.join(profile_dir, 'run_report.json'))
+        profiler.save_prometheus(os.path.join(profile_dir, 'metrics.prom'),
+                                 labels={'video': os.path.basename(video_path)})
+        profiler.print_summary()
+        summary['outputs']['profile'] = profile_dir
+    return summary
+
 
-    tracks = tracker.get_obj_tracks(video_frames,
-                                    read_from_stub=True,
-                                    stub_path='stubs/track_stubs.pkl')
+def report_progress(progress, stage, frames):
+    if progress is not None:
+        progress(stage, frames)
 
-    # Get object positions 
-    tracker.add_position_to_tracks(tracks)
 
-    # Camera Movement Estimator
-    camera_movement_estimator = CameraMovementEstimator(video_frames[0])
-    camera_movement_per_frame = camera_movement_estimator.get_camera_movement(video_frames,
-                                                                                read_from_stub=True,
-                                                                                stub_path='stubs/camera_movement_stub.pkl')
-    camera_movement_estimator.add_adjust_positions_to_tracks(tracks,camera_movement_per_frame)
+def add_to_database(database_path, game_name, tracks, fps, video_path, report_dir):
+    # Every run becomes a game in the database, questions over many games don't need the pipeline again
+    sys.path.append('../')
+    from Database.db import GameDatabase
 
+    report = None
+    report_path = os.path.join(report_dir, 'scouting_report.json') if report_dir is not None else None
+    if report_path is not None and os.path.exists(report_path):
+        with open(report_path) as f:
+            report = json.load(f)
+    with GameDatabase(database_path) as db:
+        db.ingest_game(game_name, tracks, fps=fps, report=report, video=video_path)
 
-    # View Trasnformer
-    view_transformer = ViewTransformer()
-    view_transformer.add_transformed_position_to_tracks(tracks)
 
-    # Speed and distance estimator
-    speed_and_distance_estimator = SpeedAndDistance_Estimator()
-    speed_and_distance_estimator.add_speed_and_distance_to_tracks(tracks)
+def run_batch(video_path, model_path, output_video_path, output_report_dir, tracker, view_transformer, cache_dir='cache', stats_url=None,
+              progress=None):
+    # All frames in memory, every stage runs over the whole clip
+    # Read Videos and fps
+    report_progress(progress, 'read', 0)
+    video_frames, fps = read_video(video_path)
 
+    # Every stage result is cached by the hash of the video, the model and the stage parameters,
+    # a rerun starts at the first stage whose inputs changed
+    cache = StageCache(cache_dir)
 
-    # Assign Players to Teams
+    # Init the stages
+    camera_movement_estimator = CameraMovementEstimator(video_frames[0], fast_mode=True)
+    speed_and_distance_estimator = SpeedAndDistance_Estimator(frame_rate=fps)
     team_assigner = TeamAssigner()
-    team_assigner.assign_team_color(video_frames[0], tracks["players"][0])
 
-    for frame_num, player_track in enumerate(tracks['players']):
-        for player_id, track in player_track.items():
-            team = team_assigner.get_player_team(video_frames[frame_num],
-                                                 track['bbox'],
-                                                 player_id)
-            
-            tracks['players'][frame_num][player_id]['team'] = team
-            tracks['players'][frame_num][player_id]['team_color'] = team_assigner.team_colors[team]
+    def get_tracks(state):
+        # Columnar store, the stages work on whole arrays and the rest still sees the dict layout
+        # Keyframes and the court ROI need the camera movement first, without tracks there are no bodies to mask
+        camera_movement = None
+        if tracker.keyframe_interval > 1 or tracker.court_roi is not None:
+            with profile('camera_motion', len(video_frames)):
+                camera_movement = camera_movement_estimator.get_camera_movement(video_frames)
+        tracks = TrackStore.from_tracks(tracker.get_obj_tracks(video_frames, camera_movement=camera_movement))
+        return {'tracks': tracks}
 
+    number_of_frames = len(video_frames)
 
-    # Draw Output
-    # Draw Object Tracks
-    output_video_frames = tracker.draw_annotations(video_frames, tracks)
+    def add_positions(state):
+        # Get object positions
+        with profile('positions', number_of_frames):
+            tracker.add_position_to_tracks(state['tracks'])
+        return state
+
+    def add_camera_movement(state):
+        with profile('camera_motion', number_of_frames):
+            state['camera_movement'] = camera_movement_estimator.get_camera_movement(video_frames, tracks=state['tracks'])
+            camera_movement_estimator.add_adjust_positions_to_tracks(state['tracks'], state['camera_movement'])
+        return state
+
+    def add_transformed_positions(state):
+        with profile('view_transform', number_of_frames):
+            view_transformer.add_transformed_position_to_tracks(state['tracks'])
+        return state
 
-    # Draw Camera Movement
-    output_video_frames = camera_movement_estimator.draw_camera_movement(output_video_frames, camera_movement_per_frame)
+    def add_speed_and_distance(state):
+        with profile('speed', number_of_frames):
+            speed_and_distance_estimator.add_speed_and_distance_to_tracks(state['tracks'])
+        return state
 
-    # Draw Speed and Distance
-    speed_and_distance_estimator.draw_speed_and_distance(output_video_frames, tracks)
+    def add_teams(state):
+        # Assign Players to Teams
+        with profile('teams', number_of_frames):
+            team_assigner.assign_team_color(video_frames[0], state['tracks']["players"][0])
+            team_assigner.add_team_to_tracks(video_frames, state['tracks'])
+        return state
+
+    stages = [
+        ('tracks', {'video': cache.file_hash(video_path), 'model': cache.file_hash(model_path), **tracker.get_cache_params()}, get_tracks),
+        ('positions', {}, add_positions),
+        ('camera_movement', camera_movement_estimator.get_cache_params(), add_camera_movement),
+        ('view_transform', view_transformer.get_cache_params(), add_transformed_positions),
+        ('speed_and_distance', speed_and_distance_estimator.get_cache_params(), add_speed_and_distance),
+        ('teams', team_assigner.get_cache_params(), add_teams),
+    ]
+    if progress is not None:
+        # Cached stages don't run and don't report
+        stages = [(name, params, with_progress(progress, name, number_of_frames, fn)) for name, params, fn in stages]
+    state, stages_key = cache.run_stages(stages)
+    tracks = state['tracks']
+    camera_movement_per_frame = state['camera_movement']
+
+
+    # Draw Output
+    # Players, refs, ball, camera movement, speed and distance in one pass, drawn in place
+    renderer = AnnotationRenderer()
+    report_progress(progress, 'draw', number_of_frames)
+    output_video_frames = renderer.render(video_frames, tracks, camera_movement_per_frame)
 
     # Save video and match the fps
-    save_video(output_video_frames, 'output_videos/Bolt_atletics_analyzed.avi', fps)
+    report_progress(progress, 'save_video', number_of_frames)
+    save_video(output_video_frames, output_video_path, fps)
 
-    # Generate scouting report
-    ## Scrape Stats
-    stats_scraper = GameStatsScraper(url= 'https://www.sports-reference.com/cbb/boxscores/2025-04-07-20-houston.html#box-score-advanced-florida')
-    game_stats = stats_scraper.get_game_stats()
+    report_progress(progress, 'report', number_of_frames)
+    generate_scouting_report(tracks, cache, stages_key, output_dir=output_report_dir, stats_url=stats_url, fps=fps)
 
-    scouting_report = ScoutingReportGenerator()
-    report_data = scouting_report.generate_report(tracks, min_frames=300) # Add the gamestats_df when finished
+    print(f"Cache: {cache.stats()}")
+    profiler = get_profiler()
+    if profiler is not None:
+        profiler.info['cache'] = cache.stats()
+    return tracks
 
-    # Save scouting report
-    scouting_report.save_as_json()
-    scouting_report.save_as_pdf(logo_path='img/BB_Tagline.svg') # Add the gamestats_df when finished
 
-    print("Done...")
+def run_chunked(video_path, model_path, output_path, workers, segment_seconds=None, overlap_seconds=2.0, court_roi=False,
+                progress=None):
+    # A long video on several cores, the workers analyze overlapping segments and the track ids are stitched
+    # The court ROI needs the camera movement since the first frame, which a segment doesn't know
+    if court_roi:
+        print("Warning: The court ROI isn't used when the video is analyzed in segments")
+    with SegmentedVideoAnalyzer(model_path, workers=workers, segment_seconds=segment_seconds,
+                                overlap_seconds=overlap_seconds) as analyzer:
+        report_progress(progress, 'segments', 0)
+        with profile('segments'):
+            tracks, camera_movement_per_frame, fps = analyzer.get_tracks(video_path)
+        number_of_frames = tracks.num_frames
+        report_progress(progress, 'draw', number_of_frames)
+        with profile('draw', number_of_frames):
+            analyzer.render(video_path, tracks, camera_movement_per_frame, output_path, fps)
+    return tracks
+
+
+def with_progress(progress, name, frames, fn):
+    def run_stage(state):
+        progress(name, frames)
+        return fn(state)
+    return run_stage
+
+
+def run_streaming(video_path, model_path, output_path, court_roi=False, tracker=None, report_aggregator=None, progress=None):
+    reader = VideoReader(video_path)
+
+    if tracker is None:
+        tracker = Tracker(model_path, court_roi=ViewTransformer().get_court_roi() if court_roi else None)
+    frame_processor = FrameProcessor(tracker, reader.fps, report_aggregator)
+    renderer = AnnotationRenderer()
+
+    def draw_frame(frame_num, frame):
+        report_progress(progress, 'analyze', frame_num + 1)
+        return renderer.draw_frame(frame, frame_num, frame_processor.tracks, frame_processor.camera_movement_per_frame)
+
+    def annotated_frames():
+        for frame_batch in tracker.iter_frame_batches(frame for _, _, frame in reader):
+            # The ROI follows the camera movement known so far, one batch behind
+            if tracker.court_roi is not None:
+                tracker.court_roi.set_camera_movement(frame_processor.camera_movement_per_frame)
+            for frame, frame_tracks in zip(frame_batch, tracker.track_batch(frame_batch)):
+                frame_processor.add_frame(frame, frame_tracks)
+
+            # Frames are drawn and dropped as soon as their values are final
+            for frame_num, frame in frame_processor.pop_ready_frames():
+                yield draw_frame(frame_num, frame)
+
+        for frame_num, frame in frame_processor.finish():
+            yield draw_frame(frame_num, frame)
+
+    # Save the video while it is being produced and match the fps
+    save_video(annotated_frames(), output_path, reader.fps)
+
+    return frame_processor.tracks
+
+
+def run_pipelined(video_path, model_path, output_path, queue_size=8, show_queues=False, court_roi=False, tracker=None,
+                  report_aggregator=None, progress=None):
+    # Same result as run_streaming, but decoding, inference, post-processing and
+    # rendering/encoding run in their own threads connected by bounded queues
+    reader = VideoReader(video_path)
+
+    if tracker is None:
+        tracker = Tracker(model_path, court_roi=ViewTransformer().get_court_roi() if court_roi else None)
+    frame_processor = FrameProcessor(tracker, reader.fps, report_aggregator)
+    renderer = AnnotationRenderer()
+
+    def decode():
+        for frame_num, _, frame in reader:
+            yield frame
+
+    def infer(frames):
+        for frame_batch in tracker.iter_frame_batches(frames):
+            # The ROI follows the camera movement post_process has estimated so far
+            if tracker.court_roi is not None:
+                tracker.court_roi.set_camera_movement(frame_processor.camera_movement_per_frame)
+            yield from zip(frame_batch, tracker.detect_frames(frame_batch))
+
+    def post_process(detected_frames):
+        # ByteTrack and the speed estimation need the frames in order, so this stage has one thread
+        for frame, detection in detected_frames:
+            frame_processor.add_frame(frame, tracker.get_frame_tracks(detection))
+            yield from frame_processor.pop_ready_frames()
+        yield from frame_processor.finish()
+
+    def draw_frame(frame_num, frame):
+        report_progress(progress, 'analyze', frame_num + 1)
+        return renderer.draw_frame(frame, frame_num, frame_processor.tracks, frame_processor.camera_movement_per_frame)
+
+    def render_and_encode(ready_frames):
+        save_video((draw_frame(frame_num, frame) for frame_num, frame in ready_frames), output_path, reader.fps)
+
+    def print_queues(snapshot):
+        print("Queues: " + ", ".join(f"{name} {depth}/{queue_size}" for name, depth in snapshot.items()))
+
+    pipeline = ThreadedPipeline(queue_size=queue_size, on_stats=print_queues if show_queues else None)
+    pipeline.add_stage('decode', decode)
+    pipeline.add_stage('infer', infer)
+    pipeline.add_stage('post_process', post_process)
+    pipeline.add_stage('render_encode', render_and_encode)
+
+    try:
+        stats = pipeline.run()
+    finally:
+        reader.release()
+
+    print(f"Pipeline finished in {pipeline.elapsed:.1f}s, queue depth: {stats}")
+
+    return frame_processor.tracks
+
+
+def generate_scouting_report(tracks, cache=None, tracks_key=None, output_dir='output_reports', stats_url=None, report_aggregator=None,
+                             pdf=True, fps=24):
+    # fps is the frame rate of the video, the activity levels are per minute
+    with profile('report', 1):
+        # Generate scouting report
+        ## Scrape Stats
+        if stats_url is not None:
+            # requests, bs4 and pandas only load when stats are scraped
+            from scouting_report_generator import GameStatsScraper
+            stats_scraper = GameStatsScraper(url=stats_url, table_ids=GAME_STATS_TABLES)
+            game_stats = stats_scraper.get_game_stats()
+
+        scouting_report = ScoutingReportGenerator()
+        min_frames = REPORT_MIN_FRAMES
+        if report_aggregator is not None:
+            # Already aggregated while the video was processed
+            report_data = scouting_report.generate_report_from_aggregator(report_aggregator)
+        elif cache is not None:
+            # 'distance': 'delta', reports cached before the distance fix summed the cumulative distances
+            # fps, reports cached before that had activity levels per frame
+            report, _ = cache.get_or_compute('report', {'min_frames': min_frames, 'distance': 'delta', 'fps': fps},
+                                             lambda: dict(scouting_report.generate_report(tracks, min_frames=min_frames, fps=fps)),
+                                             parent_key=tracks_key)
+            scouting_report.report.update(report)
+            report_data = scouting_report.report
+        else:
+            report_data = scouting_report.generate_report(tracks, min_frames=min_frames, fps=fps) # Add the gamestats_df when finished
+
+        # Save scouting report
+        scouting_report.save_as_json(os.path.join(output_dir, 'scouting_report.json'))
+        if pdf:
+            scouting_report.save_as_pdf(os.path.join(output_dir, 'scouting_report.pdf'), logo_path='img/BB_Tagline.svg') # Add the gamestats_df when finished
+
+        return report_data
+
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
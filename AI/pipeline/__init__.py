@@ -0,0 +1,4 @@
+from .threaded_pipeline import ThreadedPipeline, PipelineStopped
+from .frame_processor import FrameProcessor
+from .live import LiveAnalyzer, LiveSource, FrameBuffer, LiveStats, DROP_POLICIES, show_frames
+from .segments import SegmentedVideoAnalyzer, plan_segments, stitch_segments, match_track_ids
@@ -0,0 +1,100 @@
+import sys
+from collections import deque
+sys.path.append('../')
+from camera_movement_estimator import CameraMovementEstimator
+from view_transformer import ViewTransformer
+from speed_and_distance_estimator import SpeedAndDistance_Estimator
+from team_assigner import TeamAssigner
+from scouting_report_generator import ReportAggregator
+from util import profile
+
+class FrameProcessor:
+    # Everything after detection and tracking for one frame at a time:
+    # positions, camera movement, court projection, team and speed/distance
+    # Frames are handed back once their values are final, the tracks stay in self.tracks
+    # and final frames also go into report_aggregator, so the report is ready with the last frame
+    def __init__(self, tracker, fps, report_aggregator=None):
+        self.tracker = tracker
+        self.view_transformer = ViewTransformer()
+        self.speed_and_distance_estimator = SpeedAndDistance_Estimator(frame_rate=fps)
+        self.team_assigner = TeamAssigner()
+        self.camera_movement_estimator = None
+        self.report_aggregator = report_aggregator if report_aggregator is not None else ReportAggregator(fps=fps)
+
+        self.tracks = {
+            "players": [],
+            "referees": [],
+            "ball": []
+        }
+        self.camera_movement_per_frame = []
+
+        # Frames wait here until their speed and distance are final
+        self.pending_frames = deque()
+
+    @property
+    def frame_count(self):
+        return len(self.tracks["players"])
+
+    def add_frame(self, frame, frame_tracks):
+        frame_num = self.frame_count
+        for object, object_track in frame_tracks.items():
+            self.tracks[object].append(object_track)
+
+        # Single frame view of the tracks, the dicts are shared so the stages write into self.tracks
+        frame_view = {object: [object_track] for object, object_track in frame_tracks.items()}
+
+        with profile('positions', 1):
+            self.tracker.add_position_to_tracks(frame_view)
+
+        with profile('camera_motion', 1):
+            if self.camera_movement_estimator is None:
+                self.camera_movement_estimator = CameraMovementEstimator(frame, fast_mode=True)
+            camera_movement = self.camera_movement_estimator.get_frame_camera_movement(frame, frame_tracks)
+            self.camera_movement_per_frame.append(camera_movement)
+            self.camera_movement_estimator.add_adjust_positions_to_tracks(frame_view, [camera_movement])
+
+        with profile('view_transform', 1):
+            self.view_transformer.add_transformed_position_to_tracks(frame_view)
+
+        with profile('teams', 1):
+            # The team colors come from the first frame with players on it, not always frame 0
+            # (an empty first frame, or live mode dropped it)
+            if not self.team_assigner.team_colors and len(frame_tracks["players"]) >= 2:
+                self.team_assigner.assign_team_color(frame, frame_tracks["players"])
+            if self.team_assigner.team_colors:
+                self.team_assigner.add_team_to_frame(frame, frame_tracks["players"], frame_num)
+
+        self.pending_frames.append((frame_num, frame))
+        return frame_num
+
+    def skip_frame(self):
+        # A frame that was dropped before it was analyzed (live mode) keeps its place with empty tracks,
+        # so frame numbers stay the source's and the speeds see the real time between analyzed frames
+        for object_tracks in self.tracks.values():
+            object_tracks.append({})
+        self.camera_movement_per_frame.append([0, 0])
+        return self.frame_count - 1
+
+    def forget_frame(self, frame_num):
+        # Live mode doesn't keep the history, a drawn frame is already in the report aggregator
+        for object_tracks in self.tracks.values():
+            object_tracks[frame_num] = {}
+
+    def pop_ready_frames(self):
+        # Yields (frame_num, frame) for every pending frame that is final
+        with profile('speed', self.frame_count - self.speed_and_distance_estimator.next_frame):
+            ready_frames = self.speed_and_distance_estimator.update_speed_and_distance(self.tracks)
+        while self.pending_frames and self.pending_frames[0][0] < ready_frames:
+            yield self.pop_frame()
+
+    def finish(self):
+        # End of the video, everything that is left becomes final
+        with profile('speed', self.frame_count - self.speed_and_distance_estimator.next_frame):
+            self.speed_and_distance_estimator.update_speed_and_distance(self.tracks, final=True)
+        while self.pending_frames:
+            yield self.pop_frame()
+
+    def pop_frame(self):
+        frame_num, frame = self.pending_frames.popleft()
+        self.report_aggregator.add_frame(self.tracks["players"][frame_num])
+        return frame_num, frame
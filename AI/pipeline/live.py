@@ -0,0 +1,256 @@
+import os
+import sys
+import threading
+import time
+from collections import deque
+import numpy as np
+import cv2
+sys.path.append('../')
+from annotation_renderer import AnnotationRenderer
+from scouting_report_generator import ReportAggregator
+from .frame_processor import FrameProcessor
+
+# What the FrameBuffer does with a new frame when it is full
+# drop_oldest: the oldest waiting frame goes, the lowest latency (default)
+# drop_newest: the new frame goes, what is waiting is analyzed first
+# block: the capture waits, nothing is dropped (only sensible for files, a device drops frames itself)
+DROP_POLICIES = ('drop_oldest', 'drop_newest', 'block')
+
+
+class FrameBuffer:
+    # Bounded buffer between the capture thread and the analysis, it never grows past capacity
+    def __init__(self, capacity=2, policy='drop_oldest'):
+        if policy not in DROP_POLICIES:
+            raise ValueError(f"policy has to be one of {', '.join(DROP_POLICIES)}")
+        self.capacity = max(1, capacity)
+        self.policy = policy
+        self.items = deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def put(self, item):
+        # False when the item (or the oldest one) was dropped
+        with self.condition:
+            if self.policy == 'block':
+                self.condition.wait_for(lambda: len(self.items) < self.capacity or self.closed)
+            if self.closed:
+                return False
+            kept = True
+            if len(self.items) >= self.capacity:
+                self.dropped += 1
+                kept = False
+                if self.policy == 'drop_newest':
+                    return False
+                self.items.popleft()
+            self.items.append(item)
+            self.condition.notify_all()
+            return kept
+
+    def get(self, timeout=None):
+        # The next item, None once the buffer is closed and empty (or after timeout)
+        with self.condition:
+            self.condition.wait_for(lambda: self.items or self.closed, timeout)
+            if not self.items:
+                return None
+            item = self.items.popleft()
+            self.condition.notify_all()
+            return item
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+class LiveSource:
+    # Reads a capture device (an index like '0'), a stream URL, a named pipe or a file on its own thread and
+    # puts (frame_num, capture_time, frame) into the buffer, frame_num counts every frame the source delivered
+    # A regular file is read at its own fps by default so it stands in for a camera, pipes and devices set their own pace
+    def __init__(self, source, buffer, realtime=None, fps=None):
+        self.source = source
+        self.buffer = buffer
+        self.capture = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+        if not self.capture.isOpened():
+            raise IOError(f"Unable to open the live source: {source}")
+        # Devices and pipes often don't know their fps
+        self.fps = fps or self.capture.get(cv2.CAP_PROP_FPS) or 30.0
+        self.realtime = os.path.isfile(str(source)) if realtime is None else realtime
+        self.frames_read = 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='live-capture', daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        self.buffer.close()
+
+    def run(self):
+        start = time.monotonic()
+        try:
+            while not self.stop_event.is_set():
+                ok, frame = self.capture.read()
+                if not ok:
+                    break
+                if self.realtime:
+                    delay = start + self.frames_read / self.fps - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                self.buffer.put((self.frames_read, time.monotonic(), frame))
+                self.frames_read += 1
+        finally:
+            self.capture.release()
+            self.buffer.close()
+
+
+class LiveStats:
+    # Rolling numbers over the last window seconds, plus totals since the start
+    def __init__(self, window=5.0):
+        self.window = window
+        self.start = time.monotonic()
+        self.processed = deque()  # (time, latency) of the analyzed frames
+        self.frames_analyzed = 0
+        self.dropped_stale = 0
+        self.max_latency = 0.0
+
+    def add_frame(self, now, latency):
+        self.processed.append((now, latency))
+        self.frames_analyzed += 1
+        self.max_latency = max(self.max_latency, latency)
+        while self.processed and self.processed[0][0] < now - self.window:
+            self.processed.popleft()
+
+    def get(self, source, frame_tracks, report_aggregator):
+        now = time.monotonic()
+        latencies = np.array([latency for _, latency in self.processed]) if self.processed else np.zeros(1)
+        window = min(self.window, now - self.start) or 1.0
+
+        # Players on the court in the last analyzed frame, by team
+        teams = {}
+        for player in frame_tracks.get('players', {}).values():
+            team = teams.setdefault(player.get('team', 0), {'players': 0, 'speeds': []})
+            team['players'] += 1
+            if player.get('speed') is not None:
+                team['speeds'].append(player['speed'])
+
+        leaders = sorted(report_aggregator.players.items(), key=lambda item: -item[1].distance)[:3]
+        return {
+            'seconds': now - self.start,
+            'frames_read': source.frames_read,
+            'frames_analyzed': self.frames_analyzed,
+            'dropped_buffer': source.buffer.dropped,
+            'dropped_stale': self.dropped_stale,
+            'buffer': len(source.buffer),
+            'fps': len(self.processed) / window,
+            'latency_p50': float(np.percentile(latencies, 50)),
+            'latency_p95': float(np.percentile(latencies, 95)),
+            'latency_max': self.max_latency,
+            'teams': {int(team): {'players': values['players'],
+                                  'average_speed': float(np.mean(values['speeds'])) if values['speeds'] else None}
+                      for team, values in teams.items()},
+            'distance_leaders': [{'player': int(player_id), 'distance': player.distance} for player_id, player in leaders],
+        }
+
+
+class LiveAnalyzer:
+    # Detection, tracking, camera movement, court projection, teams and speed one frame at a time as the frames come in
+    # A frame that would come out later than max_latency seconds after its capture is skipped (not with the block policy)
+    # Skipped frames and frames the buffer dropped keep their frame numbers, so the speeds see the real time between
+    # the analyzed frames
+    # on_stats gets LiveStats.get every stats_interval seconds, keep_tracks keeps all tracks for a track file at the end
+    def __init__(self, tracker, source, max_latency=0.5, report_aggregator=None, keep_tracks=False,
+                 stats_interval=1.0, on_stats=None, stats_window=5.0):
+        self.tracker = tracker
+        self.source = source
+        self.max_latency = max_latency if source.buffer.policy != 'block' else None
+        self.report_aggregator = report_aggregator if report_aggregator is not None else ReportAggregator(min_frames=0, fps=source.fps)
+        self.frame_processor = FrameProcessor(tracker, source.fps, self.report_aggregator)
+        self.renderer = AnnotationRenderer()
+        self.keep_tracks = keep_tracks
+        self.stats = LiveStats(stats_window)
+        self.stats_interval = stats_interval
+        self.on_stats = on_stats
+        self.last_frame_tracks = {}
+        self.processing_time = 0.0
+
+    @property
+    def tracks(self):
+        return self.frame_processor.tracks
+
+    def stop(self):
+        # The frames generator finishes what it has and ends
+        self.source.stop()
+
+    def get_stats(self):
+        return self.stats.get(self.source, self.last_frame_tracks, self.report_aggregator)
+
+    def is_late(self, capture_time):
+        # A frame that would come out after max_latency is skipped, but only while a newer one is waiting,
+        # otherwise a slow machine would skip every frame
+        if self.max_latency is None or not len(self.source.buffer):
+            return False
+        return time.monotonic() - capture_time + self.processing_time > self.max_latency
+
+    def frames(self):
+        # Annotated frames as they are ready, ends with the source or stop()
+        self.stats.start = time.monotonic()
+        self.source.start()
+        next_stats = time.monotonic() + self.stats_interval
+        try:
+            while True:
+                item = self.source.buffer.get()
+                if item is None:
+                    break
+                frame_num, capture_time, frame = item
+                if self.is_late(capture_time):
+                    self.stats.dropped_stale += 1
+                    continue
+
+                start = time.monotonic()
+                yield from self.process_frame(frame_num, capture_time, frame)
+                # Moving average, a single slow frame doesn't make the next ones look late
+                self.processing_time = 0.8 * self.processing_time + 0.2 * (time.monotonic() - start)
+
+                if self.on_stats is not None and time.monotonic() >= next_stats:
+                    next_stats = time.monotonic() + self.stats_interval
+                    self.on_stats(self.get_stats())
+        finally:
+            self.source.stop()
+
+    def process_frame(self, frame_num, capture_time, frame):
+        frame_processor = self.frame_processor
+        while frame_processor.frame_count < frame_num:
+            frame_processor.skip_frame()
+
+        # The ROI follows the camera movement known so far
+        if self.tracker.court_roi is not None:
+            self.tracker.court_roi.set_camera_movement(frame_processor.camera_movement_per_frame)
+        frame_tracks = self.tracker.track_batch([frame], [frame_num])[0]
+        frame_processor.add_frame(frame, frame_tracks)
+
+        # The incremental speed only looks back, so the frame is final right away
+        for ready_num, ready_frame in frame_processor.pop_ready_frames():
+            annotated = self.renderer.draw_frame(ready_frame, ready_num, frame_processor.tracks,
+                                                 frame_processor.camera_movement_per_frame)
+            self.last_frame_tracks = {object: frame_processor.tracks[object][ready_num] for object in frame_processor.tracks}
+            if not self.keep_tracks:
+                frame_processor.forget_frame(ready_num)
+            now = time.monotonic()
+            self.stats.add_frame(now, now - capture_time)
+            yield annotated
+
+
+def show_frames(frames, window_name='BoltAthletics live', on_quit=None):
+    # Shows the frames as they pass through, q or Esc calls on_quit
+    for frame in frames:
+        cv2.imshow(window_name, frame)
+        if cv2.waitKey(1) & 0xFF in (ord('q'), 27) and on_quit is not None:
+            on_quit()
+        yield frame
+    cv2.destroyWindow(window_name)
@@ -0,0 +1,336 @@
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+sys.path.append('../')
+from util import VideoReader, iter_video_range, get_bbox_iou_matrix, save_video
+from camera_movement_estimator import CameraMovementEstimator
+from view_transformer import ViewTransformer
+from team_assigner import TeamAssigner
+from speed_and_distance_estimator import SpeedAndDistance_Estimator
+from annotation_renderer import AnnotationRenderer
+from track_store import TrackStore
+
+# One long video on many cores: the video is cut into segments, every segment is detected, tracked,
+# camera compensated and projected in its own worker process, then the segments are stitched together
+# Every segment starts overlap frames early, those frames warm up ByteTrack and the camera movement and
+# are seen by both neighbours, the track ids of a segment are matched to the ids of the one before by the
+# box IoU over them. The camera movement is per frame (relative to the frame before), so the warmed up
+# estimator gives the first frame of a segment its movement relative to the last frame of the previous one
+# Teams, speed and distance need the whole game, they run once over the stitched tracks
+
+# Set in every worker process by init_segment_worker
+worker_tracker = None
+worker_error = None
+
+
+def plan_segments(number_of_frames, workers, fps, segment_seconds=None, overlap_seconds=2.0, min_segment_seconds=30):
+    # [(read_start, start, end)], the segment owns the frames start..end-1 and reads from read_start
+    # By default there is one segment per worker, segments shorter than min_segment_seconds aren't worth the overlap
+    overlap = max(1, int(round(overlap_seconds * fps)))
+    if segment_seconds:
+        length = int(segment_seconds * fps)
+    else:
+        length = math.ceil(number_of_frames / max(workers, 1))
+    length = max(length, int(min_segment_seconds * fps), 4 * overlap, 1)
+
+    segments = []
+    for start in range(0, number_of_frames, length):
+        end = min(start + length, number_of_frames)
+        segments.append((max(start - overlap, 0), start, end))
+    if len(segments) > 1 and segments[-1][2] - segments[-1][1] < length // 2:
+        # A short rest goes to the segment before
+        read_start, start, _ = segments[-2]
+        segments[-2:] = [(read_start, start, number_of_frames)]
+    if segments:
+        # Frame counts from the container can be off, the last segment reads to the end of the video
+        read_start, start, _ = segments[-1]
+        segments[-1] = (read_start, start, None)
+    return segments
+
+
+def init_segment_worker(model_path, options, threads_per_worker):
+    # Runs once per process like batch.init_worker, the model is loaded once for all segments of the worker
+    global worker_tracker, worker_error
+    if threads_per_worker:
+        for variable in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+            os.environ[variable] = str(threads_per_worker)
+        import cv2
+        cv2.setNumThreads(threads_per_worker)
+    try:
+        from trackers import Tracker
+        worker_tracker = Tracker(model_path, backend=options['backend'])
+    except Exception as e:
+        worker_error = f"Loading the model failed: {type(e).__name__}: {e}"
+
+
+def analyze_segment(video_path, read_start, start, end):
+    # Detection, tracking, positions, camera movement and court projection of one segment
+    # The tracks start at read_start (the overlap is needed for the stitching), the camera movement
+    # and the team color samples only cover the frames the segment owns
+    if worker_error is not None:
+        raise RuntimeError(worker_error)
+    segment_start = time.perf_counter()
+    tracker = worker_tracker
+    tracker.reset()
+    view_transformer = ViewTransformer()
+    team_assigner = TeamAssigner()
+    camera_movement_estimator = None
+
+    tracks = TrackStore()
+    camera_movement = []
+    # Up to vote_frames jersey colors per track, vote_stride frames apart, like TeamAssigner.collect_votes
+    color_samples = {}
+    last_sample = {}
+    first_colors = None
+
+    frame_num = read_start - 1
+    frames = (frame for _, frame in iter_video_range(video_path, read_start, end))
+    for frame_batch in tracker.iter_frame_batches(frames):
+        for frame, frame_tracks in zip(frame_batch, tracker.track_batch(frame_batch)):
+            frame_num += 1
+            frame_view = {object: [object_track] for object, object_track in frame_tracks.items()}
+            tracker.add_position_to_tracks(frame_view)
+
+            if camera_movement_estimator is None:
+                camera_movement_estimator = CameraMovementEstimator(frame, fast_mode=True)
+            movement = camera_movement_estimator.get_frame_camera_movement(frame, frame_tracks)
+            camera_movement_estimator.add_adjust_positions_to_tracks(frame_view, [movement])
+            view_transformer.add_transformed_position_to_tracks(frame_view)
+            tracks.append_frame(frame_tracks)
+
+            if frame_num < start:
+                continue
+            camera_movement.append(movement)
+
+            players = frame_tracks['players']
+            if first_colors is None and len(players) >= 2:
+                first_colors = team_assigner.get_player_colors([frame] * len(players), [track['bbox'] for track in players.values()])
+            voting_ids = [player_id for player_id in players
+                          if len(color_samples.get(player_id, ())) < team_assigner.vote_frames
+                          and frame_num - last_sample.get(player_id, -team_assigner.vote_stride) >= team_assigner.vote_stride]
+            if voting_ids:
+                colors = team_assigner.get_player_colors([frame] * len(voting_ids), [players[player_id]['bbox'] for player_id in voting_ids])
+                for player_id, color in zip(voting_ids, colors):
+                    last_sample[player_id] = frame_num
+                    color_samples.setdefault(player_id, []).append((frame_num, color))
+
+    return {'read_start': read_start, 'start': start, 'end': read_start + tracks.num_frames,
+            'tracks': tracks, 'camera_movement': camera_movement, 'color_samples': color_samples,
+            'first_colors': first_colors, 'seconds': time.perf_counter() - segment_start, 'pid': os.getpid()}
+
+
+def match_track_ids(previous, current, min_iou=0.3):
+    # previous and current are lists with the {track_id: bbox} of the same frames (the overlap)
+    # Returns {current id: previous id}, greedy on the mean IoU over the overlap frames the current id is in
+    iou_sums = {}
+    frames_present = {}
+    for previous_boxes, current_boxes in zip(previous, current):
+        for current_id in current_boxes:
+            frames_present[current_id] = frames_present.get(current_id, 0) + 1
+        if not previous_boxes or not current_boxes:
+            continue
+        previous_ids = list(previous_boxes)
+        current_ids = list(current_boxes)
+        iou = get_bbox_iou_matrix([previous_boxes[i] for i in previous_ids], [current_boxes[i] for i in current_ids])
+        for i, j in zip(*np.nonzero(iou)):
+            key = (current_ids[j], previous_ids[i])
+            iou_sums[key] = iou_sums.get(key, 0.0) + iou[i, j]
+
+    scores = sorted(((iou_sum / frames_present[current_id], current_id, previous_id)
+                     for (current_id, previous_id), iou_sum in iou_sums.items()), reverse=True)
+    matches = {}
+    used = set()
+    for score, current_id, previous_id in scores:
+        if score < min_iou:
+            break
+        if current_id in matches or previous_id in used:
+            continue
+        matches[current_id] = previous_id
+        used.add(previous_id)
+    return matches
+
+
+def get_frame_boxes(table, start, end):
+    # [{track_id: bbox}] of the frames start..end-1 of a TrackTable
+    offsets = table.frame_offsets
+    bboxes = table.column('bbox')
+    return [{int(table.track_id[row]): bboxes[row] for row in range(offsets[frame_num], offsets[frame_num + 1])}
+            for frame_num in range(start, min(end, table.num_frames))]
+
+
+def stitch_segments(results, min_iou=0.3, stitch_objects=('players', 'referees')):
+    # One TrackStore and camera movement list for the whole video from the results of analyze_segment, in order
+    # Returns (tracks, camera_movement, id_maps), id_maps[i] maps the segment's ids to the stitched ids
+    parts = []
+    camera_movement = []
+    id_maps = []
+    next_id = 1
+    previous = None
+
+    for result in results:
+        tracks = result['tracks']
+        owned = result['start'] - result['read_start']
+        id_map = {}
+        for object in stitch_objects:
+            table = tracks.tables[object]
+            matches = {}
+            if previous is not None and owned > 0:
+                # The overlap frames belong to the previous segment, its boxes there already have stitched ids
+                previous_table, previous_map, previous_read_start = previous
+                overlap_start = result['read_start'] - previous_read_start
+                previous_boxes = [{previous_map[track_id]: bbox for track_id, bbox in boxes.items()}
+                                  for boxes in get_frame_boxes(previous_table[object], overlap_start, overlap_start + owned)]
+                matches = match_track_ids(previous_boxes, get_frame_boxes(table, 0, owned), min_iou)
+
+            for track_id in np.unique(table.track_id[table.frame >= owned]):
+                track_id = int(track_id)
+                if track_id in matches:
+                    id_map[track_id] = matches[track_id]
+                elif track_id not in id_map:
+                    id_map[track_id] = next_id
+                    next_id += 1
+            # Ids that only live in the overlap are dropped with it
+            for track_id in np.unique(table.track_id[table.frame < owned]):
+                id_map.setdefault(int(track_id), -1)
+
+        part = tracks.get_frames(owned, tracks.num_frames)
+        for object in stitch_objects:
+            table = part.tables[object]
+            if table.size:
+                lookup = np.vectorize(id_map.get, otypes=[np.int64])
+                table.track_id[:] = lookup(table.track_id)
+
+        parts.append(part)
+        camera_movement.extend(result['camera_movement'])
+        id_maps.append(id_map)
+        previous = (tracks.tables, id_map, result['read_start'])
+
+    return TrackStore.concatenate(parts), camera_movement, id_maps
+
+
+def add_teams_from_samples(tracks, results, id_maps):
+    # Team colors from the first frame with players, then every stitched track votes with the
+    # jersey colors its segments sampled, the same votes TeamAssigner.collect_votes would count
+    team_assigner = TeamAssigner()
+    first_colors = next((result['first_colors'] for result in results if result['first_colors'] is not None), None)
+    if first_colors is None:
+        print("Warning: No frame with players, no teams assigned")
+        return team_assigner
+    team_assigner.fit_team_colors(first_colors)
+
+    for result, id_map in zip(results, id_maps):
+        for player_id, samples in result['color_samples'].items():
+            stitched_id = id_map.get(player_id, -1)
+            if stitched_id < 0:
+                continue
+            frame_nums = [frame_num for frame_num, _ in samples]
+            colors = np.array([color for _, color in samples], dtype=np.float64)
+            team_assigner.add_votes([stitched_id] * len(samples), frame_nums, colors)
+
+    for player_id in team_assigner.player_votes:
+        team_assigner.player_team_dict[player_id] = team_assigner.get_majority_team(player_id)
+    team_assigner.add_team_to_track_store(tracks)
+    return team_assigner
+
+
+def render_segment(video_path, start, end, tracks, camera_movement, output_path, fps):
+    # Draws the frames start..end-1, tracks and camera_movement only hold those frames
+    renderer = AnnotationRenderer()
+    frames = (renderer.draw_frame(frame, frame_num - start, tracks, camera_movement)
+              for frame_num, frame in iter_video_range(video_path, start, end))
+    save_video(frames, output_path, fps)
+    return output_path
+
+
+def concat_videos(paths, output_path, ffmpeg_path):
+    # Stream copy, the segments are joined without decoding or encoding again
+    list_path = output_path + '.segments.txt'
+    with open(list_path, 'w') as f:
+        for path in paths:
+            f.write(f"file '{os.path.abspath(path)}'\n")
+    try:
+        result = subprocess.run([ffmpeg_path, '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', list_path,
+                                 '-c', 'copy', output_path], capture_output=True)
+        if result.returncode != 0:
+            raise IOError(f"ffmpeg failed: {result.stderr.decode(errors='replace').strip()}")
+    finally:
+        os.remove(list_path)
+
+
+class SegmentedVideoAnalyzer:
+    # Runs the segments of one video on a pool of worker processes, every worker loads the model once
+    # workers=None uses one per CPU core, see plan_segments for segment_seconds and overlap_seconds
+    def __init__(self, model_path, workers=None, segment_seconds=None, overlap_seconds=2.0, min_iou=0.3, backend='auto'):
+        self.model_path = model_path
+        self.workers = workers or os.cpu_count() or 1
+        self.segment_seconds = segment_seconds
+        self.overlap_seconds = overlap_seconds
+        self.min_iou = min_iou
+        self.options = {'backend': backend}
+        self.executor = None
+
+    def __enter__(self):
+        # spawn, forking a process that already started torch or OpenCV threads can hang
+        threads_per_worker = max(1, (os.cpu_count() or 1) // self.workers)
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=init_segment_worker,
+                                            initargs=(self.model_path, self.options, threads_per_worker))
+        return self
+
+    def __exit__(self, *args):
+        self.executor.shutdown()
+        self.executor = None
+
+    def get_tracks(self, video_path):
+        # (tracks, camera_movement, fps) of the whole video with teams, speed and distance
+        with VideoReader(video_path) as reader:
+            if not reader.is_opened():
+                raise IOError(f"Unable to open video file: {video_path}")
+            number_of_frames, fps = reader.frame_count, reader.fps
+
+        segments = plan_segments(number_of_frames, self.workers, fps, self.segment_seconds, self.overlap_seconds)
+        if not segments:
+            raise IOError(f"No frames in video file: {video_path}")
+        print(f"{len(segments)} segments of about {(segments[0][2] or number_of_frames) / fps:.0f}s on {self.workers} workers")
+        futures = [self.executor.submit(analyze_segment, video_path, read_start, start, end)
+                   for read_start, start, end in segments]
+        results = []
+        for i, future in enumerate(futures):
+            result = future.result()
+            print(f"Segment {i + 1}/{len(segments)}: frames {result['start']}-{result['end']} in {result['seconds']:.1f}s")
+            results.append(result)
+
+        tracks, camera_movement, id_maps = stitch_segments(results, self.min_iou)
+        add_teams_from_samples(tracks, results, id_maps)
+        SpeedAndDistance_Estimator(frame_rate=fps).add_speed_and_distance_to_tracks(tracks)
+        return tracks, camera_movement, fps
+
+    def render(self, video_path, tracks, camera_movement, output_path, fps):
+        # With ffmpeg every worker draws and encodes its own part and the parts are joined by stream copy,
+        # without it the video is drawn in one pass here, joining would mean decoding and encoding everything again
+        ffmpeg_path = shutil.which('ffmpeg')
+        if ffmpeg_path is None or not output_path.lower().endswith('.avi'):
+            renderer = AnnotationRenderer()
+            save_video(renderer.render((frame for _, frame in iter_video_range(video_path, 0)), tracks, camera_movement),
+                       output_path, fps)
+            return
+
+        number_of_frames = tracks.num_frames
+        segments = plan_segments(number_of_frames, self.workers, fps, self.segment_seconds, overlap_seconds=0)
+        part_dir = tempfile.mkdtemp(prefix='segments_', dir=os.path.dirname(os.path.abspath(output_path)))
+        try:
+            futures = []
+            for i, (_, start, end) in enumerate(segments):
+                end = number_of_frames if end is None else end
+                futures.append(self.executor.submit(render_segment, video_path, start, end, tracks.get_frames(start, end),
+                                                    camera_movement[start:end], os.path.join(part_dir, f"{i:04d}.avi"), fps))
+            concat_videos([future.result() for future in futures], output_path, ffmpeg_path)
+        finally:
+            shutil.rmtree(part_dir, ignore_errors=True)
@@ -0,0 +1,161 @@
+import queue
+import threading
+import time
+
+# Marks the end of a stage's output
+END_OF_STREAM = object()
+
+
+class PipelineStopped(Exception):
+    # Raised inside a stage when another stage failed and everything has to shut down
+    pass
+
+
+class ThreadedPipeline:
+    # Runs stages in their own threads, connected by bounded queues
+    # The first stage is a function without arguments that yields items,
+    # every other stage gets an iterator over the previous stage's items and yields its own,
+    # the last stage just consumes. A full queue blocks the stage in front of it (backpressure)
+    def __init__(self, queue_size=8, monitor_interval=0.5, on_stats=None):
+        self.queue_size = queue_size
+        self.monitor_interval = monitor_interval
+        self.on_stats = on_stats
+        self.stages = []
+
+        self.queues = []
+        self.stop_event = threading.Event()
+        self.errors = []
+        self.queue_stats = {}
+        self.stage_items = {}
+
+    def add_stage(self, name, fn):
+        self.stages.append((name, fn))
+        return self
+
+    def queue_names(self):
+        return [f"{self.stages[i][0]}->{self.stages[i+1][0]}" for i in range(len(self.stages) - 1)]
+
+    def _put(self, out_queue, item):
+        while True:
+            if self.stop_event.is_set():
+                raise PipelineStopped()
+            try:
+                out_queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _iter_queue(self, in_queue):
+        while True:
+            if self.stop_event.is_set():
+                raise PipelineStopped()
+            try:
+                item = in_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is END_OF_STREAM:
+                return
+            yield item
+
+    def _run_stage(self, index):
+        name, fn = self.stages[index]
+        in_queue = self.queues[index - 1] if index > 0 else None
+        out_queue = self.queues[index] if index < len(self.queues) else None
+
+        try:
+            if in_queue is None:
+                outputs = fn()
+            else:
+                inputs = self._iter_queue(in_queue)
+                outputs = fn(inputs)
+
+            for item in outputs or ():
+                self.stage_items[name] += 1
+                if out_queue is not None:
+                    self._put(out_queue, item)
+
+            # The stage may stop reading early, the stage in front must not block on a full queue
+            if in_queue is not None:
+                for _ in inputs:
+                    pass
+
+            if out_queue is not None:
+                self._put(out_queue, END_OF_STREAM)
+
+        except PipelineStopped:
+            pass
+        except BaseException as e:
+            self.errors.append((name, e))
+            self.stop_event.set()
+
+    def _monitor(self, done_event):
+        names = self.queue_names()
+        while not done_event.wait(self.monitor_interval):
+            snapshot = {}
+            for name, stage_queue in zip(names, self.queues):
+                depth = stage_queue.qsize()
+                stats = self.queue_stats[name]
+                stats['samples'] += 1
+                stats['total'] += depth
+                stats['max'] = max(stats['max'], depth)
+                stats['last'] = depth
+                snapshot[name] = depth
+
+            if self.on_stats is not None:
+                self.on_stats(snapshot)
+
+    def stats(self):
+        # Per queue depth over the run, a queue that sits full points at a slow stage behind it
+        result = {}
+        for name, stats in self.queue_stats.items():
+            mean_depth = stats['total'] / stats['samples'] if stats['samples'] else 0
+            result[name] = {
+                'max_depth': stats['max'],
+                'mean_depth': round(mean_depth, 2),
+                'last_depth': stats['last'],
+                'capacity': self.queue_size
+            }
+        result['items'] = dict(self.stage_items)
+        return result
+
+    def run(self):
+        if len(self.stages) < 2:
+            raise ValueError("A pipeline needs at least two stages")
+
+        self.stop_event.clear()
+        self.errors = []
+        self.queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) - 1)]
+        self.queue_stats = {name: {'samples': 0, 'total': 0, 'max': 0, 'last': 0} for name in self.queue_names()}
+        self.stage_items = {name: 0 for name, _ in self.stages}
+
+        threads = [threading.Thread(target=self._run_stage, args=(i,), name=f"pipeline-{name}", daemon=True)
+                   for i, (name, _) in enumerate(self.stages)]
+
+        done_event = threading.Event()
+        monitor = threading.Thread(target=self._monitor, args=(done_event,), name="pipeline-monitor", daemon=True)
+
+        start = time.perf_counter()
+        monitor.start()
+        for thread in threads:
+            thread.start()
+
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=0.1)
+        except KeyboardInterrupt:
+            self.stop_event.set()
+            for thread in threads:
+                thread.join()
+            raise
+        finally:
+            done_event.set()
+            monitor.join()
+
+        self.elapsed = time.perf_counter() - start
+
+        if self.errors:
+            name, error = self.errors[0]
+            raise RuntimeError(f"Pipeline stage '{name}' failed: {error}") from error
+
+        return self.stats()
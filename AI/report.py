@@ -0,0 +1,56 @@
+# Scouting report (and game database entry) from saved tracks, without the video or the model, run from the AI folder:
+#   python report.py output_tracks/Bolt_atletics_analyzed.tracks
+#   python report.py output_tracks/game.tracks --output-dir output_reports/game --stats-url <box score url>
+#   python report.py stubs/track_stubs.pkl --no-pdf                  pickled tracks, only scouting_report.json
+#   python report.py output_tracks/game.tracks --no-report --database games.db --game "2025-04-07 houston-florida"
+# Nothing here imports torch or the detector, benchmarks/bench_import_time.py checks that it stays that way
+import argparse
+import os
+import pickle
+import sys
+import time
+from track_store import TrackStore, load_track_file
+from main import generate_scouting_report, add_to_database
+
+
+def load_tracks(path):
+    # Track file (a folder) from analyze_video, or a pickled tracks dict like the stubs
+    if os.path.isdir(path):
+        return load_track_file(path).to_track_store()
+    with open(path, 'rb') as f:
+        return TrackStore.from_tracks(pickle.load(f))
+
+
+def run_report(tracks_path, output_dir='output_reports', stats_url=None, pdf=True, report=True, database_path=None,
+               game_name=None, fps=24):
+    start = time.perf_counter()
+    tracks = load_tracks(tracks_path)
+    print(f"Loaded {tracks.num_frames} frames from {tracks_path} in {time.perf_counter() - start:.2f}s")
+
+    if report:
+        os.makedirs(output_dir, exist_ok=True)
+        report_data = generate_scouting_report(tracks, output_dir=output_dir, stats_url=stats_url, pdf=pdf, fps=fps)
+        print(f"Report with {len(report_data)} entries in {output_dir}")
+    if database_path is not None:
+        name = game_name or os.path.splitext(os.path.basename(tracks_path.rstrip('/')))[0]
+        add_to_database(database_path, name, tracks, fps, None, output_dir if report else None)
+        print(f"Added {name} to {database_path}")
+    print(f"Done in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Scouting report from saved tracks")
+    parser.add_argument('tracks', help="track file or pickled tracks")
+    parser.add_argument('--output-dir', default='output_reports')
+    parser.add_argument('--stats-url', help="box score page to scrape the game stats from")
+    parser.add_argument('--no-pdf', action='store_true', help="only scouting_report.json, reportlab isn't loaded")
+    parser.add_argument('--no-report', action='store_true', help="only add the tracks to --database")
+    parser.add_argument('--database', help="also add the game to this game database (SQLite file)")
+    parser.add_argument('--game', help="name of the game in the database, default is the file name")
+    parser.add_argument('--fps', type=float, default=24, help="fps of the video the tracks came from")
+    args = parser.parse_args()
+
+    if args.no_report and args.database is None:
+        parser.error("--no-report needs --database")
+    run_report(args.tracks, args.output_dir, stats_url=args.stats_url, pdf=not args.no_pdf, report=not args.no_report,
+               database_path=args.database, game_name=args.game, fps=args.fps)
@@ -1,2 +1,10 @@
-from .scouting_report_generator import ScoutingReportGenerator
-from .stats_scraper import GameStatsScraper
\ No newline at end of file
+# The names are imported on first use, the scraper pulls in requests, bs4 and pandas and the renderer reportlab
+from util.lazy_exports import lazy_exports
+
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'ScoutingReportGenerator': '.scouting_report_generator',
+    'GameStatsScraper': '.stats_scraper',
+    'ReportAggregator': '.report_aggregator', 'PlayerAggregate': '.report_aggregator', 'HistogramSketch': '.report_aggregator',
+    'ReportRenderer': '.report_renderer', 'render_report_pdf': '.report_renderer', 'render_summary_pdf': '.report_renderer',
+    'split_report': '.report_renderer',
+})
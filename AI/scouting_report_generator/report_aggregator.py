@@ -0,0 +1,286 @@
+import sys
+import numpy as np
+sys.path.append('../')
+from track_store import TrackStore
+
+# Online version of the scouting report: players are added frame by frame (or a chunk of frames at a time)
+# while the video is processed, every player keeps a fixed amount of state, and partial aggregates
+# of the same game (e.g. chunks processed by different workers) can be merged
+
+# Activity level from the distance covered per minute on the court (m/min), brisk walking is about 100 m/min
+HIGH_ACTIVITY_DISTANCE = 90
+MODERATE_ACTIVITY_DISTANCE = 60
+LOW_MOVEMENT_DISTANCE = 40
+
+
+class HistogramSketch:
+    # Fixed bins from 0 to max_value plus one overflow bin, quantiles are within bin_width/2
+    # Merging two sketches is adding their counts, so the result doesn't depend on the order
+    def __init__(self, bin_width=0.25, max_value=60.0):
+        self.bin_width = bin_width
+        self.max_value = max_value
+        self.counts = np.zeros(int(np.ceil(max_value / bin_width)) + 1, dtype=np.int64)
+
+    @property
+    def count(self):
+        return int(self.counts.sum())
+
+    def add(self, value):
+        self.counts[self.get_bin(value)] += 1
+
+    def add_values(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        bins = np.clip((values / self.bin_width).astype(np.int64), 0, len(self.counts) - 1)
+        self.counts += np.bincount(bins, minlength=len(self.counts))
+
+    def get_bin(self, value):
+        return min(max(int(value / self.bin_width), 0), len(self.counts) - 1)
+
+    def merge(self, other):
+        if self.bin_width != other.bin_width or len(self.counts) != len(other.counts):
+            raise ValueError("Can't merge histogram sketches with different bins")
+        self.counts += other.counts
+        return self
+
+    def quantile(self, q):
+        # Linear interpolation inside the bin, values in the overflow bin are reported as max_value
+        total = self.count
+        if total == 0:
+            return None
+        rank = q * total
+        cumulative = np.cumsum(self.counts)
+        index = min(int(np.searchsorted(cumulative, rank, side='left')), len(self.counts) - 1)
+        if index == len(self.counts) - 1:
+            return self.max_value
+        before = cumulative[index - 1] if index > 0 else 0
+        fraction = (rank - before) / self.counts[index] if self.counts[index] else 0.0
+        return float((index + fraction) * self.bin_width)
+
+
+class PlayerAggregate:
+    # Running totals of one track: frames, speed mean/max/sketch, the distance covered and team votes
+    # 'distance' in the tracks is cumulative per track, so only the increase since the last frame is added
+    # The first value an aggregate sees is counted from 0, first_distance keeps it so merge can count
+    # it from where the aggregate before stopped instead
+    def __init__(self):
+        self.frames_present = 0
+        self.speed_count = 0
+        self.speed_sum = 0.0
+        self.speed_max = None
+        self.speed_sketch = HistogramSketch()
+        self.distance = 0.0
+        self.first_distance = None
+        self.last_distance = None
+        self.team_counts = {}
+
+    def add(self, speed=None, distance=None, team=None):
+        # One frame, plain float math, this runs for every player of every frame
+        self.frames_present += 1
+        if speed is not None:
+            self.speed_count += 1
+            self.speed_sum += speed
+            if self.speed_max is None or speed > self.speed_max:
+                self.speed_max = float(speed)
+            self.speed_sketch.add(speed)
+        if distance is not None:
+            if self.first_distance is None:
+                self.first_distance = float(distance)
+            if self.last_distance is None or distance < self.last_distance:
+                self.distance += distance
+            else:
+                self.distance += distance - self.last_distance
+            self.last_distance = float(distance)
+        if team is not None:
+            self.team_counts[int(team)] = self.team_counts.get(int(team), 0) + 1
+
+    def add_speeds(self, speeds):
+        speeds = np.asarray(speeds, dtype=np.float64)
+        if len(speeds) == 0:
+            return
+        self.speed_count += len(speeds)
+        self.speed_sum += float(speeds.sum())
+        speed_max = float(speeds.max())
+        self.speed_max = speed_max if self.speed_max is None else max(self.speed_max, speed_max)
+        self.speed_sketch.add_values(speeds)
+
+    def add_distances(self, distances):
+        # Cumulative distances in frame order, a value lower than the last one means the count started over
+        distances = np.asarray(distances, dtype=np.float64)
+        if len(distances) == 0:
+            return
+        if self.first_distance is None:
+            self.first_distance = float(distances[0])
+        previous = np.empty(len(distances))
+        previous[0] = self.last_distance if self.last_distance is not None else 0.0
+        previous[1:] = distances[:-1]
+        deltas = distances - previous
+        deltas[deltas < 0] = distances[deltas < 0]
+        self.distance += float(deltas.sum())
+        self.last_distance = float(distances[-1])
+
+    def add_teams(self, teams):
+        teams, counts = np.unique(np.asarray(teams, dtype=np.int64), return_counts=True)
+        for team, count in zip(teams, counts):
+            self.team_counts[int(team)] = self.team_counts.get(int(team), 0) + int(count)
+
+    def merge(self, other):
+        # other has to cover different frames, e.g. the next chunk of the video
+        self.frames_present += other.frames_present
+        self.speed_count += other.speed_count
+        self.speed_sum += other.speed_sum
+        if other.speed_max is not None:
+            self.speed_max = other.speed_max if self.speed_max is None else max(self.speed_max, other.speed_max)
+        self.speed_sketch.merge(other.speed_sketch)
+        self.distance += other.distance
+        if other.first_distance is not None and self.last_distance is not None \
+                and other.first_distance >= self.last_distance:
+            # other counted its first value from 0, the player only moved from where this aggregate stopped
+            # (a lower value means the count started over, then other counted it right)
+            self.distance -= self.last_distance
+        if self.first_distance is None:
+            self.first_distance = other.first_distance
+        if other.last_distance is not None:
+            self.last_distance = other.last_distance
+        for team, count in other.team_counts.items():
+            self.team_counts[team] = self.team_counts.get(team, 0) + count
+        return self
+
+    @property
+    def average_speed(self):
+        return self.speed_sum / self.speed_count if self.speed_count else 0
+
+    @property
+    def team(self):
+        # The team the player was assigned to most often
+        return max(self.team_counts, key=self.team_counts.get) if self.team_counts else None
+
+
+class ReportAggregator:
+    # Feed it with add_frame(players of one frame) or add_tracks(tracks), get_report() returns
+    # the same report ScoutingReportGenerator.generate_report makes from the whole tracks
+    # fps is the frame rate of the video, it turns the frames a player was seen into minutes
+    def __init__(self, min_frames=300, fps=24):
+        self.min_frames = min_frames
+        self.fps = fps if fps and fps > 0 else 24
+        self.players = {}
+        self.frames_seen = 0
+
+    def get_player(self, player_id):
+        player = self.players.get(player_id)
+        if player is None:
+            player = PlayerAggregate()
+            self.players[player_id] = player
+        return player
+
+    def add_frame(self, frame_players):
+        # frame_players is {track_id: track_info} of one frame, after speed and distance are final
+        for player_id, track in frame_players.items():
+            self.get_player(player_id).add(track.get("speed"), track.get("distance"), track.get("team"))
+        self.frames_seen += 1
+
+    def add_tracks(self, tracks, start=0, end=None):
+        # Frames [start, end) of a tracks dict or TrackStore
+        if isinstance(tracks, TrackStore):
+            self.add_track_table(tracks.tables["players"], start, end)
+            return
+        for frame_players in tracks["players"][start:end]:
+            self.add_frame(frame_players)
+
+    def add_track_table(self, table, start=0, end=None):
+        # Columnar version, one pass of array ops per player instead of per row
+        offsets = table.frame_offsets
+        end = table.num_frames if end is None else min(end, table.num_frames)
+        if end <= start:
+            return
+        rows = np.arange(offsets[start], offsets[end])
+
+        track_ids = table.track_id[rows]
+        # Rows are in frame order, a stable sort by id keeps every player's rows in frame order
+        order = rows[np.argsort(track_ids, kind='stable')]
+        ids, first, counts = np.unique(table.track_id[order], return_index=True, return_counts=True)
+
+        speeds = table.column('speed')
+        has_speed = table.has_column('speed')
+        distances = table.column('distance')
+        has_distance = table.has_column('distance')
+        teams = table.column('team')
+        has_team = table.has_column('team')
+
+        # New players are added in order of their first frame, like the dict version
+        for index in np.argsort(order[first], kind='stable'):
+            player_rows = order[first[index]:first[index] + counts[index]]
+            player = self.get_player(int(ids[index]))
+            player.frames_present += int(counts[index])
+            player.add_speeds(speeds[player_rows][has_speed[player_rows]])
+            player.add_distances(distances[player_rows][has_distance[player_rows]])
+            player.add_teams(teams[player_rows][has_team[player_rows]])
+        self.frames_seen += end - start
+
+    def merge(self, other):
+        # Aggregates of different frames of the same game, e.g. from parallel workers
+        for player_id, player in other.players.items():
+            self.get_player(player_id).merge(player)
+        self.frames_seen += other.frames_seen
+        return self
+
+    def get_report(self, min_frames=None):
+        min_frames = self.min_frames if min_frames is None else min_frames
+        report = {}
+
+        total_team_speed = 0
+        total_team_distance = 0
+        total_players = 0
+
+        for player_id, player in self.players.items():
+            frames = player.frames_present
+
+            # Skip false detections (e.g., players detected for only a few frames)
+            if frames < min_frames:
+                continue
+
+            avg_speed = player.average_speed
+            total_distance = player.distance
+            minutes = frames / self.fps / 60
+            distance_per_minute = total_distance / minutes if minutes > 0 else 0
+
+            # Activity classification
+            if distance_per_minute > HIGH_ACTIVITY_DISTANCE:
+                activity_level = "Highly Active"
+            elif distance_per_minute > MODERATE_ACTIVITY_DISTANCE:
+                activity_level = "Moderately Active"
+            else:
+                activity_level = "Low Activity"
+
+            # Insightful notes
+            notes = []
+            if avg_speed > 8:
+                notes.append("High-speed mover")
+            if distance_per_minute < LOW_MOVEMENT_DISTANCE and frames > 300:
+                notes.append("Low movement for frame count – possible role player")
+
+            speed_p90 = player.speed_sketch.quantile(0.9)
+            report[player_id] = {
+                "average_speed": round(avg_speed, 2),
+                "max_speed": round(player.speed_max, 2) if player.speed_max is not None else 0,
+                "speed_p90": round(speed_p90, 2) if speed_p90 is not None else 0,
+                "total_distance": round(total_distance, 2),
+                "distance_per_minute": round(distance_per_minute, 1),
+                "frames_present": frames,
+                "team": player.team,
+                "activity_level": activity_level,
+                "notes": notes
+            }
+
+            # Accumulate for team averages
+            total_team_speed += avg_speed
+            total_team_distance += total_distance
+            total_players += 1
+
+        # Add team-wide stats
+        if total_players > 0:
+            report["TEAM_AVERAGES"] = {
+                "average_speed": round(total_team_speed / total_players, 2),
+                "average_distance": round(total_team_distance / total_players, 2)
+            }
+
+        return report
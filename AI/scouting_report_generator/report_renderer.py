@@ -0,0 +1,460 @@
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from svglib.svglib import svg2rlg
+from reportlab.graphics import renderPDF
+from reportlab.lib import colors
+from reportlab import rl_config
+
+# PDF rendering of scouting reports, one at a time (ScoutingReportGenerator.save_as_pdf) or many at once
+# with ReportRenderer, e.g. every game of a season split per player and per team, in worker processes
+# Parsed logos and registered fonts are kept per process, parsing the SVG logo is most of a report's time
+
+# Binary (only zlib compressed) streams, ASCII85 is pure Python here and makes the files a quarter bigger
+rl_config.useA85 = 0
+
+# --- Margin Settings ---
+TOP_MARGIN = 60
+BOTTOM_MARGIN = 50
+LEFT_MARGIN = 50
+RIGHT_MARGIN = 50
+MARGIN_BUFFER = 20  # Buffer space before bottom
+PLAYER_BLOCK_HEIGHT = 120  # Height of each player block, including the margin
+PLAYER_BLOCK_SPACING = 60  # Space between player blocks
+
+# Built in PDF fonts, a role can also be (name, path to a .ttf)
+DEFAULT_FONTS = {'regular': 'Helvetica', 'bold': 'Helvetica-Bold'}
+
+# (path, modification time, scale) -> parsed logo
+logo_cache = {}
+registered_fonts = set()
+
+
+def get_logo(logo_path, scale=0.15):
+    # ('svg', Drawing) or ('image', ImageReader), None when there is no logo
+    if not logo_path or not os.path.exists(logo_path):
+        return None
+    key = (os.path.abspath(logo_path), os.path.getmtime(logo_path), scale)
+    logo = logo_cache.get(key)
+    if logo is None:
+        if logo_path.lower().endswith(".svg"):
+            drawing = svg2rlg(logo_path)
+            drawing.width *= scale
+            drawing.height *= scale
+            drawing.scale(scale, scale)
+            logo = ('svg', drawing)
+        else:
+            logo = ('image', ImageReader(logo_path))
+        logo_cache[key] = logo
+    return logo
+
+
+def draw_svg_logo(c, drawing, x, y, name='logo'):
+    # The drawing goes into a form once per document, pages showing the logo again only reference it
+    if not c.hasForm(name):
+        lower_x, lower_y, upper_x, upper_y = drawing.getBounds()
+        c.beginForm(name, lower_x, lower_y, upper_x, upper_y)
+        renderPDF.draw(drawing, c, 0, 0)
+        c.endForm()
+    c.saveState()
+    c.translate(x, y)
+    c.doForm(name)
+    c.restoreState()
+
+
+def get_fonts(fonts=None):
+    # Registers TrueType fonts once per process and returns {role: font name}
+    resolved = dict(DEFAULT_FONTS)
+    for role, font in (fonts or {}).items():
+        if isinstance(font, (tuple, list)):
+            name, path = font
+            if name not in registered_fonts:
+                pdfmetrics.registerFont(TTFont(name, path))
+                registered_fonts.add(name)
+            font = name
+        resolved[role] = font
+    return resolved
+
+
+def draw_logo(c, logo, width, height):
+    if logo is None:
+        return
+    kind, value = logo
+    if kind == 'svg':
+        # --- SVG LOGO POSITIONING SETTINGS ---
+        logo_x = width - 120  # Horizontal position from left
+        logo_y = height - 70  # Vertical position from bottom
+        draw_svg_logo(c, value, logo_x, logo_y)
+    else:
+        logo_width, logo_height = 100, 50  # Default for raster logos
+        c.drawImage(value, 50, height - 50 - logo_height, logo_width, logo_height)
+
+
+def draw_title(c, title, fonts, width, height):
+    # Title and rule, returns the y below them
+    c.setFont(fonts['bold'], 16)
+    c.setFillColor(colors.HexColor("#3478F8"))
+    text_width = c.stringWidth(title, fonts['bold'], 16)
+    title_x = (width - text_width) / 2
+    title_y = height - TOP_MARGIN
+    c.drawString(title_x, title_y, title)
+    c.setFillColor(colors.black)
+
+    # --- Horizontal Rule ---
+    line_y = title_y - 20  # Position of the line
+    c.setStrokeColor(colors.HexColor("#F68718"))
+    c.setLineWidth(1.5)
+    c.line(LEFT_MARGIN, line_y, width - RIGHT_MARGIN, line_y)
+
+    # Set initial Y position after title and rule
+    return line_y - MARGIN_BUFFER
+
+
+def draw_report(c, report, title="SCOUTING REPORT", logo=None, game_stats_df=None, fonts=DEFAULT_FONTS):
+    width, height = letter
+    draw_logo(c, logo, width, height)
+    y = draw_title(c, title, fonts, width, height)
+
+    # --- Game Stats ---
+    if game_stats_df is not None:
+        c.setFont(fonts['regular'], 10)
+        c.setFillColor(colors.black)
+        c.drawString(LEFT_MARGIN, y, "Game Stats (Advanced Box Score):")
+        y -= 18
+
+        # Flattening multi-level columns for easier access, the DataFrame itself is left as it is
+        header = ['_'.join(col).strip() if isinstance(col, tuple) else str(col) for col in game_stats_df.columns.values]
+
+        # Display cleaned game stats (advanced box score) in tabular format
+        column_widths = [100, 50, 50, 50, 50, 50, 50, 50, 50, 50, 50, 50, 50, 50, 50, 50, 50]  # Example column widths
+
+        # Draw table header
+        c.setFont(fonts['bold'], 10)
+        for i, header_name in enumerate(header):
+            c.drawString(LEFT_MARGIN + sum(column_widths[:i]), y, header_name)
+        y -= 15
+
+        # Draw table rows
+        c.setFont(fonts['regular'], 10)
+        for row in game_stats_df.itertuples(index=False):
+            for i, value in enumerate(row):
+                c.drawString(LEFT_MARGIN + sum(column_widths[:i]), y, str(value))
+            y -= 12
+            if y < BOTTOM_MARGIN:
+                c.showPage()  # Start a new page if space runs out
+                c.setFont(fonts['regular'], 10)
+                y = height - TOP_MARGIN  # Reset Y to top of new page
+        y -= 10  # Extra space after game stats section
+
+    # --- Player Stats ---
+    c.setFont(fonts['regular'], 12)
+    for player_id, stats in report.items():
+        if player_id == "TEAM_AVERAGES":
+            continue
+
+        # Check if there is enough space for the player block, if not start a new page
+        if y - PLAYER_BLOCK_HEIGHT < BOTTOM_MARGIN:
+            c.showPage()  # Start a new page
+            c.setFont(fonts['regular'], 12)
+            y = height - TOP_MARGIN  # Reset Y to the top of the new page
+
+        # Draw a light grey block background for each player
+        c.setFillColor(colors.HexColor("#f0f0f0"))  # Light grey
+        c.setStrokeColor(colors.HexColor("#3478F8"))
+        c.rect(LEFT_MARGIN, y - PLAYER_BLOCK_HEIGHT, width - LEFT_MARGIN - RIGHT_MARGIN, PLAYER_BLOCK_HEIGHT, fill=1)  # Draw the rectangle
+
+        # Player Name
+        c.setFont(fonts['bold'], 14)
+        c.setFillColor(colors.black)
+        team = f" (Team {stats['team']})" if stats.get("team") is not None else ""
+        c.drawString(LEFT_MARGIN + 10, y - 20, f"Player {player_id}{team}:")
+        y -= 40  # Adjusting Y for player stats
+
+        # Player stats
+        c.setFont(fonts['regular'], 12)
+        if "average_speed" in stats:
+            c.drawString(LEFT_MARGIN + 10, y, f"Average Speed: {stats['average_speed']} km/h")
+        if "total_distance" in stats:
+            c.drawString(LEFT_MARGIN + 200, y, f"Total Distance: {stats['total_distance']} m")
+        if "frames_present" in stats:
+            c.drawString(LEFT_MARGIN + 400, y, f"Frames: {stats['frames_present']}")
+        y -= 18
+
+        if "max_speed" in stats:
+            c.drawString(LEFT_MARGIN + 10, y, f"Top Speed: {stats['max_speed']} km/h")
+        if "speed_p90" in stats:
+            c.drawString(LEFT_MARGIN + 200, y, f"90th Percentile Speed: {stats['speed_p90']} km/h")
+        y -= 18
+
+        if "activity_level" in stats:
+            per_minute = f" ({stats['distance_per_minute']} m/min)" if "distance_per_minute" in stats else ""
+            c.drawString(LEFT_MARGIN + 10, y, f"Activity Level: {stats['activity_level']}{per_minute}")
+            y -= 18
+
+        # Notes display
+        if "notes" in stats and stats["notes"]:
+            notes_line = f"Notes: {', '.join(stats['notes'])}"
+            c.drawString(LEFT_MARGIN + 10, y, notes_line)
+            y -= 18
+
+        # Add space before the next block
+        y -= PLAYER_BLOCK_SPACING  # Add vertical space between blocks
+
+    # --- Team Averages ---
+    if "TEAM_AVERAGES" in report:
+        c.showPage()
+        c.setFont(fonts['bold'], 16)
+        c.drawString(LEFT_MARGIN, height - TOP_MARGIN, "Team Averages")
+
+        team_stats = report["TEAM_AVERAGES"]
+        c.setFont(fonts['regular'], 12)
+        y = height - TOP_MARGIN - 50
+        if "average_speed" in team_stats:
+            c.drawString(LEFT_MARGIN, y, f"Average Speed: {team_stats['average_speed']} km/h")
+            y -= 20
+        if "average_distance" in team_stats:
+            c.drawString(LEFT_MARGIN, y, f"Average Distance: {team_stats['average_distance']} m")
+
+
+def render_report_pdf(report, path, title="SCOUTING REPORT", logo_path=None, game_stats_df=None, fonts=None):
+    # Returns the path, pages and seconds it took, to find slow layouts
+    start = time.perf_counter()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    c = canvas.Canvas(path, pagesize=letter)
+    draw_report(c, report, title, get_logo(logo_path), game_stats_df, get_fonts(fonts))
+    pages = c.getPageNumber()
+    c.save()
+    return {'path': path, 'title': title, 'pages': pages, 'players': count_players(report),
+            'seconds': time.perf_counter() - start}
+
+
+def count_players(report):
+    return sum(1 for player_id in report if player_id != "TEAM_AVERAGES")
+
+
+def get_team_averages(players):
+    if not players:
+        return None
+    return {
+        "average_speed": round(sum(stats["average_speed"] for stats in players.values()) / len(players), 2),
+        "average_distance": round(sum(stats["total_distance"] for stats in players.values()) / len(players), 2)
+    }
+
+
+def split_report(report, by='player'):
+    # {name: report} with one player or one team per report, teams get their own averages
+    players = {player_id: stats for player_id, stats in report.items() if player_id != "TEAM_AVERAGES"}
+    if by == 'player':
+        return {f"player_{player_id}": {player_id: stats} for player_id, stats in players.items()}
+    if by == 'team':
+        teams = {}
+        for player_id, stats in players.items():
+            if stats.get("team") is not None:
+                teams.setdefault(f"team_{stats['team']}", {})[player_id] = stats
+        for team_report in teams.values():
+            team_report["TEAM_AVERAGES"] = get_team_averages(team_report)
+        return teams
+    raise ValueError(f"Unknown report split '{by}', use 'player' or 'team'")
+
+
+def get_report_jobs(games, output_dir, per_player=False, per_team=False, title="SCOUTING REPORT"):
+    # games is {game name: report}, every game gets a report and optionally one per player and per team
+    jobs = []
+    for game, report in games.items():
+        jobs.append({'report': report, 'path': os.path.join(output_dir, game, 'scouting_report.pdf'),
+                     'title': f"{title} - {game}"})
+        splits = (['player'] if per_player else []) + (['team'] if per_team else [])
+        for by in splits:
+            for name, sub_report in split_report(report, by).items():
+                jobs.append({'report': sub_report, 'path': os.path.join(output_dir, game, f"{name}.pdf"),
+                             'title': f"{title} - {game} - {name.replace('_', ' ').title()}"})
+    return jobs
+
+
+def render_summary_pdf(games, path, title="SEASON SUMMARY", logo_path=None, fonts=None, top_players=3):
+    # One line per game and its most active players, a few games per page instead of a report each
+    start = time.perf_counter()
+    fonts = get_fonts(fonts)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    width, height = letter
+
+    c = canvas.Canvas(path, pagesize=letter)
+    logo = get_logo(logo_path)
+    draw_logo(c, logo, width, height)
+    y = draw_title(c, title, fonts, width, height)
+
+    columns = [("Game", 0), ("Players", 190), ("Avg Speed", 250), ("Avg Distance", 330), ("Top Speed", 420)]
+
+    def draw_header(y):
+        c.setFont(fonts['bold'], 10)
+        for name, x in columns:
+            c.drawString(LEFT_MARGIN + x, y, name)
+        return y - 16
+
+    y = draw_header(y)
+    for game, report in games.items():
+        players = {player_id: stats for player_id, stats in report.items() if player_id != "TEAM_AVERAGES"}
+        lines = 1 + min(top_players, len(players))
+        if y - lines * 13 < BOTTOM_MARGIN:
+            c.showPage()
+            y = draw_header(height - TOP_MARGIN)
+
+        team = report.get("TEAM_AVERAGES") or get_team_averages(players) or {}
+        top_speed = max((stats.get("max_speed", 0) for stats in players.values()), default=0)
+        values = [game[:32], len(players), f"{team.get('average_speed', '-')} km/h",
+                  f"{team.get('average_distance', '-')} m", f"{top_speed} km/h"]
+        c.setFont(fonts['regular'], 10)
+        for (_, x), value in zip(columns, values):
+            c.drawString(LEFT_MARGIN + x, y, str(value))
+        y -= 13
+
+        # Most distance first
+        c.setFont(fonts['regular'], 8)
+        c.setFillColor(colors.HexColor("#555555"))
+        ranked = sorted(players.items(), key=lambda item: -item[1].get("total_distance", 0))
+        for player_id, stats in ranked[:top_players]:
+            c.drawString(LEFT_MARGIN + 15, y, f"Player {player_id}: {stats.get('total_distance', 0)} m, "
+                                             f"{stats.get('average_speed', 0)} km/h average, {stats.get('max_speed', 0)} km/h top")
+            y -= 11
+        c.setFillColor(colors.black)
+        y -= 6
+
+    pages = c.getPageNumber()
+    c.save()
+    return {'path': path, 'title': title, 'pages': pages, 'players': sum(count_players(report) for report in games.values()),
+            'seconds': time.perf_counter() - start}
+
+
+# Set in every worker process by init_render_worker
+worker_logo_path = None
+worker_fonts = None
+
+
+def init_render_worker(logo_path, fonts):
+    # Parses the logo and registers the fonts once per process
+    global worker_logo_path, worker_fonts
+    worker_logo_path = logo_path
+    worker_fonts = fonts
+    get_logo(logo_path)
+    get_fonts(fonts)
+
+
+def run_render_job(job):
+    try:
+        result = render_report_pdf(job['report'], job['path'], job.get('title', "SCOUTING REPORT"),
+                                   worker_logo_path, job.get('game_stats_df'), worker_fonts)
+        result['status'] = 'done'
+    except Exception as e:
+        result = {'path': job['path'], 'title': job.get('title'), 'status': 'failed', 'error': f"{type(e).__name__}: {e}"}
+    result['pid'] = os.getpid()
+    return result
+
+
+class ReportRenderer:
+    # Renders many reports with the same logo and fonts, workers > 1 spreads them over processes
+    def __init__(self, workers=1, logo_path='img/BB_Tagline.svg', fonts=None):
+        self.workers = max(1, workers)
+        self.logo_path = logo_path
+        self.fonts = fonts
+
+    def render(self, jobs):
+        # jobs are {'report', 'path', 'title', 'game_stats_df'}, returns one timing per job in the same order
+        if self.workers == 1 or len(jobs) <= 1:
+            init_render_worker(self.logo_path, self.fonts)
+            return [run_render_job(job) for job in jobs]
+
+        # spawn like batch.py, the parent may already run OpenCV or torch threads
+        context = multiprocessing.get_context('spawn')
+        workers = min(self.workers, len(jobs))
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_render_worker,
+                                 initargs=(self.logo_path, self.fonts)) as executor:
+            return list(executor.map(run_render_job, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+
+    def render_games(self, games, output_dir, per_player=False, per_team=False, summary_path=None):
+        timings = self.render(get_report_jobs(games, output_dir, per_player, per_team))
+        if summary_path is not None:
+            summary = render_summary_pdf(games, summary_path, logo_path=self.logo_path, fonts=self.fonts)
+            summary['status'] = 'done'
+            timings.append(summary)
+        return timings
+
+
+def print_timings(timings, slowest=5):
+    done = [timing for timing in timings if timing['status'] == 'done']
+    seconds = sum(timing['seconds'] for timing in done)
+    print(f"Rendered {len(done)}/{len(timings)} reports, {seconds:.2f}s of render time "
+          f"({seconds / len(done) * 1000 if done else 0:.1f} ms per report)")
+    for timing in sorted(done, key=lambda timing: -timing['seconds'])[:slowest]:
+        print(f"  {timing['seconds'] * 1000:7.1f} ms  {timing['pages']} pages  {timing['players']} players  {timing['path']}")
+    for timing in timings:
+        if timing['status'] == 'failed':
+            print(f"  Failed {timing['path']}: {timing['error']}")
+
+
+def get_game_name(file_path):
+    # The job folder, batch.py and the API write <job>/reports/scouting_report.json, otherwise the folder of the file
+    folder = os.path.dirname(os.path.abspath(file_path))
+    if os.path.basename(folder) == 'reports':
+        folder = os.path.dirname(folder)
+    return os.path.basename(folder) or os.path.splitext(os.path.basename(file_path))[0]
+
+
+def load_games(paths):
+    # scouting_report.json files, folders are searched for them (other JSON there, done.json, summary.json,
+    # profiles... is left out), a file that isn't a report is skipped with a warning
+    games = {}
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(glob.glob(os.path.join(path, '**', 'scouting_report.json'), recursive=True))
+        else:
+            files = [path]
+        for file_path in files:
+            try:
+                with open(file_path) as f:
+                    report = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Warning: skipping {file_path}, {e}")
+                continue
+            if not isinstance(report, dict) or not all(isinstance(stats, dict) for stats in report.values()):
+                print(f"Warning: skipping {file_path}, it isn't a scouting report")
+                continue
+            name = get_game_name(file_path)
+            while name in games:
+                name += '_'
+            games[name] = report
+    return games
+
+if __name__ == '__main__':
+    # Run from the AI folder:
+    #   python scouting_report_generator/report_renderer.py batch_output --output-dir season_reports --workers 4 --per-player --summary season_reports/summary.pdf
+    parser = argparse.ArgumentParser(description="Render scouting report PDFs from report JSON files")
+    parser.add_argument('inputs', nargs='+', help="scouting_report.json files or folders with them")
+    parser.add_argument('--output-dir', default='output_reports')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--logo', default='img/BB_Tagline.svg')
+    parser.add_argument('--per-player', action='store_true')
+    parser.add_argument('--per-team', action='store_true')
+    parser.add_argument('--summary', help="also write a multi-game summary PDF to this path")
+    parser.add_argument('--timings', help="write the render time of every report to this JSON file")
+    args = parser.parse_args()
+
+    games = load_games(args.inputs)
+    if not games:
+        parser.error("no reports found")
+
+    renderer = ReportRenderer(workers=args.workers, logo_path=args.logo)
+    timings = renderer.render_games(games, args.output_dir, args.per_player, args.per_team, args.summary)
+    print_timings(timings)
+    if args.timings:
+        with open(args.timings, 'w') as f:
+            json.dump(timings, f, indent=4)
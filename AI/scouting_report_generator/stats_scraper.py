@@ -1,43 +1,225 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup, SoupStrainer
 import pandas as pd
 
+# Box score scraping: one pooled session with retries and a timeout, a rate limit shared by all threads,
+# an on-disk HTTP cache that revalidates with ETag / Last-Modified, and only the requested tables are parsed
+# Works against any base URL, e.g. a local server with saved pages (benchmarks/bench_scraper.py)
+
+DEFAULT_TABLE_IDS = ('box-score-advanced-florida',)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def get_session(pool_size=8, retries=3, backoff=0.5, user_agent='BoltAthletics stats scraper'):
+    # Connections are kept alive and reused, failed GETs are retried with backoff (and Retry-After on 429)
+    retry = Retry(total=retries, backoff_factor=backoff, status_forcelist=RETRY_STATUSES,
+                  allowed_methods=frozenset(['GET', 'HEAD']), respect_retry_after_header=True)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = user_agent
+    return session
+
+
+class RateLimiter:
+    # At most requests_per_second request starts, over all threads, None = no limit
+    def __init__(self, requests_per_second=None):
+        self.interval = 1 / requests_per_second if requests_per_second else 0
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class HttpCache:
+    # Pages by URL in cache_dir: <sha1>.html with the body and <sha1>.json with the validators
+    def __init__(self, cache_dir='cache/http'):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get_paths(self, url):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.html"), os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, url):
+        # (meta, body) or (None, None)
+        body_path, meta_path = self.get_paths(url)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            with open(body_path, 'rb') as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None, None
+        return meta, body
+
+    def put(self, url, body, etag=None, last_modified=None):
+        body_path, meta_path = self.get_paths(url)
+        meta = {'url': url, 'etag': etag, 'last_modified': last_modified, 'fetched_at': time.time()}
+        # Written to a temporary file first, other threads or processes may be reading the same page
+        self.write_atomic(body_path, body)
+        self.write_atomic(meta_path, json.dumps(meta, indent=4).encode('utf-8'))
+        return meta
+
+    def touch(self, url, meta):
+        # The server said 304, the cached page is fresh again
+        meta = dict(meta, fetched_at=time.time())
+        self.write_atomic(self.get_paths(url)[1], json.dumps(meta, indent=4).encode('utf-8'))
+        return meta
+
+    def write_atomic(self, path, data):
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+
+def find_table_html(page, table_id):
+    # Raw HTML of one table, also when it is inside an HTML comment (sports-reference hides most tables that way)
+    text = page.decode('utf-8', errors='replace') if isinstance(page, bytes) else page
+    match = re.search(r'<table\b[^>]*\bid=["\']' + re.escape(table_id) + r'["\']', text)
+    if match is None:
+        return None
+    end = text.find('</table>', match.end())
+    if end == -1:
+        return None
+    return text[match.start():end + len('</table>')]
+
+
+def parse_tables(page, table_ids=DEFAULT_TABLE_IDS):
+    # {table_id: DataFrame or None}, only the requested tables are parsed
+    # The tables are cut out of the raw page first, tables the search can't find (e.g. unquoted ids)
+    # come from a SoupStrainer pass that only builds <table> elements with those ids
+    table_ids = list(table_ids)
+    found = {table_id: find_table_html(page, table_id) for table_id in table_ids}
+
+    missing = [table_id for table_id, table_html in found.items() if table_html is None]
+    if missing:
+        soup = BeautifulSoup(page, 'lxml', parse_only=SoupStrainer('table', id=missing))
+        found.update({table.get('id'): str(table) for table in soup.find_all('table')})
+
+    return {table_id: pd.read_html(StringIO(found[table_id]))[0] if found.get(table_id) else None
+            for table_id in table_ids}
+
+
 class GameStatsScraper:
-    def __init__(self, url):
+    # url: the game page, table_ids: the ids of the tables to read from it
+    # cache_dir=None turns the HTTP cache off, max_age is how many seconds a cached page is used
+    # without asking the server (0 = always revalidate, None = never)
+    def __init__(self, url=None, table_ids=DEFAULT_TABLE_IDS, cache_dir='cache/http', max_age=0, timeout=10,
+                 retries=3, backoff=0.5, max_workers=4, requests_per_second=2.0, session=None):
         self.url = url
+        self.table_ids = tuple([table_ids] if isinstance(table_ids, str) else table_ids)
+        self.cache = HttpCache(cache_dir) if cache_dir else None
+        self.max_age = max_age
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.session = session or get_session(pool_size=max_workers, retries=retries, backoff=backoff)
+        self.rate_limiter = RateLimiter(requests_per_second)
+        self.stats_lock = threading.Lock()
+        self.stats = {'requests': 0, 'not_modified': 0, 'cache_hits': 0, 'errors': 0, 'bytes': 0}
+
         self.page = None
-        self.soup = None
 
-    def fetch_page(self):
+    def count(self, key, value=1):
+        with self.stats_lock:
+            self.stats[key] += value
+
+    def fetch(self, url):
+        # Page body, from the cache when it is fresh or the server says it didn't change, None on errors
+        meta, body = self.cache.get(url) if self.cache is not None else (None, None)
+        if meta is not None and (self.max_age is None or time.time() - meta['fetched_at'] < self.max_age):
+            self.count('cache_hits')
+            return body
+
+        headers = {}
+        if meta is not None:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        self.rate_limiter.wait()
         try:
-            response = requests.get(self.url)
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+            self.count('requests')
+            if response.status_code == 304 and meta is not None:
+                self.count('not_modified')
+                self.cache.touch(url, meta)
+                return body
             response.raise_for_status()  # Will raise an HTTPError if the HTTP request returned an unsuccessful status code
-            self.page = response.content
-            self.soup = BeautifulSoup(self.page, 'html.parser')
         except requests.exceptions.RequestException as e:
-            print(f"Error fetching the page: {e}")
-            self.soup = None
+            print(f"Error fetching the page {url}: {e}")
+            self.count('errors')
+            # An old copy is better than nothing
+            return body
+
+        self.count('bytes', len(response.content))
+        if self.cache is not None:
+            self.cache.put(url, response.content, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return response.content
+
+    def fetch_many(self, urls):
+        # {url: body or None}, max_workers at a time, the rate limit holds over all of them
+        urls = list(dict.fromkeys(urls))
+        if self.max_workers <= 1 or len(urls) <= 1:
+            return {url: self.fetch(url) for url in urls}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(urls))) as executor:
+            return dict(zip(urls, executor.map(self.fetch, urls)))
+
+    def get_tables(self, url=None, table_ids=None):
+        # {table_id: DataFrame or None} of one game
+        page = self.fetch(url or self.url)
+        table_ids = table_ids or self.table_ids
+        if page is None:
+            return {table_id: None for table_id in table_ids}
+        return parse_tables(page, table_ids)
+
+    def get_many_game_stats(self, urls, table_ids=None):
+        # {url: {table_id: DataFrame or None}}, pages are fetched concurrently and parsed as they are needed
+        table_ids = table_ids or self.table_ids
+        pages = self.fetch_many(urls)
+        return {url: parse_tables(page, table_ids) if page is not None else {table_id: None for table_id in table_ids}
+                for url, page in pages.items()}
+
+    def fetch_page(self):
+        self.page = self.fetch(self.url)
 
     def extract_table_data(self):
-        
-        if not self.soup:
+
+        if self.page is None:
             print("No page data to parse.")
             return None
-        
-        # Find the specific table based on an ID or class
-        table = self.soup.find('table', {'id': 'box-score-advanced-florida'})
-        if not table:
+
+        # First requested table, like before the table ids were a parameter
+        df = parse_tables(self.page, self.table_ids[:1])[self.table_ids[0]]
+        if df is None:
             print("Could not find the table on the page.")
-            return None
-        
-        # Use pandas to read the HTML table directly into a DataFrame
-        df = pd.read_html(str(table))[0]
         return df
 
     def get_game_stats(self):
-        
+
         self.fetch_page()
-        if self.soup:
+        if self.page is not None:
             return self.extract_table_data()
         else:
             return None
@@ -1,73 +1,185 @@
-import cv2
-import sys 
+import numpy as np
+import sys
+from collections import deque
 sys.path.append('../')
-from util import measure_distance ,get_foot_position
+from track_store import TrackStore
+from util import draw_speed_and_distance_label
 
 class SpeedAndDistance_Estimator():
-    def __init__(self):
-        self.frame_window=5
-        self.frame_rate=24
-    
+    def __init__(self, frame_rate=24, window_seconds=5/24):
+        # frame_rate should be the fps of the source video, the smoothing window follows it
+        self.frame_rate = frame_rate if frame_rate and frame_rate > 0 else 24
+        self.window_seconds = window_seconds
+        self.frame_window = max(1, int(round(self.frame_rate*self.window_seconds)))
+        self.reset()
+
+    def get_cache_params(self):
+        return {'frame_rate': self.frame_rate, 'frame_window': self.frame_window}
+
+    def reset(self):
+        # State of the incremental version, (object, track_id) -> recent positions and distance
+        self.track_state = {}
+        self.next_frame = 0
+
+    def compute_speed_and_distance(self, track_ids, frames, positions):
+        # Rows of many tracks at once, positions are court coordinates in meters (NaN = unknown)
+        # For every row returns the displacement since the previous observation of the track,
+        # the instantaneous speed, the speed smoothed over frame_window and the cumulative distance
+        track_ids = np.asarray(track_ids, dtype=np.int64)
+        frames = np.asarray(frames, dtype=np.int64)
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+
+        number_of_rows = len(frames)
+        result = {name: np.full(number_of_rows, np.nan) for name in ('displacement', 'speed_instant', 'speed', 'distance')}
+
+        valid = np.flatnonzero(~np.isnan(positions).any(axis=1))
+        if len(valid) == 0:
+            return result
+
+        # Time series per track, sorted by track then frame
+        order = valid[np.lexsort((frames[valid], track_ids[valid]))]
+        ids = track_ids[order]
+        f = frames[order]
+        p = positions[order]
+
+        new_track = np.ones(len(order), dtype=bool)
+        new_track[1:] = ids[1:] != ids[:-1]
+
+        # Frame differences to the previous observation of the same track
+        step = np.zeros(len(order))
+        step[1:] = np.linalg.norm(p[1:] - p[:-1], axis=1)
+        frame_gap = np.zeros(len(order), dtype=np.int64)
+        frame_gap[1:] = f[1:] - f[:-1]
+        step[new_track] = np.nan
+        frame_gap[new_track] = 0
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            speed_instant = step/(frame_gap/self.frame_rate)
+
+        # Start of the smoothing window, tracks can't overlap since their keys are far apart
+        keys = np.cumsum(new_track)*(int(f.max()) + self.frame_window + 1) + f
+        window_start = np.searchsorted(keys, keys - self.frame_window, side='left')
+
+        window_frames = f - f[window_start]
+        window_distance = np.linalg.norm(p - p[window_start], axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            speed = np.where(window_frames > 0, window_distance/(window_frames/self.frame_rate), np.nan)
+
+        # Distance is the smoothed speed integrated over time, so detection jitter doesn't add up
+        distance_step = np.nan_to_num(speed*(frame_gap/self.frame_rate))
+        distance = np.empty(len(order))
+        track_starts = np.flatnonzero(new_track)
+        for start, end in zip(track_starts, np.append(track_starts[1:], len(order))):
+            distance[start:end] = np.cumsum(distance_step[start:end])
+
+        result['displacement'][order] = step
+        result['speed_instant'][order] = speed_instant*3.6
+        result['speed'][order] = speed*3.6
+        result['distance'][order] = distance
+        return result
+
     def add_speed_and_distance_to_tracks(self,tracks):
-        total_distance= {}
+        self.reset()
+
+        if isinstance(tracks, TrackStore):
+            for table in tracks.tables.values():
+                rows = np.flatnonzero(table.has_column('position_transformed'))
+                result = self.compute_speed_and_distance(table.track_id[rows], table.frame[rows],
+                                                         table.column('position_transformed')[rows])
+                has_speed = ~np.isnan(result['speed'])
+                has_distance = ~np.isnan(result['distance'])
+                table.set_column('speed', result['speed'][has_speed], rows[has_speed])
+                table.set_column('distance', result['distance'][has_distance], rows[has_distance])
+            self.next_frame = tracks.num_frames
+            return
 
+        # Flatten every object into rows, compute all tracks with array ops and write back
         for object, object_tracks in tracks.items():
-            if object == "ball" or object == "referees":
-                continue 
-            number_of_frames = len(object_tracks)
-            for frame_num in range(0,number_of_frames, self.frame_window):
-                last_frame = min(frame_num+self.frame_window,number_of_frames-1 )
-
-                for track_id,_ in object_tracks[frame_num].items():
-                    if track_id not in object_tracks[last_frame]:
+            entries = []
+            track_ids = []
+            frames = []
+            positions = []
+            for frame_num, track in enumerate(object_tracks):
+                for track_id, track_info in track.items():
+                    position = track_info.get('position_transformed')
+                    if position is None:
                         continue
+                    entries.append(track_info)
+                    track_ids.append(track_id)
+                    frames.append(frame_num)
+                    positions.append(position)
 
-                    start_position = object_tracks[frame_num][track_id]['position_transformed']
-                    end_position = object_tracks[last_frame][track_id]['position_transformed']
+            if not entries:
+                continue
 
-                    if start_position is None or end_position is None:
+            result = self.compute_speed_and_distance(track_ids, frames, positions)
+            for track_info, speed, distance in zip(entries, result['speed'], result['distance']):
+                if not np.isnan(speed):
+                    track_info['speed'] = float(speed)
+                if not np.isnan(distance):
+                    track_info['distance'] = float(distance)
+
+        self.next_frame = len(tracks["players"])
+
+    def update_speed_and_distance(self,tracks,final=False):
+        # Incremental version for streaming, processes the frames added to tracks since the last call
+        # Only looks back, so every frame is final as soon as it is processed
+        # Returns the number of frames that have their final speed and distance
+        number_of_frames = len(tracks["players"])
+
+        for frame_num in range(self.next_frame, number_of_frames):
+            for object, object_tracks in tracks.items():
+                for track_id, track_info in object_tracks[frame_num].items():
+                    position = track_info.get('position_transformed')
+                    if position is None:
                         continue
-                    
-                    distance_covered = measure_distance(start_position,end_position)
-                    time_elapsed = (last_frame-frame_num)/self.frame_rate
-                    speed_meteres_per_second = distance_covered/time_elapsed
-                    speed_km_per_hour = speed_meteres_per_second*3.6
-
-                    if object not in total_distance:
-                        total_distance[object]= {}
-                    
-                    if track_id not in total_distance[object]:
-                        total_distance[object][track_id] = 0
-                    
-                    total_distance[object][track_id] += distance_covered
-
-                    for frame_num_batch in range(frame_num,last_frame):
-                        if track_id not in tracks[object][frame_num_batch]:
-                            continue
-                        tracks[object][frame_num_batch][track_id]['speed'] = speed_km_per_hour
-                        tracks[object][frame_num_batch][track_id]['distance'] = total_distance[object][track_id]
-    
+                    self.update_track(object, track_id, frame_num, position, track_info)
+
+        self.next_frame = number_of_frames
+        return number_of_frames
+
+    def update_track(self, object, track_id, frame_num, position, track_info):
+        # Same math as compute_speed_and_distance for one new observation
+        state = self.track_state.get((object, track_id))
+        if state is None:
+            state = {'window': deque(), 'distance': 0.0, 'last_frame': None}
+            self.track_state[(object, track_id)] = state
+
+        position = np.asarray(position, dtype=np.float64)
+        window = state['window']
+        while window and window[0][0] < frame_num - self.frame_window:
+            window.popleft()
+
+        speed = np.nan
+        if window:
+            start_frame, start_position = window[0]
+            window_distance = np.linalg.norm(position - start_position)
+            speed = window_distance/((frame_num - start_frame)/self.frame_rate)
+
+        if state['last_frame'] is not None and not np.isnan(speed):
+            state['distance'] += speed*((frame_num - state['last_frame'])/self.frame_rate)
+
+        window.append((frame_num, position))
+        state['last_frame'] = frame_num
+
+        if not np.isnan(speed):
+            track_info['speed'] = float(speed*3.6)
+        track_info['distance'] = state['distance']
+
     def draw_speed_and_distance(self,frames,tracks):
         output_frames = []
         for frame_num, frame in enumerate(frames):
             for object, object_tracks in tracks.items():
                 if object == "ball" or object == "referees":
-                    continue 
+                    continue
                 for _, track_info in object_tracks[frame_num].items():
                    if "speed" in track_info:
                        speed = track_info.get('speed',None)
                        distance = track_info.get('distance',None)
                        if speed is None or distance is None:
                            continue
-                       
-                       bbox = track_info['bbox']
-                       position = get_foot_position(bbox)
-                       position = list(position)
-                       position[1]+=40
-
-                       position = tuple(map(int,position))
-                       cv2.putText(frame, f"{speed:.2f} km/h",position,cv2.FONT_HERSHEY_SIMPLEX,0.5,(0,0,0),2)
-                       cv2.putText(frame, f"{distance:.2f} m",(position[0],position[1]+20),cv2.FONT_HERSHEY_SIMPLEX,0.5,(0,0,0),2)
+
+                       draw_speed_and_distance_label(frame, track_info['bbox'], speed, distance)
             output_frames.append(frame)
-        
-        return output_frames
\ No newline at end of file
+
+        return output_frames
@@ -1 +1,6 @@
-from .team_assigner import TeamAssigner
\ No newline at end of file
+# TeamAssigner is imported on first use, sklearn only when the team colors are fitted
+from util.lazy_exports import lazy_exports
+
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'TeamAssigner': '.team_assigner',
+})
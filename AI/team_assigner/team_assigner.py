@@ -1,53 +1,93 @@
-from sklearn.cluster import KMeans
+import sys
+import cv2
+import numpy as np
+sys.path.append('../')
+from track_store import TrackStore
 
 class TeamAssigner:
-    def __init__(self):
+    def __init__(self, vote_frames=5, vote_stride=12):
         self.team_colors = {}
         self.player_team_dict = {}
 
-    def get_clustering_model(self, img):
+        # Each track votes with up to vote_frames crops, at least vote_stride frames apart
+        self.vote_frames = vote_frames
+        self.vote_stride = vote_stride
+        self.player_votes = {}
+        self.player_last_vote = {}
 
-        # Reshape into 2d
-        img_2d = img.reshape(-1,3)
+        # Crops are resized to this many pixels per side so a whole batch fits in one array
+        self.crop_size = 16
+        self.color_batch_size = 256
 
-        # Do K-Means with 2 clusters
-        kmeans = KMeans(n_clusters=2, init="k-means++", n_init=1)
-        kmeans.fit(img_2d)
-
-        return kmeans
-    
+    def get_cache_params(self):
+        return {'vote_frames': self.vote_frames, 'vote_stride': self.vote_stride, 'crop_size': self.crop_size}
 
-    def get_player_color(self, frame, bbox):
-        img = frame[int(bbox[1]):int(bbox[3]), int(bbox[0]):int(bbox[2])]
+    def get_jersey_crop(self, frame, bbox):
+        x1, y1 = max(int(bbox[0]), 0), max(int(bbox[1]), 0)
+        x2, y2 = max(int(bbox[2]), 0), max(int(bbox[3]), 0)
+        img = frame[y1:y2, x1:x2]
 
         top_half_img = img[int(img.shape[0]*0.10):int(img.shape[0]*0.60), int(img.shape[1]*0.25):int(img.shape[1]*0.75)]
+        if top_half_img.size == 0:
+            return None
+
+        return cv2.resize(top_half_img, (self.crop_size, self.crop_size), interpolation=cv2.INTER_AREA)
+
+    def get_crop_colors(self, crops):
+        # Jersey color of many crops at once, crops is an (N, crop_size, crop_size, 3) BGR array
+        # Like the old per crop KMeans the border of the crop is taken as background,
+        # the jersey is the median of the pixels that are furthest from it in Lab space
+        number_of_crops = len(crops)
+        if number_of_crops == 0:
+            return np.zeros((0, 3))
+
+        size = self.crop_size
+        lab = cv2.cvtColor(crops.reshape(-1, size, 3), cv2.COLOR_BGR2LAB).reshape(number_of_crops, size, size, 3).astype(np.float32)
+
+        border = np.concatenate([lab[:, 0], lab[:, -1], lab[:, 1:-1, 0], lab[:, 1:-1, -1]], axis=1)
+        background = np.median(border, axis=1)
 
-        # Get Clustering Model
-        kmeans = self.get_clustering_model(top_half_img)
+        distance = np.linalg.norm(lab - background[:, None, None, :], axis=-1).reshape(number_of_crops, -1)
+        threshold = np.median(distance, axis=1)
+        player_mask = distance >= threshold[:, None]
 
-        # Get labels
-        labels = kmeans.labels_
+        pixels = crops.reshape(number_of_crops, -1, 3).astype(np.float64)
+        pixels = np.where(player_mask[:, :, None], pixels, np.nan)
 
-        # Reshape
-        clustered_image = labels.reshape(top_half_img.shape[0], top_half_img.shape[1])
+        return np.nanmedian(pixels, axis=1)
 
-        # Get player cluster
-        corner_clusters = [clustered_image[0,0], clustered_image[0,-1],clustered_image[-1,0],clustered_image[-1,-1]]
-        non_player_cluster = max(set(corner_clusters), key=corner_clusters.count)
-        player_cluster = 1 - non_player_cluster
+    def get_player_colors(self, frames, bboxes):
+        # One color per (frame, bbox) pair, NaN when the crop is empty
+        # The pairs can come from one frame or from a batch of frames
+        colors = np.full((len(bboxes), 3), np.nan)
+        crops = []
+        crop_indices = []
 
-        player_color = kmeans.cluster_centers_[player_cluster]
+        for i, (frame, bbox) in enumerate(zip(frames, bboxes)):
+            crop = self.get_jersey_crop(frame, bbox)
+            if crop is not None:
+                crops.append(crop)
+                crop_indices.append(i)
 
-        return player_color
+        if crops:
+            colors[crop_indices] = self.get_crop_colors(np.stack(crops))
+        return colors
+
+    def get_player_color(self, frame, bbox):
+        return self.get_player_colors([frame], [bbox])[0]
 
     def assign_team_color(self, frame, player_detections):
-        
-        player_colors = []
-        for _, player_detection in player_detections.items():
-            bbox = player_detection['bbox']
-            player_color = self.get_player_color(frame, bbox)
-            player_colors.append(player_color)
 
+        bboxes = [player_detection['bbox'] for _, player_detection in player_detections.items()]
+        self.fit_team_colors(self.get_player_colors([frame]*len(bboxes), bboxes))
+
+    def fit_team_colors(self, player_colors):
+        # The two team colors from jersey colors, e.g. of the players of one frame
+        player_colors = np.asarray(player_colors, dtype=np.float64).reshape(-1, 3)
+        player_colors = player_colors[~np.isnan(player_colors).any(axis=1)]
+
+        # sklearn only loads when teams are assigned
+        from sklearn.cluster import KMeans
         kmeans = KMeans(n_clusters=2, init="k-means++", n_init=1)
         kmeans.fit(player_colors)
 
@@ -57,17 +97,126 @@ class TeamAssigner:
         self.team_colors[1] = kmeans.cluster_centers_[0]
         self.team_colors[2] = kmeans.cluster_centers_[1]
 
+    def predict_teams(self, player_colors):
+        # Nearest team color, same as kmeans.predict without the per call overhead
+        centers = self.kmeans.cluster_centers_
+        distance = np.linalg.norm(np.asarray(player_colors)[:, None, :] - centers[None, :, :], axis=2)
+        return np.argmin(distance, axis=1) + 1 # 1 or 2
 
-    def get_player_team(self, frame, player_bbox, player_id):
-
+    def needs_vote(self, player_id, frame_num):
+        if player_id in self.player_team_dict:
+            return False
+        last_vote = self.player_last_vote.get(player_id)
+        return last_vote is None or frame_num is None or frame_num - last_vote >= self.vote_stride
+
+    def add_votes(self, player_ids, frame_nums, player_colors):
+        valid = ~np.isnan(player_colors).any(axis=1)
+        teams = np.zeros(len(player_ids), dtype=int)
+        if valid.any():
+            teams[valid] = self.predict_teams(player_colors[valid])
+
+        for player_id, frame_num, team in zip(player_ids, frame_nums, teams):
+            self.player_last_vote[player_id] = frame_num
+            if team == 0:
+                continue
+
+            votes = self.player_votes.setdefault(player_id, [0, 0])
+            votes[team - 1] += 1
+            if sum(votes) >= self.vote_frames:
+                self.player_team_dict[player_id] = self.get_majority_team(player_id)
+
+    def get_majority_team(self, player_id):
         if player_id in self.player_team_dict:
             return self.player_team_dict[player_id]
-        
-        player_color = self.get_player_color(frame, player_bbox)
-
-        team_id = self.kmeans.predict(player_color.reshape(1,-1))[0]
-        team_id+=1 # 1 or 0
 
-        self.player_team_dict[player_id] = team_id
-        
-        return team_id
\ No newline at end of file
+        # Ties go to team 1, players without a usable crop yet also start in team 1
+        votes = self.player_votes.get(player_id, [0, 0])
+        return 1 if votes[0] >= votes[1] else 2
+
+    def get_player_team(self, frame, player_bbox, player_id, frame_num=None):
+
+        if self.needs_vote(player_id, frame_num):
+            player_color = self.get_player_colors([frame], [player_bbox])
+            self.add_votes([player_id], [frame_num], player_color)
+
+        return self.get_majority_team(player_id)
+
+    def add_team_to_frame(self, frame, player_track, frame_num=None):
+        # Only needs the current frame, so it works on a list of frames or a stream
+        # The team is the majority of the votes so far, all crops of the frame are colored in one batch
+        voting_ids = [player_id for player_id in player_track if self.needs_vote(player_id, frame_num)]
+        if voting_ids:
+            bboxes = [player_track[player_id]['bbox'] for player_id in voting_ids]
+            player_colors = self.get_player_colors([frame]*len(bboxes), bboxes)
+            self.add_votes(voting_ids, [frame_num]*len(voting_ids), player_colors)
+
+        for player_id, track in player_track.items():
+            team = self.get_majority_team(player_id)
+
+            track['team'] = team
+            track['team_color'] = self.team_colors[team]
+
+    def collect_votes(self, video_frames, player_tracks):
+        # First pass over the video, samples up to vote_frames crops per track
+        # Crops of several frames are colored together in batches of color_batch_size
+        batch_frames = []
+        batch_bboxes = []
+        batch_ids = []
+        batch_frame_nums = []
+        samples = {}
+
+        def flush():
+            if batch_ids:
+                self.add_votes(batch_ids, batch_frame_nums, self.get_player_colors(batch_frames, batch_bboxes))
+            batch_frames.clear()
+            batch_bboxes.clear()
+            batch_ids.clear()
+            batch_frame_nums.clear()
+
+        for frame_num, frame in enumerate(video_frames):
+            if frame_num >= len(player_tracks):
+                break
+
+            # Votes of the current batch aren't counted yet, so the samples are counted here
+            for player_id, track in player_tracks[frame_num].items():
+                if not self.needs_vote(player_id, frame_num) or samples.get(player_id, 0) >= self.vote_frames:
+                    continue
+                samples[player_id] = samples.get(player_id, 0) + 1
+                self.player_last_vote[player_id] = frame_num
+                batch_frames.append(frame)
+                batch_bboxes.append(track['bbox'])
+                batch_ids.append(player_id)
+                batch_frame_nums.append(frame_num)
+
+            if len(batch_ids) >= self.color_batch_size:
+                flush()
+        flush()
+
+        # Tracks that never got enough votes keep the majority of what they have
+        for player_id in self.player_votes:
+            self.player_team_dict[player_id] = self.get_majority_team(player_id)
+
+    def add_team_to_tracks(self, video_frames, tracks):
+        self.collect_votes(video_frames, tracks['players'])
+
+        if isinstance(tracks, TrackStore):
+            self.add_team_to_track_store(tracks)
+            return
+
+        for player_track in tracks['players']:
+            for player_id, track in player_track.items():
+                team = self.get_majority_team(player_id)
+
+                track['team'] = team
+                track['team_color'] = self.team_colors[team]
+
+    def add_team_to_track_store(self, tracks):
+        # The team is fixed per player id, so the columns get filled in one go
+        table = tracks.tables['players']
+        unique_ids, inverse = np.unique(table.track_id, return_inverse=True)
+        id_teams = np.array([self.get_majority_team(int(player_id)) for player_id in unique_ids], dtype=np.int8)
+        teams = id_teams[inverse]
+
+        team_colors = np.array([self.team_colors[team] for team in (1, 2)], dtype=np.float64)
+        table.set_column('team', teams)
+        table.set_column('team_color', team_colors[teams - 1])
@@ -0,0 +1,2 @@
+from .track_store import TrackStore, TrackTable, TRACK_COLUMNS
+from .track_file import TrackFile, save_track_file, load_track_file
\ No newline at end of file
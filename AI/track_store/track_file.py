@@ -0,0 +1,189 @@
+import json
+import os
+import sys
+import pickle
+import numpy as np
+from .track_store import TrackStore, TrackTable, TRACK_COLUMNS
+
+# On disk layout of a track file, a directory:
+#   index.json                      number of frames, objects, row counts, dtypes and shapes
+#   <object>.frame.npy              frame of every row, rows are sorted by frame
+#   <object>.track_id.npy           track id of every row
+#   <object>.frame_offsets.npy      rows of frame f are [frame_offsets[f], frame_offsets[f+1])
+#   <object>.track_rows.npy         row numbers sorted by track id, then frame
+#   <object>.track_ids.npy          unique track ids
+#   <object>.track_offsets.npy      rows of track_ids[i] are track_rows[track_offsets[i]:track_offsets[i+1]]
+#   <object>.<column>.npy           values of a column, fixed width
+#   <object>.<column>.has.npy       True where the row has a value for the column
+#   <object>.<column>.none.npy      True where the row has the column with the value None
+# All files are plain .npy, so they can be memory mapped and only the touched pages are read
+
+TRACK_FILE_VERSION = 1
+
+
+def save_track_file(tracks, path):
+    # tracks can be a TrackStore or the dict layout from Tracker.get_obj_tracks
+    # Keys without a column in TRACK_COLUMNS are not saved
+    if not isinstance(tracks, TrackStore):
+        tracks = TrackStore.from_tracks(tracks)
+
+    os.makedirs(path, exist_ok=True)
+    # Rewriting a track file: without the old index the directory reads as unfinished until the new one is there
+    index_path = os.path.join(path, 'index.json')
+    if os.path.exists(index_path):
+        os.remove(index_path)
+    index = {'version': TRACK_FILE_VERSION, 'num_frames': tracks.num_frames, 'objects': {}}
+
+    for object, table in tracks.tables.items():
+        extra_keys = sorted({key for row_extra in table.extra.values() for key in row_extra})
+        if extra_keys:
+            print(f"Warning: {object} keys without a column are not saved to {path}: {', '.join(map(str, extra_keys))}")
+
+        track_id = table.track_id
+        track_rows = np.lexsort((table.frame, track_id))
+        track_ids, track_starts = np.unique(track_id[track_rows], return_index=True)
+        track_offsets = np.append(track_starts, len(track_rows))
+
+        arrays = {
+            'frame': table.frame,
+            'track_id': track_id,
+            'frame_offsets': table.frame_offsets,
+            'track_rows': track_rows.astype(np.int64),
+            'track_ids': track_ids.astype(np.int64),
+            'track_offsets': track_offsets.astype(np.int64),
+        }
+        for name in TRACK_COLUMNS:
+            arrays[name] = table.column(name)
+            arrays[f'{name}.has'] = table.has_column(name)
+            arrays[f'{name}.none'] = table.none_column(name)
+
+        for name, array in arrays.items():
+            replace_file(os.path.join(path, f'{object}.{name}.npy'), lambda f: np.save(f, np.ascontiguousarray(array)))
+
+        index['objects'][object] = {
+            'rows': int(table.size),
+            'tracks': int(len(track_ids)),
+            'columns': {name: {'dtype': np.dtype(dtype).name, 'shape': list(shape)} for name, (dtype, shape) in TRACK_COLUMNS.items()}
+        }
+
+    # The index goes last, a directory without it is an unfinished write
+    replace_file(index_path, lambda f: f.write(json.dumps(index, indent=4).encode()))
+
+
+def replace_file(path, write):
+    # Writes to a temporary file next to path and swaps it in, a reader (or a memory map of the old file)
+    # sees the old or the new file, never a half written one
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        write(f)
+    os.replace(temp_path, path)
+
+
+class TrackFile:
+    # Read side of a track file, opening is instant and arrays are memory mapped on first use
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'index.json')) as f:
+            self.index = json.load(f)
+
+        if self.index.get('version') != TRACK_FILE_VERSION:
+            raise ValueError(f"Unsupported track file version {self.index.get('version')} in {path}")
+
+        self.num_frames = self.index['num_frames']
+        self.objects = list(self.index['objects'])
+        self._arrays = {}
+
+    def array(self, object, name):
+        key = (object, name)
+        if key not in self._arrays:
+            self._arrays[key] = np.load(os.path.join(self.path, f'{object}.{name}.npy'), mmap_mode='r')
+        return self._arrays[key]
+
+    def track_ids(self, object):
+        return np.asarray(self.array(object, 'track_ids'))
+
+    def frame_rows(self, object, start_frame=0, end_frame=None):
+        # Row range of frames [start_frame, end_frame)
+        if end_frame is None or end_frame > self.num_frames:
+            end_frame = self.num_frames
+        start_frame = max(0, min(start_frame, end_frame))
+        frame_offsets = self.array(object, 'frame_offsets')
+        return int(frame_offsets[start_frame]), int(frame_offsets[end_frame])
+
+    def track_rows(self, object, track_ids):
+        # Rows of the given track ids, sorted by row number (so by frame)
+        all_ids = self.array(object, 'track_ids')
+        track_offsets = self.array(object, 'track_offsets')
+        track_rows = self.array(object, 'track_rows')
+
+        positions = np.searchsorted(all_ids, track_ids)
+        rows = []
+        for track_id, position in zip(np.atleast_1d(track_ids), np.atleast_1d(positions)):
+            if position < len(all_ids) and all_ids[position] == track_id:
+                rows.append(np.asarray(track_rows[track_offsets[position]:track_offsets[position + 1]]))
+        if not rows:
+            return np.zeros(0, dtype=np.int64)
+        return np.sort(np.concatenate(rows))
+
+    def read(self, object, start_frame=0, end_frame=None, track_ids=None, columns=None):
+        # Arrays for the rows in a frame range and/or of some track ids
+        # Returns a dict with 'frame', 'track_id' and every requested column plus '<column>.has' and '<column>.none'
+        first_row, last_row = self.frame_rows(object, start_frame, end_frame)
+        if track_ids is None:
+            rows = slice(first_row, last_row)
+        else:
+            rows = self.track_rows(object, np.asarray(track_ids, dtype=np.int64))
+            rows = rows[(rows >= first_row) & (rows < last_row)]
+
+        result = {
+            'frame': np.asarray(self.array(object, 'frame')[rows]),
+            'track_id': np.asarray(self.array(object, 'track_id')[rows]),
+        }
+        for name in (columns or TRACK_COLUMNS):
+            result[name] = np.asarray(self.array(object, name)[rows])
+            result[f'{name}.has'] = np.asarray(self.array(object, f'{name}.has')[rows])
+            result[f'{name}.none'] = np.asarray(self.none_array(object, name)[rows])
+        return result
+
+    def none_array(self, object, name):
+        # Files written before None was kept don't have the .none arrays, nothing was None there
+        if not os.path.exists(os.path.join(self.path, f'{object}.{name}.none.npy')):
+            return np.zeros(self.index['objects'][object]['rows'], dtype=bool)
+        return self.array(object, f'{name}.none')
+
+    def to_track_store(self, start_frame=0, end_frame=None):
+        # Frame range as a TrackStore, frame numbers start at 0 again
+        if end_frame is None or end_frame > self.num_frames:
+            end_frame = self.num_frames
+
+        store = TrackStore(tuple(self.objects))
+        for object in self.objects:
+            first_row, last_row = self.frame_rows(object, start_frame, end_frame)
+            data = self.read(object, start_frame, end_frame)
+            frame_offsets = np.asarray(self.array(object, 'frame_offsets')[start_frame:end_frame + 1]) - first_row
+            values = {name: data[name] for name in TRACK_COLUMNS}
+            has = {name: data[f'{name}.has'] for name in TRACK_COLUMNS}
+            none = {name: data[f'{name}.none'] for name in TRACK_COLUMNS}
+            store.tables[object] = TrackTable.from_columns(data['frame'] - start_frame, data['track_id'], frame_offsets,
+                                                           values, has, none)
+        return store
+
+    def to_tracks(self, start_frame=0, end_frame=None):
+        # Back to the dict layout
+        return self.to_track_store(start_frame, end_frame).to_tracks()
+
+
+def load_track_file(path):
+    return TrackFile(path)
+
+
+def convert_pickle_to_track_file(pickle_path, path):
+    # For the existing stubs/*.pkl track files
+    with open(pickle_path, 'rb') as f:
+        tracks = pickle.load(f)
+    save_track_file(tracks, path)
+
+
+if __name__ == '__main__':
+    # python -m track_store.track_file stubs/track_stubs.pkl stubs/track_stubs.tracks
+    convert_pickle_to_track_file(sys.argv[1], sys.argv[2])
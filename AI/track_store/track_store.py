@@ -0,0 +1,363 @@
+import numpy as np
+from collections.abc import Mapping, MutableMapping, Sequence
+
+# Column name -> (dtype, shape of one value)
+TRACK_COLUMNS = {
+    "bbox": (np.float32, (4,)),
+    "position": (np.int32, (2,)),
+    "position_adjusted": (np.float64, (2,)),
+    "position_transformed": (np.float64, (2,)),
+    "speed": (np.float64, ()),
+    "distance": (np.float64, ()),
+    "team": (np.int8, ()),
+    "team_color": (np.float64, (3,)),
+}
+
+OBJECT_NAMES = ("players", "referees", "ball")
+
+
+class TrackTable:
+    # All detections of one object class as rows of fixed-width columns
+    # Rows are stored in frame order, rows of frame f are rows[frame_offsets[f]:frame_offsets[f+1]]
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.num_frames = 0
+        self._frame = np.zeros(capacity, dtype=np.int32)
+        self._track_id = np.zeros(capacity, dtype=np.int64)
+        self._values = {}
+        self._has = {}
+        # Rows where the key is there with the value None, _has is False for them so the column
+        # readers skip them like rows without the key
+        self._none = {}
+        for name, (dtype, shape) in TRACK_COLUMNS.items():
+            self._values[name] = np.zeros((capacity,) + shape, dtype=dtype)
+            self._has[name] = np.zeros(capacity, dtype=bool)
+            self._none[name] = np.zeros(capacity, dtype=bool)
+        self._frame_offsets = [0]
+
+        # Keys that don't have a column yet, row -> {key: value}
+        self.extra = {}
+
+    def __setstate__(self, state):
+        # Tables pickled before None was kept (e.g. in a stage cache) don't have _none
+        self.__dict__.update(state)
+        if '_none' not in state:
+            self._none = {name: np.zeros(self.capacity, dtype=bool) for name in TRACK_COLUMNS}
+
+    @classmethod
+    def from_columns(cls, frame, track_id, frame_offsets, values, has, none=None, extra=None):
+        # Builds a table from arrays, e.g. slices of a memory mapped track file, the arrays are copied
+        # extra is row -> {key: value} with the rows of the new table
+        table = cls(capacity=max(len(frame), 1))
+        table.size = len(frame)
+        table.num_frames = len(frame_offsets) - 1
+        table._frame[:table.size] = frame
+        table._track_id[:table.size] = track_id
+        table._frame_offsets = [int(offset) for offset in frame_offsets]
+        for name in TRACK_COLUMNS:
+            if name in values:
+                table._values[name][:table.size] = values[name]
+                table._has[name][:table.size] = has[name]
+            if none is not None and name in none:
+                table._none[name][:table.size] = none[name]
+        table.extra = {int(row): dict(row_extra) for row, row_extra in (extra or {}).items()}
+        return table
+
+    @classmethod
+    def concatenate(cls, tables):
+        # The frames of the tables one after the other, e.g. the segments of one game
+        tables = list(tables)
+        frame_offsets = [0]
+        frames = []
+        extra = {}
+        for table in tables:
+            frames.append(table.frame + (len(frame_offsets) - 1))
+            for row, row_extra in table.extra.items():
+                extra[frame_offsets[-1] + row] = row_extra
+            frame_offsets.extend(frame_offsets[-1] + table.frame_offsets[1:])
+        values = {name: np.concatenate([table.column(name) for table in tables]) for name in TRACK_COLUMNS}
+        has = {name: np.concatenate([table.has_column(name) for table in tables]) for name in TRACK_COLUMNS}
+        none = {name: np.concatenate([table.none_column(name) for table in tables]) for name in TRACK_COLUMNS}
+        return cls.from_columns(np.concatenate(frames) if frames else np.zeros(0, dtype=np.int32),
+                                np.concatenate([table.track_id for table in tables]) if tables else np.zeros(0, dtype=np.int64),
+                                frame_offsets, values, has, none, extra)
+
+    def get_frames(self, start, end):
+        # New table with the frames start..end-1, numbered from 0
+        offsets = self.frame_offsets[start:end + 1]
+        rows = slice(int(offsets[0]), int(offsets[-1]))
+        extra = {row - rows.start: row_extra for row, row_extra in self.extra.items() if rows.start <= row < rows.stop}
+        return TrackTable.from_columns(self.frame[rows] - start, self.track_id[rows], offsets - offsets[0],
+                                       {name: self.column(name)[rows] for name in TRACK_COLUMNS},
+                                       {name: self.has_column(name)[rows] for name in TRACK_COLUMNS},
+                                       {name: self.none_column(name)[rows] for name in TRACK_COLUMNS}, extra)
+
+    @property
+    def capacity(self):
+        return len(self._frame)
+
+    @property
+    def frame(self):
+        return self._frame[:self.size]
+
+    @property
+    def track_id(self):
+        return self._track_id[:self.size]
+
+    @property
+    def frame_offsets(self):
+        return np.asarray(self._frame_offsets, dtype=np.int64)
+
+    def column(self, name):
+        # Writable view on the values, rows where has_column is False hold garbage
+        return self._values[name][:self.size]
+
+    def has_column(self, name):
+        return self._has[name][:self.size]
+
+    def none_column(self, name):
+        # True where the row has the key with the value None
+        return self._none[name][:self.size]
+
+    def set_column(self, name, values, rows=slice(None)):
+        # rows can be a slice, a boolean mask or row indices
+        self._values[name][:self.size][rows] = values
+        self._has[name][:self.size][rows] = True
+        self._none[name][:self.size][rows] = False
+
+    def _grow(self, min_capacity):
+        capacity = max(min_capacity, self.capacity * 2)
+        self._frame = np.resize(self._frame, capacity)
+        self._track_id = np.resize(self._track_id, capacity)
+        for name in TRACK_COLUMNS:
+            values = np.zeros((capacity,) + self._values[name].shape[1:], dtype=self._values[name].dtype)
+            values[:self.size] = self._values[name][:self.size]
+            self._values[name] = values
+
+            for masks in (self._has, self._none):
+                mask = np.zeros(capacity, dtype=bool)
+                mask[:self.size] = masks[name][:self.size]
+                masks[name] = mask
+
+    def add_frame(self):
+        self._frame_offsets.append(self.size)
+        self.num_frames += 1
+        return self.num_frames - 1
+
+    def add_row(self, frame_num, track_id, track_info):
+        if frame_num != self.num_frames - 1:
+            raise KeyError(f"Tracks can only be added to the last frame ({self.num_frames - 1}), got {frame_num}")
+
+        if self.size == self.capacity:
+            self._grow(self.size + 1)
+
+        row = self.size
+        self._frame[row] = frame_num
+        self._track_id[row] = track_id
+        for name in TRACK_COLUMNS:
+            self._has[name][row] = False
+            self._none[name][row] = False
+        self.size += 1
+        self._frame_offsets[-1] = self.size
+
+        for key, value in track_info.items():
+            self.set_value(row, key, value)
+        return row
+
+    def rows_for_frame(self, frame_num):
+        return range(self._frame_offsets[frame_num], self._frame_offsets[frame_num + 1])
+
+    def find_row(self, frame_num, track_id):
+        for row in self.rows_for_frame(frame_num):
+            if self._track_id[row] == track_id:
+                return row
+        return -1
+
+    def get_value(self, row, key):
+        if key not in TRACK_COLUMNS:
+            return self.extra[row][key]
+        if not self._has[key][row]:
+            if self._none[key][row]:
+                return None
+            raise KeyError(key)
+
+        value = self._values[key][row]
+        if key == "bbox":
+            return value.tolist()
+        if key == "position":
+            return tuple(value.tolist())
+        if key == "position_adjusted":
+            return tuple(value.tolist())
+        if key == "position_transformed":
+            # Points outside the court are kept as NaN and show up as None like before
+            return None if np.isnan(value[0]) else value.tolist()
+        if key == "team":
+            return int(value)
+        if key == "team_color":
+            return value.copy()
+        return float(value)
+
+    def set_value(self, row, key, value):
+        if key not in TRACK_COLUMNS:
+            self.extra.setdefault(row, {})[key] = value
+            return
+
+        # None is kept in _none, NaN doesn't fit the integer columns (team, position)
+        if value is not None:
+            self._values[key][row] = value
+        self._has[key][row] = value is not None
+        self._none[key][row] = value is None
+
+    def has_value(self, row, key):
+        if key not in TRACK_COLUMNS:
+            return key in self.extra.get(row, {})
+        return bool(self._has[key][row] or self._none[key][row])
+
+    def row_keys(self, row):
+        keys = [name for name in TRACK_COLUMNS if self._has[name][row] or self._none[name][row]]
+        keys.extend(self.extra.get(row, {}))
+        return keys
+
+
+class TrackStore(Mapping):
+    # Columnar replacement for the list of dicts of dicts that Tracker.get_obj_tracks builds
+    # tables[object] holds the arrays for the stages that work on whole columns,
+    # store[object][frame_num][track_id][key] still works for the code that expects the dict layout
+    def __init__(self, object_names=OBJECT_NAMES):
+        self.tables = {name: TrackTable() for name in object_names}
+
+    @classmethod
+    def from_tracks(cls, tracks):
+        store = cls(tuple(tracks.keys()))
+        number_of_frames = len(next(iter(tracks.values()), []))
+        for frame_num in range(number_of_frames):
+            store.append_frame({object: object_tracks[frame_num] for object, object_tracks in tracks.items()})
+        return store
+
+    def to_tracks(self):
+        # Plain dict copy in the old layout, e.g. for pickling
+        tracks = {}
+        for object, table in self.tables.items():
+            tracks[object] = []
+            for frame_num in range(table.num_frames):
+                frame_tracks = {}
+                for row in table.rows_for_frame(frame_num):
+                    frame_tracks[int(table.track_id[row])] = {key: table.get_value(row, key) for key in table.row_keys(row)}
+                tracks[object].append(frame_tracks)
+        return tracks
+
+    def append_frame(self, frame_tracks):
+        # frame_tracks is one frame in the dict layout, e.g. from Tracker.get_frame_tracks
+        for object, table in self.tables.items():
+            frame_num = table.add_frame()
+            for track_id, track_info in frame_tracks.get(object, {}).items():
+                table.add_row(frame_num, track_id, track_info)
+
+    @classmethod
+    def concatenate(cls, stores):
+        # One store with the frames of all stores in order
+        stores = list(stores)
+        store = cls(tuple(stores[0].tables))
+        for object in store.tables:
+            store.tables[object] = TrackTable.concatenate(other.tables[object] for other in stores)
+        return store
+
+    def get_frames(self, start, end):
+        # New store with the frames start..end-1 numbered from 0, e.g. to hand a part of a game to a worker
+        store = TrackStore(tuple(self.tables))
+        for object, table in self.tables.items():
+            store.tables[object] = table.get_frames(start, min(end, table.num_frames))
+        return store
+
+    @property
+    def num_frames(self):
+        return max((table.num_frames for table in self.tables.values()), default=0)
+
+    def __getitem__(self, object):
+        return FramesView(self.tables[object])
+
+    def __iter__(self):
+        return iter(self.tables)
+
+    def __len__(self):
+        return len(self.tables)
+
+
+class FramesView(Sequence):
+    # tracks[object], one entry per frame
+    def __init__(self, table):
+        self.table = table
+
+    def __len__(self):
+        return self.table.num_frames
+
+    def __getitem__(self, frame_num):
+        if isinstance(frame_num, slice):
+            return [self[i] for i in range(*frame_num.indices(len(self)))]
+        if frame_num < 0:
+            frame_num += len(self)
+        if not 0 <= frame_num < len(self):
+            raise IndexError(frame_num)
+        return FrameView(self.table, frame_num)
+
+
+class FrameView(MutableMapping):
+    # tracks[object][frame_num], track_id -> track info
+    def __init__(self, table, frame_num):
+        self.table = table
+        self.frame_num = frame_num
+
+    def _row(self, track_id):
+        row = self.table.find_row(self.frame_num, track_id)
+        if row < 0:
+            raise KeyError(track_id)
+        return row
+
+    def __getitem__(self, track_id):
+        return TrackInfoView(self.table, self._row(track_id))
+
+    def __setitem__(self, track_id, track_info):
+        row = self.table.find_row(self.frame_num, track_id)
+        if row < 0:
+            self.table.add_row(self.frame_num, track_id, track_info)
+            return
+        for key, value in track_info.items():
+            self.table.set_value(row, key, value)
+
+    def __delitem__(self, track_id):
+        raise TypeError("Tracks can't be removed from a TrackStore")
+
+    def __contains__(self, track_id):
+        return self.table.find_row(self.frame_num, track_id) >= 0
+
+    def __iter__(self):
+        for row in self.table.rows_for_frame(self.frame_num):
+            yield int(self.table.track_id[row])
+
+    def __len__(self):
+        return len(self.table.rows_for_frame(self.frame_num))
+
+
+class TrackInfoView(MutableMapping):
+    # tracks[object][frame_num][track_id], key -> value
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    def __getitem__(self, key):
+        return self.table.get_value(self.row, key)
+
+    def __setitem__(self, key, value):
+        self.table.set_value(self.row, key, value)
+
+    def __delitem__(self, key):
+        raise TypeError("Values can't be removed from a TrackStore")
+
+    def __contains__(self, key):
+        return self.table.has_value(self.row, key)
+
+    def __iter__(self):
+        return iter(self.table.row_keys(self.row))
+
+    def __len__(self):
+        return len(self.table.row_keys(self.row))
@@ -1 +1,6 @@
-from .tracker import Tracker
\ No newline at end of file
+# Tracker is imported on first use, the detector (ultralytics, torch) only when a Tracker is created
+from util.lazy_exports import lazy_exports
+
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'Tracker': '.tracker',
+})
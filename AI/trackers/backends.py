@@ -0,0 +1,185 @@
+import importlib.util
+import os
+import shutil
+import sys
+
+sys.path.append("../")
+from util import get_process_memory
+
+# Inference runtimes for the detector, all of them return ultralytics Results so the
+# tracking code after predict() doesn't care which one ran
+#   torch     the .pt weights through PyTorch, always available
+#   onnx      ONNX Runtime, needs the onnxruntime package
+#   openvino  OpenVINO, needs the openvino package, usually the fastest on Intel CPUs
+# The exported models are cached next to the .pt file and rebuilt when the weights are newer
+
+BACKEND_PACKAGES = {
+    'torch': 'torch',
+    'onnx': 'onnxruntime',
+    'openvino': 'openvino',
+}
+
+# Tried in this order by backend='auto'
+AUTO_BACKENDS = ['openvino', 'onnx', 'torch']
+
+
+def is_backend_available(name):
+    return importlib.util.find_spec(BACKEND_PACKAGES[name]) is not None
+
+
+def get_export_path(model_path, backend, imgsz):
+    # e.g. models/basketbal_computer_vision.640.onnx and models/basketbal_computer_vision.640_openvino_model/
+    stem, _ = os.path.splitext(model_path)
+    if backend == 'onnx':
+        return f"{stem}.{imgsz}.onnx"
+    return f"{stem}.{imgsz}_openvino_model"
+
+
+def is_export_stale(model_path, export_path):
+    if not os.path.exists(export_path):
+        return True
+    return os.path.getmtime(export_path) < os.path.getmtime(model_path)
+
+
+def export_model(model_path, backend, imgsz):
+    # Exports once, later runs load the cached file
+    export_path = get_export_path(model_path, backend, imgsz)
+    if not is_export_stale(model_path, export_path):
+        return export_path
+
+    print(f"Exporting {model_path} to {backend} at imgsz {imgsz}, this only happens once...")
+    from ultralytics import YOLO
+    # dynamic axes so any batch size works with the exported graph
+    exported = YOLO(model_path).export(format=backend, imgsz=imgsz, dynamic=True)
+
+    # ultralytics writes next to the weights under its own name, move it to the cached name
+    if os.path.isdir(export_path):
+        shutil.rmtree(export_path)
+    elif os.path.exists(export_path):
+        os.remove(export_path)
+    shutil.move(str(exported), export_path)
+    return export_path
+
+
+class InferenceBackend:
+    def __init__(self, model_path, name='torch', imgsz=640):
+        self.model_path = model_path
+        self.name = name
+        self.imgsz = imgsz
+
+        # ultralytics (and torch) load with the first model, not with the module
+        from ultralytics import YOLO
+        if name == 'torch':
+            self.model = YOLO(model_path)
+        else:
+            self.model = YOLO(export_model(model_path, name, imgsz), task='detect')
+
+    def predict(self, frames, conf):
+        return self.model.predict(frames, conf=conf, imgsz=self.imgsz, verbose=False)
+
+
+def load_backend(model_path, backend='auto', imgsz=640):
+    # backend is 'auto', 'torch', 'onnx' or 'openvino'
+    # A runtime that isn't installed or fails to export falls back to the next one, torch last
+    if backend == 'auto':
+        candidates = AUTO_BACKENDS
+    else:
+        if backend not in BACKEND_PACKAGES:
+            raise ValueError(f"Unknown inference backend '{backend}', use one of {['auto'] + list(BACKEND_PACKAGES)}")
+        candidates = [backend, 'torch'] if backend != 'torch' else ['torch']
+
+    for name in candidates:
+        if name != 'torch' and not is_backend_available(name):
+            if name == backend:
+                print(f"Warning: {BACKEND_PACKAGES[name]} is not installed, falling back to torch")
+            continue
+        try:
+            return InferenceBackend(model_path, name, imgsz)
+        except Exception as e:
+            if name == 'torch':
+                raise
+            print(f"Warning: {name} backend failed ({e}), trying the next one")
+
+    return InferenceBackend(model_path, 'torch', imgsz)
+
+
+def get_available_memory():
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class AdaptiveBatcher:
+    # Picks the batch size from measured latency and memory
+    # Grows while the time per frame keeps dropping, shrinks when a batch goes over
+    # max_batch_latency seconds or the memory use of a batch gets close to what is free
+    def __init__(self, batch_size=20, min_batch_size=1, max_batch_size=64,
+                 max_batch_latency=None, memory_fraction=0.5, adaptive=True):
+        self.batch_size = batch_size
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.max_batch_latency = max_batch_latency
+        self.memory_fraction = memory_fraction
+        self.adaptive = adaptive
+
+        # batch size -> smoothed seconds per frame
+        self.frame_latency = {}
+        # Smallest size that was measured slower than a smaller one, not tried again
+        self.ceiling = None
+        self.history = []
+
+    def record(self, batch_size, seconds, memory_used=None):
+        self.history.append((batch_size, seconds, memory_used))
+        if not self.adaptive or batch_size == 0:
+            return
+
+        per_frame = seconds / batch_size
+        previous = self.frame_latency.get(batch_size)
+        self.frame_latency[batch_size] = per_frame if previous is None else 0.7*previous + 0.3*per_frame
+
+        # Partial batches at the end of a video don't say anything about the current size
+        if batch_size != self.batch_size:
+            return
+
+        available = get_available_memory()
+        if memory_used is not None and available is not None and memory_used > available*self.memory_fraction:
+            self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+            self.ceiling = batch_size
+            return
+
+        if self.max_batch_latency is not None and seconds > self.max_batch_latency:
+            self.batch_size = max(self.min_batch_size, int(self.batch_size * self.max_batch_latency / seconds))
+            self.ceiling = batch_size
+            return
+
+        # Compare with the next smaller size that was measured, keep growing while bigger is cheaper per frame
+        smaller = [size for size in self.frame_latency if size < batch_size]
+        if smaller:
+            best_smaller = max(smaller)
+            if self.frame_latency[batch_size] > self.frame_latency[best_smaller] * 1.05:
+                self.batch_size = best_smaller
+                self.ceiling = batch_size
+                return
+            if self.frame_latency[batch_size] > self.frame_latency[best_smaller] * 0.95:
+                return
+
+        self.grow()
+
+    def grow(self):
+        new_batch_size = min(self.max_batch_size, self.batch_size * 2)
+        if self.ceiling is not None and new_batch_size >= self.ceiling:
+            new_batch_size = max(self.batch_size, (self.batch_size + self.ceiling) // 2)
+        self.batch_size = new_batch_size
+
+    def stats(self):
+        frames = sum(size for size, _, _ in self.history)
+        seconds = sum(seconds for _, seconds, _ in self.history)
+        return {
+            'batch_size': self.batch_size,
+            'ceiling': self.ceiling,
+            'batches': len(self.history),
+            'frames': frames,
+            'fps': frames / seconds if seconds > 0 else 0.0,
+            'seconds_per_frame': {size: latency for size, latency in sorted(self.frame_latency.items())}
+        }
@@ -0,0 +1,92 @@
+import sys
+import numpy as np
+
+sys.path.append("../")
+from util import get_bbox_iou_matrix
+
+# Helpers for detecting only on keyframes, see Tracker.get_obj_tracks_keyframes
+# Boxes are moved into camera compensated coordinates (the pixel position plus the camera
+# movement summed up to that frame), where players only move by their own motion,
+# filled in there and moved back to the pixels of the frame they are drawn on
+
+
+def get_camera_offsets(camera_movement, number_of_frames=None):
+    # camera_movement[f] is the (old - new) shift of frame f, so a static point at x
+    # in frame f-1 is at x - camera_movement[f] in frame f
+    if camera_movement is None:
+        return None
+    offsets = np.cumsum(np.asarray(camera_movement, dtype=np.float64).reshape(-1, 2), axis=0)
+    if number_of_frames is not None and len(offsets) < number_of_frames:
+        last = offsets[-1] if len(offsets) else np.zeros(2)
+        offsets = np.vstack([offsets, np.repeat(last[None], number_of_frames - len(offsets), axis=0)])
+    return offsets
+
+
+def get_offset(offsets, frame_num):
+    if offsets is None or len(offsets) == 0:
+        return np.zeros(2)
+    return offsets[min(frame_num, len(offsets) - 1)]
+
+
+def shift_bbox(bbox, offset):
+    return np.asarray(bbox, dtype=np.float64) + np.array([offset[0], offset[1], offset[0], offset[1]])
+
+
+def get_compensated_boxes(frame_tracks, offset):
+    # object -> {track_id: bbox in camera compensated coordinates}
+    return {object: {track_id: shift_bbox(track_info['bbox'], offset) for track_id, track_info in object_track.items()}
+            for object, object_track in frame_tracks.items()}
+
+
+def get_velocities(start_boxes, end_boxes, frames_between, velocities=None):
+    # Compensated pixels per frame of every track seen on both keyframes
+    velocities = dict(velocities or {})
+    for object, object_boxes in end_boxes.items():
+        for track_id, bbox in object_boxes.items():
+            if track_id in start_boxes.get(object, {}) and frames_between > 0:
+                velocities[(object, track_id)] = (bbox - start_boxes[object][track_id]) / frames_between
+    return velocities
+
+
+def fill_frames(start_frame, start_boxes, end_frame, end_boxes, offsets, velocities, max_extrapolation):
+    # Frames strictly between two keyframes, in the tracks dict layout
+    # Tracks on both keyframes are interpolated linearly, tracks that were lost keep moving with
+    # their velocity for at most max_extrapolation frames, tracks that appear are only added from end_frame
+    # end_boxes=None fills the frames after the last keyframe of the video
+    filled = []
+    for frame_num in range(start_frame + 1, end_frame):
+        offset = get_offset(offsets, frame_num)
+        step = frame_num - start_frame
+        frame_tracks = {}
+        for object, object_boxes in start_boxes.items():
+            frame_tracks[object] = {}
+            next_boxes = end_boxes.get(object, {}) if end_boxes is not None else {}
+            for track_id, bbox in object_boxes.items():
+                if track_id in next_boxes:
+                    t = step / (end_frame - start_frame)
+                    compensated = bbox + (next_boxes[track_id] - bbox) * t
+                elif step <= max_extrapolation:
+                    compensated = bbox + velocities.get((object, track_id), np.zeros(4)) * step
+                else:
+                    continue
+                frame_tracks[object][track_id] = {"bbox": shift_bbox(compensated, -offset).tolist()}
+        filled.append(frame_tracks)
+    return filled
+
+
+def get_association_score(start_boxes, end_boxes, frames_between, velocities, object='players'):
+    # How well the motion model predicted the next keyframe: mean IoU between the predicted and
+    # the detected box of every track on it, new track ids count as 0
+    # 1 = everything where expected, low values mean the keyframes are too far apart
+    detected = end_boxes.get(object, {})
+    if not detected:
+        return 1.0
+
+    previous = start_boxes.get(object, {})
+    total = 0.0
+    for track_id, bbox in detected.items():
+        if track_id not in previous:
+            continue
+        predicted = previous[track_id] + velocities.get((object, track_id), np.zeros(4)) * frames_between
+        total += get_bbox_iou_matrix([predicted], [bbox])[0, 0]
+    return total / len(detected)
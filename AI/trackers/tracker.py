@@ -1,22 +1,86 @@
-from ultralytics import YOLO
-import supervision as sv
 import pickle
 import os
 import sys
 import cv2
+import time
+import numpy as np
 
 # Go in the root folder
 sys.path.append("../")
-from util import get_center_of_bbox, get_width_of_bbox, get_foot_position
+from track_store import TrackStore
+from util import get_center_of_bbox, get_width_of_bbox, get_foot_position, draw_ellipse, draw_ball_circle, profile
+from .backends import load_backend, AdaptiveBatcher, get_process_memory
+from .keyframes import get_camera_offsets, get_offset, get_compensated_boxes, get_velocities, fill_frames, get_association_score
 
 class Tracker:
 
-    def __init__(self, model_path):
-        self.model = YOLO(model_path)
+    def __init__(self, model_path, backend='auto', imgsz=640, batch_size=20, adaptive_batch=True, max_batch_latency=None,
+                 keyframe_interval=1, min_association=0.5, max_camera_shift=40, court_roi=None):
+        # backend is 'auto', 'torch', 'onnx' or 'openvino', see trackers/backends.py
+        # imgsz is the inference resolution, lower is faster on CPU at the cost of small objects like the ball
+        # supervision and the detector runtime are only imported here, importing the tracker module stays cheap
+        import supervision as sv
+        self.backend = load_backend(model_path, backend, imgsz)
+        self.model = self.backend.model
         self.tracker = sv.ByteTrack()
-
+        self.batcher = AdaptiveBatcher(batch_size, max_batch_latency=max_batch_latency, adaptive=adaptive_batch)
+        self.conf = 0.1
+        self.imgsz = imgsz
+        self.model_path = model_path
+        self.init_tracking(keyframe_interval, min_association, max_camera_shift, court_roi)
+
+    def init_tracking(self, keyframe_interval=1, min_association=0.5, max_camera_shift=40, court_roi=None):
+        # The state get_obj_tracks needs besides the model, also used by trackers that replace the detector
+        # keyframe_interval > 1 only runs the detector every that many frames, see get_obj_tracks_keyframes
+        # A keyframe comes earlier when the camera moved more than max_camera_shift pixels since the last one,
+        # the interval is halved when the association score of a keyframe drops under min_association
+        self.keyframe_interval = keyframe_interval
+        self.min_association = min_association
+        self.max_camera_shift = max_camera_shift
+        self.keyframes = []
+
+        # Optional CourtROI from ViewTransformer.get_court_roi, the detector then only sees the court
+        # Frames are counted so the ROI can follow the camera, see detect_frames
+        self.court_roi = court_roi
+        self.next_frame_num = 0
+
+    def reset(self):
+        # Fresh tracking state for a new video, the model stays loaded
+        import supervision as sv
+        self.tracker = sv.ByteTrack()
+        self.next_frame_num = 0
+        self.keyframes = []
+        if self.court_roi is not None:
+            self.court_roi.reset()
+
+    @property
+    def batch_size(self):
+        return self.batcher.batch_size
+
+    def get_cache_params(self):
+        # Everything that changes the tracks, the model file itself is hashed by the StageCache
+        # The batch size doesn't, every frame is detected on its own
+        params = {'conf': self.conf, 'backend': self.backend.name, 'imgsz': self.imgsz, 'tracker': type(self.tracker).__name__}
+        if self.keyframe_interval > 1:
+            params.update({'keyframe_interval': self.keyframe_interval, 'min_association': self.min_association,
+                           'max_camera_shift': self.max_camera_shift})
+        if self.court_roi is not None:
+            params['court_roi'] = self.court_roi.get_cache_params()
+        return params
 
     def add_position_to_tracks(sekf,tracks):
+        if isinstance(tracks, TrackStore):
+            # Whole columns at once, same truncation as get_center_of_bbox / get_foot_position
+            for object, table in tracks.tables.items():
+                bbox = table.column('bbox').astype(np.float64)
+                x = (bbox[:, 0] + bbox[:, 2]) / 2
+                if object == 'ball':
+                    y = (bbox[:, 1] + bbox[:, 3]) / 2
+                else:
+                    y = bbox[:, 3]
+                table.set_column('position', np.stack([x, y], axis=1).astype(np.int32))
+            return
+
         for object, object_tracks in tracks.items():
             for frame_num, track in enumerate(object_tracks):
                 for track_id, track_info in track.items():
@@ -28,17 +92,48 @@ class Tracker:
                     tracks[object][frame_num][track_id]['position'] = position
 
 
-    def detect_frames(self, frames):
-        batch_size = 20
-        detections = []
-
-        for i in range(0, len(frames), batch_size):
-            detections_batch = self.model.predict(frames[i:i+batch_size], conf=0.1)
-            detections+= detections_batch
-            
-        return detections
-
-    def get_obj_tracks(self, frames, read_from_stub=False, stub_path = None):
+    def detect_frames(self, frames, frame_nums=None):
+        with profile('detect', len(frames)):
+            # frame_nums are the positions of the frames in the video, by default they follow the previous call
+            if frame_nums is None:
+                frame_nums = range(self.next_frame_num, self.next_frame_num + len(frames))
+            frame_nums = list(frame_nums)
+            if frame_nums:
+                self.next_frame_num = frame_nums[-1] + 1
+
+            # With a court ROI the detector gets the cropped frames, the origin of every crop goes
+            # with its result so get_frame_tracks can move the boxes back into the full frame
+            origins = [(0, 0)] * len(frames)
+            if self.court_roi is not None:
+                roi_frames = [self.court_roi.apply(frame, frame_num) for frame, frame_num in zip(frames, frame_nums)]
+                frames = [roi_frame for roi_frame, _ in roi_frames]
+                origins = [origin for _, origin in roi_frames]
+
+            detections = []
+
+            # The batch size can change after every batch, see AdaptiveBatcher
+            i = 0
+            while i < len(frames):
+                batch = frames[i:i+self.batch_size]
+                memory_before = get_process_memory()
+                start = time.perf_counter()
+                detections_batch = self.backend.predict(batch, conf=self.conf)
+                seconds = time.perf_counter() - start
+                memory_after = get_process_memory()
+
+                memory_used = None
+                if memory_before is not None and memory_after is not None:
+                    memory_used = max(memory_after - memory_before, 0) + sum(frame.nbytes for frame in batch)
+                self.batcher.record(len(batch), seconds, memory_used)
+
+                for detection, origin in zip(detections_batch, origins[i:i+len(batch)]):
+                    detection.roi_origin = origin
+                detections+= detections_batch
+                i += len(batch)
+
+            return detections
+
+    def get_obj_tracks(self, frames, read_from_stub=False, stub_path = None, camera_movement=None):
         
         # For reading from a file for faster dev
         if read_from_stub and stub_path is not None and os.path.exists(stub_path):
@@ -46,27 +141,131 @@ class Tracker:
                 tracks = pickle.load(f)
             return tracks
 
-        detections = self.detect_frames(frames)
+        self.next_frame_num = 0
+        if self.court_roi is not None:
+            self.court_roi.reset()
+            if camera_movement is not None:
+                self.court_roi.set_camera_movement(camera_movement)
+
+        if self.keyframe_interval > 1:
+            tracks = self.get_obj_tracks_keyframes(frames, camera_movement)
+        else:
+            tracks = {
+                "players": [],
+                "referees": [],
+                "ball": []
+            }
+
+            # Works on a list or a stream of frames, only one batch is held at a time
+            for frame_batch in self.iter_frame_batches(frames):
+                for frame_tracks in self.track_batch(frame_batch):
+                    for object, object_track in frame_tracks.items():
+                        tracks[object].append(object_track)
+
+        if stub_path is not None:
+            with open(stub_path, 'wb') as f:
+                pickle.dump(tracks, f) 
 
+        # A list of dictionaries
+        return tracks       
+
+    def get_obj_tracks_keyframes(self, frames, camera_movement=None):
+        # Same output as get_obj_tracks but the detector only runs on keyframes
+        # The frames between two keyframes get the boxes interpolated in camera compensated
+        # coordinates, camera_movement is the output of CameraMovementEstimator.get_camera_movement
+        # Without it only the players' own motion is used
+        offsets = get_camera_offsets(camera_movement)
         tracks = {
             "players": [],
             "referees": [],
             "ball": []
         }
-
-        for frame_num, detection, in enumerate(detections):
+        self.keyframes = []
+
+        interval = self.keyframe_interval
+        last_frame = None
+        last_boxes = None
+        velocities = {}
+
+        def add_frame(frame_tracks):
+            for object, object_track in frame_tracks.items():
+                tracks[object].append(object_track)
+
+        frame_num = -1
+        for frame_num, frame in enumerate(frames):
+            if last_frame is not None:
+                camera_shift = np.linalg.norm(get_offset(offsets, frame_num) - get_offset(offsets, last_frame))
+                if frame_num - last_frame < interval and camera_shift <= self.max_camera_shift:
+                    continue
+
+            frame_tracks = self.track_batch([frame], [frame_num])[0]
+            boxes = get_compensated_boxes(frame_tracks, get_offset(offsets, frame_num))
+
+            if last_frame is not None:
+                frames_between = frame_num - last_frame
+                score = get_association_score(last_boxes, boxes, frames_between, velocities)
+                if score < self.min_association:
+                    interval = max(1, interval // 2)
+                else:
+                    interval = min(self.keyframe_interval, interval * 2)
+
+                velocities = get_velocities(last_boxes, boxes, frames_between, velocities)
+                for filled_tracks in fill_frames(last_frame, last_boxes, frame_num, boxes, offsets, velocities, frames_between // 2):
+                    add_frame(filled_tracks)
+                self.keyframes.append((frame_num, score, interval))
+            else:
+                self.keyframes.append((frame_num, 1.0, interval))
+
+            add_frame(frame_tracks)
+            last_frame = frame_num
+            last_boxes = boxes
+
+        # Frames after the last keyframe keep moving with the velocities
+        if last_frame is not None and frame_num > last_frame:
+            for filled_tracks in fill_frames(last_frame, last_boxes, frame_num + 1, None, offsets, velocities, self.keyframe_interval):
+                add_frame(filled_tracks)
+
+        return tracks
+
+    def iter_frame_batches(self, frames):
+        frame_batch = []
+        for frame in frames:
+            frame_batch.append(frame)
+            if len(frame_batch) == self.batch_size:
+                yield frame_batch
+                frame_batch = []
+
+        if frame_batch:
+            yield frame_batch
+
+    def track_batch(self, frames, frame_nums=None):
+        # Detect and track a batch of consecutive frames, returns one dict per frame
+        # ByteTrack keeps its state between calls so batches have to come in order
+        detections = self.detect_frames(frames, frame_nums)
+        return [self.get_frame_tracks(detection) for detection in detections]
+
+    def get_frame_tracks(self, detection):
+        import supervision as sv
+        with profile('track', 1):
             cls_names = detection.names
             cls_names_inv = {v:k for k,v in cls_names.items()}
 
             # Convert to supervision detection format
             detection_supervision = sv.Detections.from_ultralytics(detection)
 
+            # Boxes of a court ROI crop back to full frame pixels
+            roi_x, roi_y = getattr(detection, 'roi_origin', (0, 0))
+            if roi_x or roi_y:
+                detection_supervision.xyxy = detection_supervision.xyxy + np.array([roi_x, roi_y, roi_x, roi_y], dtype=detection_supervision.xyxy.dtype)
+
             # Track obj
             detection_with_tracks = self.tracker.update_with_detections(detection_supervision)
 
-            tracks["players"].append({})
-            tracks["referees"].append({})
-            tracks["ball"].append({})
+            frame_tracks = {
+                "players": {},
+                "referees": {},
+                "ball": {}
+            }
 
             for frame_detection in detection_with_tracks:
                 bbox = frame_detection[0].tolist()
@@ -74,97 +273,27 @@ class Tracker:
                 track_id = frame_detection[4]
 
                 if cls_id == cls_names_inv["Player"]:
-                    tracks["players"][frame_num][track_id] = {"bbox": bbox}
+                    frame_tracks["players"][track_id] = {"bbox": bbox}
 
-                
+            
                 if cls_id == cls_names_inv["Ref"]:
-                    tracks["referees"][frame_num][track_id] = {"bbox": bbox}
+                    frame_tracks["referees"][track_id] = {"bbox": bbox}
 
             # Only tracking one ball
             for frame_detection in detection_supervision:
                 bbox = frame_detection[0].tolist()
                 cls_id = frame_detection[3]
-                
+            
                 if cls_id == cls_names_inv["Ball"]:
-                    tracks["ball"][frame_num][1] = {"bbox": bbox}
+                    frame_tracks["ball"][1] = {"bbox": bbox}
 
-        if stub_path is not None:
-            with open(stub_path, 'wb') as f:
-                pickle.dump(tracks, f) 
-
-        # A list of dictionaries
-        return tracks       
+            return frame_tracks
 
     def draw_elipse(self, frame, bbox, color, track_id=None):
-        
-        y2 = int(bbox[3]) # We want the elipse at the bottom
-        x_center, _= get_center_of_bbox(bbox)
-        width = get_width_of_bbox(bbox)
-
-        cv2.ellipse(
-            frame,
-            center=(x_center,y2),
-            axes=(int(width), int(0.35*width)),
-            angle=0.0,
-            startAngle=-45,
-            endAngle=235,
-            color=color,
-            thickness=2,
-            lineType= cv2.LINE_4
-        )
-
-        rectangle_width = 40
-        rectangle_height = 20
-        x1_rect = x_center - rectangle_width//2
-        x2_rect = x_center + rectangle_width//2
-        y1_rect = (y2 - rectangle_height//2) + 15
-        y2_rect = (y2 + rectangle_height//2) + 15
-        
-        if track_id is not None:
-            cv2.rectangle(
-                frame,
-                (int(x1_rect), int(y1_rect)),
-                (int(x2_rect), int(y2_rect)),
-                color,
-                cv2.FILLED
-            )
-
-            # Visuall only
-            x1_txt = x1_rect + 12
-            if track_id > 99:
-                x1_txt-= 10
-
-            cv2.putText(
-                frame,
-                f"{track_id}",
-                (int(x1_txt), int(y1_rect+15)),
-                cv2.FONT_HERSHEY_SIMPLEX,
-                0.6,
-                (0,0,0),
-                2
-            )
-
-
-        return frame
+        return draw_ellipse(frame, bbox, color, track_id)
 
     def draw_ball_circle(self, frame, bbox, color, track_id=None):
-       
-        x_center, y_center = get_center_of_bbox(bbox)
-
-        
-        radius = int(get_width_of_bbox(bbox) / 2)
-
-        # Draw the circle
-        cv2.circle(
-            frame,
-            center=(int(x_center), int(y_center)),
-            radius=radius,
-            color=color,
-            thickness=2,
-            lineType=cv2.LINE_AA
-        )
-
-        return frame
+        return draw_ball_circle(frame, bbox, color)
 
     def draw_annotations(self, video_frames, tracks):
 
@@ -1,3 +1,17 @@
 # made to have functions in the utils accessible over the proj
-from .video_utils import read_video, save_video
-from .bbox_utils import get_center_of_bbox, get_width_of_bbox, measure_distance,measure_xy_distance,get_foot_position
\ No newline at end of file
+# The names are imported from their module on first use, see lazy_exports
+from .lazy_exports import lazy_exports
+
+__getattr__, __dir__ = lazy_exports(__name__, {
+    'read_video': '.video_utils', 'save_video': '.video_utils', 'iter_video': '.video_utils',
+    'iter_video_range': '.video_utils', 'VideoReader': '.video_utils',
+    'VideoWriter': '.video_writer',
+    'StageCache': '.stage_cache',
+    'StageProfiler': '.profiler', 'profile': '.profiler', 'profile_iter': '.profiler', 'set_profiler': '.profiler',
+    'get_profiler': '.profiler', 'get_process_memory': '.profiler',
+    'get_center_of_bbox': '.bbox_utils', 'get_width_of_bbox': '.bbox_utils', 'measure_distance': '.bbox_utils',
+    'measure_xy_distance': '.bbox_utils', 'get_foot_position': '.bbox_utils', 'get_bbox_iou': '.bbox_utils',
+    'get_bbox_iou_matrix': '.bbox_utils',
+    'draw_ellipse': '.draw_utils', 'draw_ball_circle': '.draw_utils', 'draw_translucent_rectangle': '.draw_utils',
+    'draw_camera_movement_panel': '.draw_utils', 'draw_speed_and_distance_label': '.draw_utils',
+})
@@ -1,3 +1,5 @@
+import numpy as np
+
 def get_center_of_bbox(bbox):
     x1, y1, x2, y2 = bbox
     return int((x1 + x2) / 2), int((y1 + y2) / 2)
@@ -13,4 +15,22 @@ def measure_xy_distance(p1,p2):
 
 def get_foot_position(bbox):
     x1,y1,x2,y2 = bbox
-    return int((x1+x2)/2),int(y2)
\ No newline at end of file
+    return int((x1+x2)/2),int(y2)
+
+def get_bbox_iou_matrix(bboxes1, bboxes2):
+    # IoU of every pair, (N, 4) x (M, 4) -> (N, M)
+    bboxes1 = np.asarray(bboxes1, dtype=np.float64).reshape(-1, 4)
+    bboxes2 = np.asarray(bboxes2, dtype=np.float64).reshape(-1, 4)
+    x1 = np.maximum(bboxes1[:, None, 0], bboxes2[None, :, 0])
+    y1 = np.maximum(bboxes1[:, None, 1], bboxes2[None, :, 1])
+    x2 = np.minimum(bboxes1[:, None, 2], bboxes2[None, :, 2])
+    y2 = np.minimum(bboxes1[:, None, 3], bboxes2[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area1 = (bboxes1[:, 2] - bboxes1[:, 0]) * (bboxes1[:, 3] - bboxes1[:, 1])
+    area2 = (bboxes2[:, 2] - bboxes2[:, 0]) * (bboxes2[:, 3] - bboxes2[:, 1])
+    union = area1[:, None] + area2[None, :] - intersection
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(union > 0, intersection / union, 0.0)
+
+def get_bbox_iou(bbox1, bbox2):
+    return float(get_bbox_iou_matrix([bbox1], [bbox2])[0, 0])
@@ -0,0 +1,119 @@
+import cv2
+from .bbox_utils import get_center_of_bbox, get_width_of_bbox, get_foot_position
+
+# All functions draw in place on the frame and return it
+
+
+def draw_ellipse(frame, bbox, color, track_id=None):
+
+    y2 = int(bbox[3]) # We want the elipse at the bottom
+    x_center, _= get_center_of_bbox(bbox)
+    width = get_width_of_bbox(bbox)
+
+    cv2.ellipse(
+        frame,
+        center=(x_center,y2),
+        axes=(int(width), int(0.35*width)),
+        angle=0.0,
+        startAngle=-45,
+        endAngle=235,
+        color=color,
+        thickness=2,
+        lineType= cv2.LINE_4
+    )
+
+    rectangle_width = 40
+    rectangle_height = 20
+    x1_rect = x_center - rectangle_width//2
+    x2_rect = x_center + rectangle_width//2
+    y1_rect = (y2 - rectangle_height//2) + 15
+    y2_rect = (y2 + rectangle_height//2) + 15
+
+    if track_id is not None:
+        cv2.rectangle(
+            frame,
+            (int(x1_rect), int(y1_rect)),
+            (int(x2_rect), int(y2_rect)),
+            color,
+            cv2.FILLED
+        )
+
+        # Visuall only
+        x1_txt = x1_rect + 12
+        if track_id > 99:
+            x1_txt-= 10
+
+        cv2.putText(
+            frame,
+            f"{track_id}",
+            (int(x1_txt), int(y1_rect+15)),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.6,
+            (0,0,0),
+            2
+        )
+
+    return frame
+
+
+def draw_ball_circle(frame, bbox, color):
+
+    x_center, y_center = get_center_of_bbox(bbox)
+    radius = int(get_width_of_bbox(bbox) / 2)
+
+    # Draw the circle
+    cv2.circle(
+        frame,
+        center=(int(x_center), int(y_center)),
+        radius=radius,
+        color=color,
+        thickness=2,
+        lineType=cv2.LINE_AA
+    )
+
+    return frame
+
+
+def draw_translucent_rectangle(frame, top_left, bottom_right, color=(255, 255, 255), alpha=0.6):
+    # Only blends the pixels under the rectangle instead of a full frame overlay
+    # bottom_right is inclusive like in cv2.rectangle
+    x1, y1 = max(top_left[0], 0), max(top_left[1], 0)
+    x2, y2 = min(bottom_right[0] + 1, frame.shape[1]), min(bottom_right[1] + 1, frame.shape[0])
+    if x2 <= x1 or y2 <= y1:
+        return frame
+
+    roi = frame[y1:y2, x1:x2]
+    if color == (255, 255, 255):
+        # Same result as addWeighted with a white overlay, without allocating the overlay
+        roi[:] = cv2.convertScaleAbs(roi, alpha=1 - alpha, beta=255 * alpha)
+    else:
+        overlay = roi.copy()
+        overlay[:] = color
+        cv2.addWeighted(overlay, alpha, roi, 1 - alpha, 0, roi)
+
+    return frame
+
+
+def draw_camera_movement_panel(frame, camera_movement, alpha=0.6):
+    # Overlay rectangle for info box
+    draw_translucent_rectangle(frame, (0, 0), (500, 100), (255, 255, 255), alpha)
+
+    x_movement, y_movement = camera_movement
+    cv2.putText(frame, f"Camera Movement X: {x_movement:.2f}", (10, 30),
+                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 3)
+    cv2.putText(frame, f"Camera Movement Y: {y_movement:.2f}", (10, 60),
+                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 3)
+
+    return frame
+
+
+def draw_speed_and_distance_label(frame, bbox, speed, distance):
+    position = get_foot_position(bbox)
+    position = list(position)
+    position[1]+=40
+
+    position = tuple(map(int,position))
+    cv2.putText(frame, f"{speed:.2f} km/h",position,cv2.FONT_HERSHEY_SIMPLEX,0.5,(0,0,0),2)
+    cv2.putText(frame, f"{distance:.2f} m",(position[0],position[1]+20),cv2.FONT_HERSHEY_SIMPLEX,0.5,(0,0,0),2)
+
+    return frame
@@ -0,0 +1,19 @@
+import importlib
+
+
+def lazy_exports(package_name, exports):
+    # Module __getattr__ and __dir__ for a package __init__, exports maps a name to the submodule it lives in
+    # The submodule is imported the first time the name is used, so importing the package stays cheap and
+    # torch, sklearn, reportlab, ... only load for the code paths that need them
+    def __getattr__(name):
+        if name not in exports:
+            raise AttributeError(f"module {package_name!r} has no attribute {name!r}")
+        value = getattr(importlib.import_module(exports[name], package_name), name)
+        # Later lookups find it directly, __getattr__ only runs for missing names
+        setattr(importlib.import_module(package_name), name, value)
+        return value
+
+    def __dir__():
+        return sorted(set(vars(importlib.import_module(package_name))) | set(exports))
+
+    return __getattr__, __dir__
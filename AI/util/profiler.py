@@ -0,0 +1,276 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import resource
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime, timezone
+
+# Stage timing for a whole run: wall time, calls, items (frames, tracks...), items per second and the
+# peak resident memory while the stage was running
+# The stages report themselves with `with profile('detect', len(frames)):`, which does nothing
+# unless a StageProfiler was set with set_profiler(), so the instrumentation can stay in the code
+
+active_profiler = None
+NO_PROFILE = nullcontext()
+
+
+def get_process_memory():
+    # Resident memory of this process in bytes, None where /proc isn't available
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def get_peak_process_memory():
+    # Highest resident memory of the process so far, ru_maxrss is in KB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def set_profiler(profiler):
+    global active_profiler
+    active_profiler = profiler
+
+
+def get_profiler():
+    return active_profiler
+
+
+def profile(name, items=0):
+    if active_profiler is None:
+        return NO_PROFILE
+    return active_profiler.stage(name, items)
+
+
+def profile_iter(name, iterable):
+    # Times every step of an iterator, e.g. frames coming out of a generator
+    if active_profiler is None:
+        yield from iterable
+        return
+
+    iterator = iter(iterable)
+    while True:
+        with active_profiler.stage(name, 1) as stage:
+            try:
+                item = next(iterator)
+            except StopIteration:
+                stage.items = 0
+                return
+        yield item
+
+
+class StageTimer:
+    def __init__(self, profiler, name, items):
+        self.profiler = profiler
+        self.name = name
+        self.items = items
+
+    def __enter__(self):
+        self.profiler.enter(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.exit(self.name, time.perf_counter() - self.start, self.items)
+
+
+class StageProfiler:
+    # cprofile_stage: name of one stage to run under cProfile, dumped to profile_dir/<stage>.prof and .txt
+    # sample_interval: seconds between memory samples for the per stage peak
+    def __init__(self, cprofile_stage=None, profile_dir='profiles', sample_interval=0.02):
+        self.cprofile_stage = cprofile_stage
+        self.profile_dir = profile_dir
+        self.sample_interval = sample_interval
+
+        self.stages = {}
+        self.info = {}
+        self.lock = threading.Lock()
+        self.active = {}
+        self.cprofile = cProfile.Profile() if cprofile_stage else None
+        self.cprofile_depth = 0
+
+        self.started = None
+        self.start_time = None
+        self.wall_seconds = None
+        self.stop_sampling = threading.Event()
+        self.sampler = None
+
+    def start(self):
+        self.started = datetime.now(timezone.utc).isoformat()
+        self.start_time = time.perf_counter()
+        if get_process_memory() is not None:
+            self.sampler = threading.Thread(target=self.sample_memory, name="profiler-memory", daemon=True)
+            self.sampler.start()
+        set_profiler(self)
+        return self
+
+    def stop(self):
+        if active_profiler is self:
+            set_profiler(None)
+        self.stop_sampling.set()
+        if self.sampler is not None:
+            self.sampler.join()
+        if self.start_time is not None and self.wall_seconds is None:
+            self.wall_seconds = time.perf_counter() - self.start_time
+        if self.cprofile is not None:
+            self.dump_cprofile()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def stage(self, name, items=0):
+        return StageTimer(self, name, items)
+
+    def get_stage(self, name):
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = {'calls': 0, 'seconds': 0.0, 'items': 0, 'peak_rss_bytes': None, 'threads': set()}
+            self.stages[name] = stage
+        return stage
+
+    def enter(self, name):
+        with self.lock:
+            stage = self.get_stage(name)
+            stage['threads'].add(threading.current_thread().name)
+            self.active[name] = self.active.get(name, 0) + 1
+            if stage['peak_rss_bytes'] is None:
+                stage['peak_rss_bytes'] = get_process_memory()
+
+        if name == self.cprofile_stage:
+            self.enable_cprofile()
+
+    def exit(self, name, seconds, items):
+        if name == self.cprofile_stage:
+            self.disable_cprofile()
+
+        with self.lock:
+            stage = self.stages[name]
+            stage['calls'] += 1
+            stage['seconds'] += seconds
+            stage['items'] += items
+            self.active[name] -= 1
+            if self.active[name] == 0:
+                del self.active[name]
+
+    def enable_cprofile(self):
+        with self.lock:
+            self.cprofile_depth += 1
+            if self.cprofile_depth > 1:
+                return
+        try:
+            self.cprofile.enable()
+        except ValueError:
+            # Another profiler is already running, e.g. the whole script under python -m cProfile
+            pass
+
+    def disable_cprofile(self):
+        with self.lock:
+            self.cprofile_depth -= 1
+            if self.cprofile_depth > 0:
+                return
+        self.cprofile.disable()
+
+    def sample_memory(self):
+        while not self.stop_sampling.wait(self.sample_interval):
+            rss = get_process_memory()
+            with self.lock:
+                for name in self.active:
+                    stage = self.stages[name]
+                    if stage['peak_rss_bytes'] is None or rss > stage['peak_rss_bytes']:
+                        stage['peak_rss_bytes'] = rss
+
+    def dump_cprofile(self):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        base_path = os.path.join(self.profile_dir, self.cprofile_stage)
+        self.cprofile.dump_stats(f"{base_path}.prof")
+
+        text = io.StringIO()
+        try:
+            pstats.Stats(self.cprofile, stream=text).sort_stats('cumulative').print_stats(40)
+        except TypeError:
+            # The stage never ran, there is nothing to print
+            text.write(f"No calls recorded for stage {self.cprofile_stage}\n")
+        with open(f"{base_path}.txt", 'w') as f:
+            f.write(text.getvalue())
+
+    def report(self):
+        wall_seconds = self.wall_seconds
+        if wall_seconds is None and self.start_time is not None:
+            wall_seconds = time.perf_counter() - self.start_time
+
+        with self.lock:
+            stages = {}
+            for name, stage in self.stages.items():
+                stages[name] = {
+                    'calls': stage['calls'],
+                    'seconds': stage['seconds'],
+                    'items': stage['items'],
+                    'items_per_second': stage['items'] / stage['seconds'] if stage['seconds'] > 0 else 0.0,
+                    'share_of_wall': stage['seconds'] / wall_seconds if wall_seconds else 0.0,
+                    'peak_rss_bytes': stage['peak_rss_bytes'],
+                    'threads': sorted(stage['threads'])
+                }
+
+        return {
+            'started': self.started,
+            'wall_seconds': wall_seconds,
+            'peak_rss_bytes': get_peak_process_memory(),
+            'info': self.info,
+            'stages': stages,
+            'cprofile': os.path.join(self.profile_dir, f"{self.cprofile_stage}.prof") if self.cprofile_stage else None
+        }
+
+    def save_json(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=4, default=str)
+
+    def to_prometheus(self, prefix='boltathletics', labels=None):
+        # Prometheus text exposition format, e.g. for the node exporter textfile collector
+        report = self.report()
+        base_labels = ''.join(f',{key}="{value}"' for key, value in (labels or {}).items())
+        run_labels = '{' + base_labels.lstrip(',') + '}' if base_labels else ''
+
+        lines = []
+
+        def metric(name, metric_type, help_text, samples):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {metric_type}")
+            lines.extend(samples)
+
+        def stage_samples(name, key):
+            return [f'{prefix}_{name}{{stage="{stage}"{base_labels}}} {values[key]}'
+                    for stage, values in report['stages'].items() if values[key] is not None]
+
+        metric('stage_seconds_total', 'counter', "Wall time spent in the stage", stage_samples('stage_seconds_total', 'seconds'))
+        metric('stage_calls_total', 'counter', "Times the stage ran", stage_samples('stage_calls_total', 'calls'))
+        metric('stage_items_total', 'counter', "Items (frames, tracks) the stage processed", stage_samples('stage_items_total', 'items'))
+        metric('stage_items_per_second', 'gauge', "Items per second of stage time", stage_samples('stage_items_per_second', 'items_per_second'))
+        metric('stage_peak_rss_bytes', 'gauge', "Highest resident memory seen while the stage ran", stage_samples('stage_peak_rss_bytes', 'peak_rss_bytes'))
+        metric('run_wall_seconds', 'gauge', "Wall time of the run", [f"{prefix}_run_wall_seconds{run_labels} {report['wall_seconds'] or 0}"])
+        metric('run_peak_rss_bytes', 'gauge', "Highest resident memory of the run", [f"{prefix}_run_peak_rss_bytes{run_labels} {report['peak_rss_bytes']}"])
+        return '\n'.join(lines) + '\n'
+
+    def save_prometheus(self, path, prefix='boltathletics', labels=None):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(self.to_prometheus(prefix, labels))
+
+    def print_summary(self):
+        report = self.report()
+        print(f"{'stage':<16} {'seconds':>9} {'share':>6} {'calls':>7} {'items':>7} {'items/s':>9} {'peak MB':>8}")
+        for name, stage in sorted(report['stages'].items(), key=lambda item: -item[1]['seconds']):
+            peak = f"{stage['peak_rss_bytes'] / 1024**2:.0f}" if stage['peak_rss_bytes'] else '-'
+            print(f"{name:<16} {stage['seconds']:>9.2f} {stage['share_of_wall']:>6.1%} {stage['calls']:>7} {stage['items']:>7} "
+                  f"{stage['items_per_second']:>9.1f} {peak:>8}")
+        print(f"Wall: {report['wall_seconds']:.2f}s, peak RSS: {report['peak_rss_bytes'] / 1024**2:.0f} MB")
@@ -0,0 +1,215 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+
+
+class StageCache:
+    # Content addressed cache for pipeline stage results, replaces the hand passed stub pickles
+    # A key is the hash of the stage name, its parameters and the key of the stage before it,
+    # so changing the video, the model or any parameter invalidates that stage and everything after
+    # Entries over max_bytes are evicted least recently used first
+    def __init__(self, cache_dir='cache', max_bytes=5 * 1024**3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        self.lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self.index = self.load_index()
+        self.removed = set()
+
+        self.hits = 0
+        self.misses = 0
+        self.stage_stats = {}
+
+    def load_index(self):
+        if not os.path.exists(self.index_path):
+            return {'entries': {}, 'files': {}}
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            # A broken index only costs a recompute, the entries are found again by key
+            return {'entries': {}, 'files': {}}
+        index.setdefault('entries', {})
+        index.setdefault('files', {})
+        return index
+
+    def atomic_write(self, path, data):
+        # Write next to the target and rename, readers never see a half written file
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def save_index(self):
+        # Other processes may share the cache dir, keep the entries they added in the meantime
+        on_disk = self.load_index()
+        for key, entry in on_disk['entries'].items():
+            if key not in self.index['entries'] and key not in self.removed and os.path.exists(self.entry_path(key)):
+                self.index['entries'][key] = entry
+        for file_key, digest in on_disk['files'].items():
+            self.index['files'].setdefault(file_key, digest)
+
+        self.atomic_write(self.index_path, json.dumps(self.index, indent=1).encode())
+
+    def file_hash(self, path, chunk_size=8 * 1024**2):
+        # sha256 of the file content, remembered per (path, size, mtime) so big videos are hashed once
+        stat = os.stat(path)
+        file_key = f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+        with self.lock:
+            known = self.index['files'].get(file_key)
+        if known is not None:
+            return known
+
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+
+        with self.lock:
+            self.index['files'][file_key] = digest
+            self.save_index()
+        return digest
+
+    def make_key(self, stage, params, parent_key=None):
+        payload = json.dumps({'stage': stage, 'params': params, 'parent': parent_key}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def contains(self, key):
+        # The file is the source of truth, another process may have added it after our index was loaded
+        return os.path.exists(self.entry_path(key))
+
+    def count(self, stage, hit):
+        stats = self.stage_stats.setdefault(stage, {'hits': 0, 'misses': 0})
+        if hit:
+            self.hits += 1
+            stats['hits'] += 1
+        else:
+            self.misses += 1
+            stats['misses'] += 1
+
+    def get(self, key, stage=None):
+        # Returns (hit, value)
+        if not self.contains(key):
+            self.count(stage or 'unknown', False)
+            return False, None
+
+        try:
+            with open(self.entry_path(key), 'rb') as f:
+                value = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            self.remove(key)
+            self.count(stage or 'unknown', False)
+            return False, None
+
+        with self.lock:
+            now = time.time()
+            entry = self.index['entries'].setdefault(key, {'stage': stage, 'size': os.path.getsize(self.entry_path(key)), 'created': now})
+            entry['last_access'] = now
+            self.save_index()
+        self.count(stage or entry.get('stage') or 'unknown', True)
+        return True, value
+
+    def put(self, key, value, stage=None):
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self.atomic_write(self.entry_path(key), data)
+
+        with self.lock:
+            self.removed.discard(key)
+            now = time.time()
+            self.index['entries'][key] = {'stage': stage, 'size': len(data), 'created': now, 'last_access': now}
+            self.evict()
+            self.save_index()
+
+    def remove(self, key):
+        with self.lock:
+            self.index['entries'].pop(key, None)
+            self.removed.add(key)
+            if os.path.exists(self.entry_path(key)):
+                os.remove(self.entry_path(key))
+            self.save_index()
+
+    def total_bytes(self):
+        return sum(entry['size'] for entry in self.index['entries'].values())
+
+    def evict(self):
+        # Least recently used first until the cache fits in max_bytes, called with the lock held
+        entries = sorted(self.index['entries'].items(), key=lambda item: item[1]['last_access'])
+        total = self.total_bytes()
+        for key, entry in entries:
+            if total <= self.max_bytes:
+                break
+            if os.path.exists(self.entry_path(key)):
+                os.remove(self.entry_path(key))
+            del self.index['entries'][key]
+            self.removed.add(key)
+            total -= entry['size']
+
+    def clear(self):
+        with self.lock:
+            for key in list(self.load_index()['entries']) + list(self.index['entries']):
+                self.removed.add(key)
+                if os.path.exists(self.entry_path(key)):
+                    os.remove(self.entry_path(key))
+            self.index = {'entries': {}, 'files': {}}
+            self.save_index()
+
+    def get_or_compute(self, stage, params, compute, parent_key=None):
+        # Returns (value, key), the key is the parent_key for the next stage
+        key = self.make_key(stage, params, parent_key)
+        hit, value = self.get(key, stage)
+        if not hit:
+            value = compute()
+            self.put(key, value, stage)
+        return value, key
+
+    def run_stages(self, stages, parent_key=None):
+        # stages is a list of (name, params, fn), fn gets the previous stage's result and returns its own
+        # Starts from the last stage that is cached, everything before it is skipped
+        # Returns (result of the last stage, its key)
+        keys = []
+        for name, params, _ in stages:
+            parent_key = self.make_key(name, params, parent_key)
+            keys.append(parent_key)
+
+        state = None
+        start = 0
+        for i in range(len(stages) - 1, -1, -1):
+            hit, value = self.get(keys[i], stages[i][0]) if self.contains(keys[i]) else (False, None)
+            if hit:
+                state = value
+                start = i + 1
+                break
+
+        for i in range(start, len(stages)):
+            name, _, fn = stages[i]
+            self.count(name, False)
+            state = fn(state)
+            self.put(keys[i], state, name)
+
+        return state, (keys[-1] if keys else parent_key)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'stages': dict(self.stage_stats),
+            'entries': len(self.index['entries']),
+            'bytes': self.total_bytes(),
+            'max_bytes': self.max_bytes
+        }
@@ -1,35 +1,101 @@
 import cv2
+from .video_writer import VideoWriter
+from .profiler import profile
 
-def read_video(video_path):
-    capture = cv2.VideoCapture(video_path)
-    if not capture.isOpened():
-        print(f"Error: Unable to open video file: {video_path}")
-        return [], 0
+class VideoReader:
+    # Streams frames from disk so the whole clip never has to sit in memory
+    def __init__(self, video_path):
+        self.video_path = video_path
+        self.capture = cv2.VideoCapture(video_path)
 
-    fps = capture.get(cv2.CAP_PROP_FPS) # have to match the source fps
-    frames = []
+        if not self.capture.isOpened():
+            print(f"Error: Unable to open video file: {video_path}")
+            self.fps = 0
+            self.frame_count = 0
+            self.width = 0
+            self.height = 0
+            return
 
-    while True:
-        ret, frame = capture.read()
-        if not ret:
-            break
-        frames.append(frame)
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) # have to match the source fps
+        self.frame_count = int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.width = int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
 
-    capture.release()
-    return frames, fps
+    def is_opened(self):
+        return self.capture.isOpened()
 
+    def __iter__(self):
+        # Yields (frame_num, timestamp in seconds, frame)
+        frame_num = 0
+        while self.capture.isOpened():
+            with profile('decode', 1) as stage:
+                ret, frame = self.capture.read()
+                if not ret and stage is not None:
+                    stage.items = 0
+            if not ret:
+                break
+
+            timestamp = frame_num / self.fps if self.fps else self.capture.get(cv2.CAP_PROP_POS_MSEC) / 1000
+            yield frame_num, timestamp, frame
+            frame_num += 1
+
+        self.release()
+
+    def release(self):
+        self.capture.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
 
-def save_video(out_video_frames, out_video_path, fps):
-    if not out_video_frames:
-        print("Warning: No frames to save!")
-        return
 
-    height, width = out_video_frames[0].shape[:2]
-    fourcc = cv2.VideoWriter_fourcc(*'XVID')
-    out = cv2.VideoWriter(out_video_path, fourcc, fps, (width, height))
+def iter_video(video_path):
+    # Generator version of read_video, yields (frame_num, timestamp, frame)
+    reader = VideoReader(video_path)
+    yield from reader
 
-    for frame in out_video_frames:
-        out.write(frame)
-    out.release()
 
+def iter_video_range(video_path, start, end=None):
+    # Yields (frame_num, frame) for the frames start..end-1 (to the end of the video with end=None)
+    # Seeks to start first, so parts of one video can be read by different processes
+    capture = cv2.VideoCapture(video_path)
+    try:
+        if start > 0:
+            capture.set(cv2.CAP_PROP_POS_FRAMES, start)
+        frame_num = start
+        while end is None or frame_num < end:
+            with profile('decode', 1) as stage:
+                ret, frame = capture.read()
+                if not ret and stage is not None:
+                    stage.items = 0
+            if not ret:
+                break
+            yield frame_num, frame
+            frame_num += 1
+    finally:
+        capture.release()
+
+
+def read_video(video_path):
+    reader = VideoReader(video_path)
+    if not reader.is_opened():
+        return [], 0
 
+    frames = [frame for _, _, frame in reader]
+    return frames, reader.fps
+
+
+def save_video(out_video_frames, out_video_path, fps, codec='XVID', **writer_options):
+    # Accepts a list or any iterator of frames, so streamed output is written as it is produced
+    # The encoding runs on a background thread, see VideoWriter for codec/backend/preview options
+    writer = VideoWriter(out_video_path, fps, codec=codec, **writer_options)
+    try:
+        for frame in out_video_frames:
+            writer.write(frame)
+    finally:
+        writer.close()
+
+    if writer.frame_count == 0:
+        print("Warning: No frames to save!")
@@ -0,0 +1,152 @@
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import cv2
+from .profiler import profile
+
+# ffmpeg encoder for the OpenCV fourcc names, used when piping to ffmpeg
+FFMPEG_CODECS = {
+    'XVID': ['-c:v', 'mpeg4', '-vtag', 'xvid', '-q:v', '3'],
+    'MJPG': ['-c:v', 'mjpeg', '-q:v', '3'],
+    'mp4v': ['-c:v', 'mpeg4', '-q:v', '3'],
+    'avc1': ['-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p'],
+}
+
+
+class OpenCVSink:
+    def __init__(self, path, fps, size, codec):
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*codec), fps, size)
+        if not self.writer.isOpened():
+            raise IOError(f"Unable to open video writer for {path} with codec {codec}")
+
+    def write(self, frame):
+        self.writer.write(frame)
+
+    def release(self):
+        self.writer.release()
+
+
+class FFmpegSink:
+    # Pipes raw BGR frames to a local ffmpeg binary, the encoding runs in the ffmpeg process
+    def __init__(self, path, fps, size, codec, ffmpeg_path='ffmpeg'):
+        width, height = size
+        encoder_args = FFMPEG_CODECS.get(codec, ['-c:v', codec])
+        command = [ffmpeg_path, '-y', '-loglevel', 'error',
+                   '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}', '-r', str(fps),
+                   '-i', '-', '-an'] + encoder_args + [path]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def write(self, frame):
+        self.process.stdin.write(frame.tobytes())
+
+    def release(self):
+        self.process.stdin.close()
+        stderr = self.process.stderr.read()
+        if self.process.wait() != 0:
+            raise IOError(f"ffmpeg failed: {stderr.decode(errors='replace').strip()}")
+
+
+class VideoWriter:
+    # Accepts frames as they are produced and encodes them on a background thread
+    # write() only blocks when queue_size frames are already waiting (backpressure)
+    # backend is 'opencv', 'ffmpeg' or 'auto' (ffmpeg when the binary is found)
+    # With preview_path a downscaled copy is written in the same pass
+    def __init__(self, path, fps, codec='XVID', backend='opencv', queue_size=32,
+                 preview_path=None, preview_scale=0.5, preview_codec=None):
+        self.path = path
+        self.fps = fps
+        self.codec = codec
+        self.queue_size = queue_size
+        self.preview_path = preview_path
+        self.preview_scale = preview_scale
+        self.preview_codec = preview_codec or codec
+
+        self.ffmpeg_path = shutil.which('ffmpeg')
+        if backend == 'auto':
+            backend = 'ffmpeg' if self.ffmpeg_path else 'opencv'
+        if backend == 'ffmpeg' and not self.ffmpeg_path:
+            raise FileNotFoundError("ffmpeg backend requested but no ffmpeg binary was found")
+        self.backend = backend
+
+        self.frame_count = 0
+        self.error = None
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.thread = None
+        self.closed = False
+
+    def open_sink(self, path, size, codec):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        if self.backend == 'ffmpeg':
+            return FFmpegSink(path, self.fps, size, codec, self.ffmpeg_path)
+        return OpenCVSink(path, self.fps, size, codec)
+
+    def encode(self):
+        sinks = []
+        preview_size = None
+        try:
+            while True:
+                frame = self.frames.get()
+                if frame is None:
+                    break
+
+                if not sinks:
+                    # The size is only known once the first frame arrives
+                    height, width = frame.shape[:2]
+                    sinks.append(self.open_sink(self.path, (width, height), self.codec))
+                    if self.preview_path is not None:
+                        preview_size = (max(int(width*self.preview_scale), 2) // 2 * 2,
+                                        max(int(height*self.preview_scale), 2) // 2 * 2)
+                        sinks.append(self.open_sink(self.preview_path, preview_size, self.preview_codec))
+
+                with profile('encode', 1):
+                    sinks[0].write(frame)
+                    if preview_size is not None:
+                        sinks[1].write(cv2.resize(frame, preview_size, interpolation=cv2.INTER_AREA))
+
+        except BaseException as e:
+            self.error = e
+            # Keep draining so the producer never blocks on a writer that is gone
+            while self.frames.get() is not None:
+                pass
+        finally:
+            for sink in sinks:
+                try:
+                    sink.release()
+                except BaseException as e:
+                    self.error = self.error or e
+
+    def write(self, frame):
+        if self.closed:
+            raise ValueError("write() on a closed VideoWriter")
+        if self.error is not None:
+            raise IOError(f"Encoding {self.path} failed: {self.error}") from self.error
+
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.encode, name="video-writer", daemon=True)
+            self.thread.start()
+
+        self.frames.put(frame)
+        self.frame_count += 1
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+
+        if self.thread is not None:
+            self.frames.put(None)
+            self.thread.join()
+
+        if self.error is not None:
+            raise IOError(f"Encoding {self.path} failed: {self.error}") from self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -1 +1,2 @@
-from .view_transformer import ViewTransformer
\ No newline at end of file
+from .view_transformer import ViewTransformer
+from .court_roi import CourtROI
\ No newline at end of file
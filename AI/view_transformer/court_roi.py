@@ -0,0 +1,84 @@
+import numpy as np
+import cv2
+
+# Fill value outside the court in mask mode, the same gray YOLO letterboxes with
+MASK_COLOR = (114, 114, 114)
+
+
+class CourtROI:
+    # Region of the frame the detector has to look at: the court polygon moved with the camera,
+    # stretched up by player_height so players on the far side keep their heads, plus margin pixels
+    # mode 'crop' crops the frame to the bounding box of that region,
+    # mode 'mask' also grays out everything outside the region (crowd, benches, scoreboard)
+    def __init__(self, pixel_vertices, margin=60, player_height=220, mode='crop', min_area_fraction=0.05):
+        if mode not in ('crop', 'mask'):
+            raise ValueError(f"Unknown court ROI mode '{mode}', use 'crop' or 'mask'")
+
+        self.pixel_vertices = np.asarray(pixel_vertices, dtype=np.float64).reshape(-1, 2)
+        self.margin = margin
+        self.player_height = player_height
+        self.mode = mode
+        self.min_area_fraction = min_area_fraction
+
+        self.polygon = self.get_region_polygon(self.pixel_vertices)
+        self.reset()
+
+    def get_cache_params(self):
+        return {'pixel_vertices': self.pixel_vertices.tolist(), 'margin': self.margin,
+                'player_height': self.player_height, 'mode': self.mode}
+
+    def get_region_polygon(self, vertices):
+        # Convex hull of the court and the court moved up by player_height, grown by margin from the center
+        stretched = np.vstack([vertices, vertices - [0, self.player_height]])
+        hull = cv2.convexHull(stretched.astype(np.float32)).reshape(-1, 2).astype(np.float64)
+        center = hull.mean(axis=0)
+        directions = hull - center
+        lengths = np.linalg.norm(directions, axis=1, keepdims=True)
+        return hull + directions / np.maximum(lengths, 1e-6) * self.margin
+
+    def reset(self):
+        # Offset of the court in every frame so far, from the summed camera movement
+        self.offsets = []
+
+    def set_camera_movement(self, camera_movement):
+        # camera_movement[f] is the (old - new) shift of frame f, so the court is at vertices - sum of the shifts
+        # Can be called again with a longer list while streaming, only the new frames are added
+        for movement in camera_movement[len(self.offsets):]:
+            last = self.offsets[-1] if self.offsets else np.zeros(2)
+            self.offsets.append(last + np.asarray(movement, dtype=np.float64))
+
+    def get_offset(self, frame_num):
+        # Frames the camera movement isn't known for yet use the last known offset
+        if not self.offsets:
+            return np.zeros(2)
+        return self.offsets[min(frame_num, len(self.offsets) - 1)]
+
+    def get_region(self, frame_num, frame_shape):
+        # (x1, y1, x2, y2) of the crop in frame pixels, the whole frame when the court is out of view
+        height, width = frame_shape[:2]
+        polygon = self.polygon - self.get_offset(frame_num)
+
+        x1, y1 = np.floor(polygon.min(axis=0)).astype(int)
+        x2, y2 = np.ceil(polygon.max(axis=0)).astype(int)
+        x1, x2 = max(x1, 0), min(x2, width)
+        y1, y2 = max(y1, 0), min(y2, height)
+
+        if x2 <= x1 or y2 <= y1 or (x2 - x1) * (y2 - y1) < self.min_area_fraction * width * height:
+            return 0, 0, width, height
+        return int(x1), int(y1), int(x2), int(y2)
+
+    def apply(self, frame, frame_num):
+        # Returns (frame for the detector, (x, y) of its top left corner in the full frame)
+        x1, y1, x2, y2 = self.get_region(frame_num, frame.shape)
+        roi_frame = frame[y1:y2, x1:x2]
+
+        if self.mode == 'mask':
+            # Copy, the original frame is still drawn on later
+            polygon = self.polygon - self.get_offset(frame_num) - [x1, y1]
+            mask = np.zeros(roi_frame.shape[:2], dtype=np.uint8)
+            cv2.fillPoly(mask, [np.round(polygon).astype(np.int32)], 1)
+            roi_frame = np.where(mask[:, :, None] == 1, roi_frame, np.array(MASK_COLOR, dtype=roi_frame.dtype))
+        else:
+            roi_frame = np.ascontiguousarray(roi_frame)
+
+        return roi_frame, (x1, y1)
@@ -1,5 +1,9 @@
 import numpy as np 
 import cv2
+import sys
+sys.path.append('../')
+from track_store import TrackStore
+from .court_roi import CourtROI
 
 class ViewTransformer():
     def __init__(self):
@@ -23,6 +27,13 @@ class ViewTransformer():
 
         self.persepctive_trasnformer = cv2.getPerspectiveTransform(self.pixel_vertices, self.target_vertices)
 
+    def get_cache_params(self):
+        return {'pixel_vertices': self.pixel_vertices.tolist(), 'target_vertices': self.target_vertices.tolist()}
+
+    def get_court_roi(self, **kwargs):
+        # Detection region around the court, see CourtROI for the options
+        return CourtROI(self.pixel_vertices, **kwargs)
+
     def transform_point(self,point):
         p = (int(point[0]),int(point[1]))
         is_inside = cv2.pointPolygonTest(self.pixel_vertices,p,False) >= 0 
@@ -33,7 +44,58 @@ class ViewTransformer():
         tranform_point = cv2.perspectiveTransform(reshaped_point,self.persepctive_trasnformer)
         return tranform_point.reshape(-1,2)
 
+    def is_inside_court(self, points):
+        # Vectorized version of the pointPolygonTest in transform_point, points on the edge count as inside
+        # The court polygon is convex, so a point is inside when it is on the same side of every edge
+        points = np.trunc(np.asarray(points, dtype=np.float64).reshape(-1, 2))
+        vertices = self.pixel_vertices.astype(np.float64)
+        edges = np.roll(vertices, -1, axis=0) - vertices
+
+        to_points = points[:, None, :] - vertices[None, :, :]
+        cross = edges[None, :, 0] * to_points[:, :, 1] - edges[None, :, 1] * to_points[:, :, 0]
+
+        # NaN points compare False on both sides and end up outside
+        return np.all(cross >= 0, axis=1) | np.all(cross <= 0, axis=1)
+
+    def transform_points(self, points):
+        # Batch version of transform_point for an (N, 2) array, points outside the court are NaN
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        transformed_points = np.full(points.shape, np.nan)
+
+        is_inside = self.is_inside_court(points)
+        if is_inside.any():
+            inside_points = points[is_inside].astype(np.float32).reshape(-1, 1, 2)
+            transformed_points[is_inside] = cv2.perspectiveTransform(inside_points, self.persepctive_trasnformer).reshape(-1, 2)
+
+        return transformed_points
+
     def add_transformed_position_to_tracks(self,tracks):
+        if isinstance(tracks, TrackStore):
+            for table in tracks.tables.values():
+                table.set_column('position_transformed', self.transform_points(table.column('position_adjusted')))
+            return
+
+        # Gather the positions of the whole video, project them in one call and write them back
+        entries = []
+        positions = []
+        for object, object_tracks in tracks.items():
+            for frame_num, track in enumerate(object_tracks):
+                for track_id, track_info in track.items():
+                    entries.append(track_info)
+                    positions.append(track_info['position_adjusted'])
+
+        if not entries:
+            return
+
+        positions_transformed = self.transform_points(positions)
+        for track_info, position_transformed in zip(entries, positions_transformed):
+            if np.isnan(position_transformed[0]):
+                track_info['position_transformed'] = None
+            else:
+                track_info['position_transformed'] = position_transformed.tolist()
+
+    def add_transformed_position_to_tracks_per_point(self,tracks):
+        # Original one call per point version, kept for comparison in benchmarks/bench_view_transformer.py
         for object, object_tracks in tracks.items():
             for frame_num, track in enumerate(object_tracks):
                 for track_id, track_info in track.items():
@@ -42,4 +104,4 @@ class ViewTransformer():
                     position_trasnformed = self.transform_point(position)
                     if position_trasnformed is not None:
                         position_trasnformed = position_trasnformed.squeeze().tolist()
-                    tracks[object][frame_num][track_id]['position_transformed'] = position_trasnformed
\ No newline at end of file
+                    tracks[object][frame_num][track_id]['position_transformed'] = position_trasnformed
@@ -0,0 +1,624 @@
+# Job API for video analysis, standard library only, nothing external is needed to run or try it
+#   python API/api.py serve --model AI/models/basketbal_computer_vision.pt --workers 1 --port 8000
+#   python API/api.py submit AI/video/test_clip_3.mp4              queues a clip and follows its progress
+#   python API/api.py status [job id]
+#   python API/api.py cancel <job id>
+#
+# Jobs are queued onto a fixed pool of worker processes, every worker loads the model once and keeps it
+# for all of its jobs (like batch.py), so at most --workers clips are analyzed at the same time and at
+# most --max-queued wait behind them, more are refused with 429
+#
+#   POST   /jobs                  {"video": path, "name": ..., "mode": "streaming" | "pipelined" | "batch"}
+#   GET    /jobs                  all jobs
+#   GET    /jobs/<id>             state and progress: frames, total_frames, stage, fps
+#   GET    /jobs/<id>/events      the same as server-sent events, one per change until the job ends
+#   DELETE /jobs/<id>             cancel, a queued job is dropped, a running one stops at its next frame
+#   GET    /jobs/<id>/report      scouting report JSON, /report.pdf the PDF
+#   GET    /jobs/<id>/video       annotated video
+#   GET    /jobs/<id>/tracks      track file as a zip
+#   GET    /health                workers and queue
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import re
+import shutil
+import signal
+import sys
+import threading
+import time
+import traceback
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+import zipfile
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+AI_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'AI')
+MODES = ('streaming', 'pipelined', 'batch')
+FINAL_STATES = ('done', 'failed', 'cancelled')
+# Workers send at most one progress event per interval, a new stage is always sent
+PROGRESS_INTERVAL = 0.25
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def worker_main(worker_num, model_path, options, jobs, events, cancel, threads_per_worker):
+    # One worker process: the model is loaded once, then jobs run one after the other until None comes
+    # cancel holds the number of the job to stop, it is checked every time the job reports progress
+    os.chdir(AI_DIR)  # analyze_video finds the logo and the fonts relative to the AI folder
+    # Ctrl-C goes to the whole process group, the server decides what happens to the running jobs
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    sys.path.insert(0, AI_DIR)
+    if threads_per_worker:
+        for variable in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+            os.environ[variable] = str(threads_per_worker)
+        import cv2
+        cv2.setNumThreads(threads_per_worker)
+
+    tracker = None
+    error = None
+    try:
+        from trackers import Tracker
+        from view_transformer import ViewTransformer
+
+        court_roi = ViewTransformer().get_court_roi() if options['court_roi'] else None
+        tracker = Tracker(model_path, backend=options['backend'], keyframe_interval=options['keyframe_interval'],
+                          court_roi=court_roi)
+    except Exception as e:
+        # Every job of this worker fails with this error instead of the pool dying
+        error = f"Loading the model failed: {type(e).__name__}: {e}"
+    events.put(('ready', worker_num, None, {'pid': os.getpid(), 'error': error}))
+
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        if error is not None:
+            events.put(('finished', worker_num, job['id'], {'state': 'failed', 'error': error}))
+            continue
+        events.put(('finished', worker_num, job['id'], run_worker_job(worker_num, job, tracker, model_path, options,
+                                                                      events, cancel)))
+
+
+def run_worker_job(worker_num, job, tracker, model_path, options, events, cancel):
+    from main import analyze_video
+    from util import VideoReader
+
+    reader = VideoReader(job['video'])
+    total_frames = reader.frame_count
+    reader.release()
+    events.put(('started', worker_num, job['id'], {'total_frames': total_frames}))
+
+    last = {'stage': None, 'time': 0.0}
+
+    def progress(stage, frames):
+        if cancel.value == job['number']:
+            raise JobCancelled()
+        now = time.monotonic()
+        if stage != last['stage'] or now - last['time'] >= PROGRESS_INTERVAL:
+            last.update(stage=stage, time=now)
+            events.put(('progress', worker_num, job['id'], {'stage': stage, 'frames': frames}))
+
+    job_dir = job['dir']
+    try:
+        summary = analyze_video(job['video'], model_path,
+                                output_video_path=os.path.join(job_dir, 'analyzed.avi'),
+                                output_tracks_path=os.path.join(job_dir, 'analyzed.tracks'),
+                                output_report_dir=os.path.join(job_dir, 'reports'),
+                                streaming=job['mode'] == 'streaming', pipelined=job['mode'] == 'pipelined',
+                                tracker=tracker, cache_dir=options['cache_dir'], stats_url=job.get('stats_url'),
+                                database_path=options['database'], game_name=job['name'], progress=progress)
+    except BaseException as e:
+        # In pipelined mode the cancel comes back wrapped by the pipeline, the flag says what happened
+        if cancel.value == job['number']:
+            return {'state': 'cancelled'}
+        if not isinstance(e, Exception):
+            raise
+        return {'state': 'failed', 'error': f"{type(e).__name__}: {e}", 'traceback': traceback.format_exc()}
+
+    return {'state': 'done', 'frames': summary['frames'], 'seconds': summary['seconds'], 'fps': summary['fps']}
+
+
+class JobManager:
+    # Jobs in memory by id, workers started with start(), progress comes back over one events queue
+    # Every change bumps the job's version and wakes up whoever waits in wait_for_change
+    def __init__(self, model_path, jobs_dir='api_jobs', workers=1, max_queued=16, max_history=200, backend='auto',
+                 keyframe_interval=1, court_roi=False, cache_dir='cache', database=None):
+        self.model_path = os.path.abspath(model_path)
+        self.jobs_dir = os.path.abspath(jobs_dir)
+        self.max_queued = max_queued
+        self.max_history = max_history
+        self.options = {'backend': backend, 'keyframe_interval': keyframe_interval, 'court_roi': court_roi,
+                        'cache_dir': os.path.abspath(cache_dir) if cache_dir else None,
+                        'database': os.path.abspath(database) if database else None}
+        if keyframe_interval > 1:
+            # Streaming and pipelined jobs (the default) detect every frame, analyze_video warns per job too
+            print(f"Warning: keyframe_interval {keyframe_interval} is only used by jobs in batch mode")
+        self.number_of_workers = max(1, workers)
+        self.threads_per_worker = max(1, (os.cpu_count() or 1) // self.number_of_workers)
+
+        self.context = multiprocessing.get_context('spawn')  # see batch.py, forking after torch can hang
+        self.events = self.context.Queue()
+        self.workers = []
+        self.jobs = {}
+        self.queued = deque()
+        self.job_count = 0
+        self.condition = threading.Condition()
+        self.closing = False
+        self.collector = None
+
+    def start(self):
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        for worker_num in range(self.number_of_workers):
+            self.workers.append(self.start_worker(worker_num))
+        self.collector = threading.Thread(target=self.collect_events, name='job-events', daemon=True)
+        self.collector.start()
+        return self
+
+    def start_worker(self, worker_num):
+        jobs = self.context.Queue()
+        cancel = self.context.Value('q', -1, lock=False)
+        process = self.context.Process(target=worker_main, name=f'job-worker-{worker_num}', daemon=True,
+                                       args=(worker_num, self.model_path, self.options, jobs, self.events, cancel,
+                                             self.threads_per_worker))
+        process.start()
+        return {'num': worker_num, 'process': process, 'jobs': jobs, 'cancel': cancel, 'job': None,
+                'ready': False, 'error': None}
+
+    def close(self, timeout=10):
+        with self.condition:
+            self.closing = True
+            for job_id in list(self.queued):
+                self.update(self.jobs[job_id], state='cancelled', finished=time.time())
+            self.queued.clear()
+            for worker in self.workers:
+                if worker['job'] is not None:
+                    worker['cancel'].value = self.jobs[worker['job']]['number']
+                worker['jobs'].put(None)
+        for worker in self.workers:
+            worker['process'].join(timeout)
+            if worker['process'].is_alive():
+                worker['process'].terminate()
+        if self.collector is not None:
+            self.collector.join(timeout)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.close()
+
+    def submit(self, video, name=None, mode='streaming', stats_url=None):
+        if mode not in MODES:
+            raise ValueError(f"mode has to be one of {', '.join(MODES)}")
+        video = os.path.abspath(video)
+        if not os.path.isfile(video):
+            raise ValueError(f"{video} doesn't exist")
+
+        with self.condition:
+            if self.closing:
+                raise QueueFull("The server is shutting down")
+            if len(self.queued) >= self.max_queued:
+                raise QueueFull(f"{len(self.queued)} jobs are already waiting")
+            job_id = uuid.uuid4().hex[:12]
+            job = {'id': job_id, 'number': self.job_count, 'name': name or os.path.splitext(os.path.basename(video))[0],
+                   'video': video, 'mode': mode, 'stats_url': stats_url, 'dir': os.path.join(self.jobs_dir, job_id),
+                   'state': 'queued', 'stage': None, 'frames': 0, 'total_frames': None, 'fps': 0.0,
+                   'created': time.time(), 'started': None, 'finished': None, 'error': None, 'worker': None,
+                   'version': 0}
+            self.job_count += 1
+            self.jobs[job_id] = job
+            self.queued.append(job_id)
+            self.prune()
+            self.dispatch()
+            return self.get_view(job)
+
+    def cancel(self, job_id):
+        # Returns the job, None when there is no such job
+        with self.condition:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job['state'] == 'queued':
+                self.queued.remove(job_id)
+                self.update(job, state='cancelled', finished=time.time())
+            elif job['state'] == 'running':
+                # The worker stops at the next frame and answers with a 'finished' event
+                self.workers[job['worker']]['cancel'].value = job['number']
+                self.update(job, state='cancelling')
+            return self.get_view(job)
+
+    def dispatch(self):
+        # Hands queued jobs to idle workers, called with the condition held
+        for worker in self.workers:
+            if not self.queued:
+                return
+            if worker['ready'] and worker['job'] is None:
+                job = self.jobs[self.queued.popleft()]
+                os.makedirs(job['dir'], exist_ok=True)
+                worker['job'] = job['id']
+                self.update(job, state='running', worker=worker['num'], started=time.time(), stage='starting')
+                worker['jobs'].put({key: job[key] for key in ('id', 'number', 'name', 'video', 'mode', 'stats_url', 'dir')})
+
+    def collect_events(self):
+        while True:
+            try:
+                kind, worker_num, job_id, data = self.events.get(timeout=0.5)
+            except queue.Empty:
+                with self.condition:
+                    if self.closing and not any(worker['process'].is_alive() for worker in self.workers):
+                        return
+                    if not self.closing:
+                        self.check_workers()
+                continue
+            except (EOFError, OSError):
+                return
+
+            with self.condition:
+                worker = self.workers[worker_num]
+                job = self.jobs.get(job_id) if job_id is not None else None
+                if kind == 'ready':
+                    worker.update(ready=True, error=data['error'], pid=data['pid'])
+                    if data['error']:
+                        print(f"Warning: worker {worker_num}: {data['error']}")
+                elif job is None:
+                    pass
+                elif kind == 'started':
+                    self.update(job, total_frames=data['total_frames'], stage='read')
+                elif kind == 'progress':
+                    elapsed = time.time() - job['started']
+                    self.update(job, stage=data['stage'], frames=data['frames'],
+                                fps=data['frames'] / elapsed if elapsed > 0 else 0.0)
+                elif kind == 'finished':
+                    worker['job'] = None
+                    self.update(job, **data, stage=None, finished=time.time())
+                    if data['state'] == 'done':
+                        job['outputs'] = self.get_outputs(job)
+                    elif data['state'] == 'failed':
+                        print(f"Job {job_id} failed: {data['error']}")
+                if not self.closing:
+                    self.dispatch()
+
+    def check_workers(self):
+        # A worker that died (e.g. killed for running out of memory) fails its job and is started again
+        # One that died before it was ready would only die again, it stays down
+        for worker_num, worker in enumerate(self.workers):
+            if worker['process'].is_alive() or worker['error'] is not None:
+                continue
+            exit_code = worker['process'].exitcode
+            if worker['job'] is not None:
+                self.update(self.jobs[worker['job']], state='failed', stage=None, finished=time.time(),
+                            error=f"The worker process died (exit code {exit_code})")
+            if worker['ready']:
+                print(f"Warning: worker {worker_num} died (exit code {exit_code}), starting a new one")
+                self.workers[worker_num] = self.start_worker(worker_num)
+            else:
+                print(f"Warning: worker {worker_num} died while starting (exit code {exit_code})")
+                worker.update(job=None, error=f"The worker process died while starting (exit code {exit_code})")
+
+        if self.queued and all(worker['error'] is not None and not worker['process'].is_alive() for worker in self.workers):
+            for job_id in self.queued:
+                self.update(self.jobs[job_id], state='failed', finished=time.time(), error="No worker could start")
+            self.queued.clear()
+
+    def update(self, job, **values):
+        job.update(values)
+        job['version'] += 1
+        self.condition.notify_all()
+
+    def prune(self):
+        # Only the newest max_history finished jobs are kept in memory, their files stay in jobs_dir
+        finished = [job_id for job_id, job in self.jobs.items() if job['state'] in FINAL_STATES]
+        for job_id in finished[:max(0, len(finished) - self.max_history)]:
+            del self.jobs[job_id]
+
+    def get_outputs(self, job):
+        outputs = {
+            'report': os.path.join(job['dir'], 'reports', 'scouting_report.json'),
+            'report.pdf': os.path.join(job['dir'], 'reports', 'scouting_report.pdf'),
+            'video': os.path.join(job['dir'], 'analyzed.avi'),
+            'tracks': os.path.join(job['dir'], 'analyzed.tracks'),
+        }
+        return {name: path for name, path in outputs.items() if os.path.exists(path)}
+
+    def get_view(self, job):
+        # What clients see of a job
+        view = {key: job[key] for key in ('id', 'name', 'video', 'mode', 'state', 'stage', 'frames', 'total_frames',
+                                          'fps', 'created', 'started', 'finished', 'error')}
+        if job['state'] == 'queued':
+            view['position'] = self.queued.index(job['id']) + 1
+        if job['started'] is not None:
+            view['seconds'] = (job['finished'] or time.time()) - job['started']
+        view['outputs'] = sorted(job.get('outputs', {}))
+        return view
+
+    def get_job(self, job_id):
+        with self.condition:
+            job = self.jobs.get(job_id)
+            return self.get_view(job) if job is not None else None
+
+    def list_jobs(self):
+        with self.condition:
+            return [self.get_view(job) for job in self.jobs.values()]
+
+    def get_output_path(self, job_id, name):
+        with self.condition:
+            job = self.jobs.get(job_id)
+            return job.get('outputs', {}).get(name) if job is not None else None
+
+    def wait_for_change(self, job_id, version, timeout=None):
+        # (job, version) once the job is past version, or unchanged after timeout, (None, None) when it is gone
+        with self.condition:
+            self.condition.wait_for(lambda: job_id not in self.jobs or self.jobs[job_id]['version'] != version, timeout)
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None, None
+            return self.get_view(job), job['version']
+
+    def get_health(self):
+        with self.condition:
+            return {
+                'workers': [{'num': worker['num'], 'alive': worker['process'].is_alive(), 'ready': worker['ready'],
+                             'job': worker['job'], 'error': worker['error']} for worker in self.workers],
+                'running': sum(worker['job'] is not None for worker in self.workers),
+                'queued': len(self.queued),
+                'max_queued': self.max_queued,
+            }
+
+
+def make_handler(manager, keepalive=15.0):
+
+    class Handler(BaseHTTPRequestHandler):
+        # HTTP/1.0, the connection closes after every answer so the event stream and the zip need no length
+
+        def do_GET(self):
+            path = urllib.parse.urlparse(self.path).path.rstrip('/')
+            if path == '/health':
+                return self.send_json(200, manager.get_health())
+            if path == '/jobs':
+                return self.send_json(200, manager.list_jobs())
+
+            match = re.fullmatch(r'/jobs/(\w+)(?:/(events|report|report\.pdf|video|tracks))?', path)
+            if match is None:
+                return self.send_json(404, {'error': 'not found'})
+            job_id, what = match.groups()
+            job = manager.get_job(job_id)
+            if job is None:
+                return self.send_json(404, {'error': f"no job {job_id}"})
+            if what is None:
+                return self.send_json(200, job)
+            if what == 'events':
+                return self.send_events(job_id)
+
+            output_path = manager.get_output_path(job_id, what)
+            if output_path is None:
+                return self.send_json(409 if job['state'] not in FINAL_STATES else 404,
+                                      {'error': f"no {what} for a job that is {job['state']}"})
+            if what == 'tracks':
+                return self.send_zip(output_path, f"{job['name']}.tracks.zip")
+            content_types = {'report': 'application/json', 'report.pdf': 'application/pdf', 'video': 'video/x-msvideo'}
+            self.send_file(output_path, content_types[what])
+
+        def do_POST(self):
+            if urllib.parse.urlparse(self.path).path.rstrip('/') != '/jobs':
+                return self.send_json(404, {'error': 'not found'})
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+                job = manager.submit(body['video'], name=body.get('name'), mode=body.get('mode', 'streaming'),
+                                     stats_url=body.get('stats_url'))
+            except QueueFull as e:
+                return self.send_json(429, {'error': str(e)})
+            except (KeyError, TypeError, ValueError) as e:
+                return self.send_json(400, {'error': f"bad job: {e}"})
+            self.send_json(202, job)
+
+        def do_DELETE(self):
+            match = re.fullmatch(r'/jobs/(\w+)', urllib.parse.urlparse(self.path).path.rstrip('/'))
+            job = manager.cancel(match.group(1)) if match else None
+            if job is None:
+                return self.send_json(404, {'error': 'not found'})
+            self.send_json(202 if job['state'] == 'cancelling' else 200, job)
+
+        def send_json(self, status, data):
+            body = json.dumps(data, indent=4).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def send_file(self, path, content_type):
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(os.path.getsize(path)))
+            self.end_headers()
+            with open(path, 'rb') as f:
+                shutil.copyfileobj(f, self.wfile, 1024 * 1024)
+
+        def send_zip(self, path, file_name):
+            # Written straight to the socket, the track file is a folder of arrays and they are stored as they are
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/zip')
+            self.send_header('Content-Disposition', f'attachment; filename="{file_name}"')
+            self.end_headers()
+            with zipfile.ZipFile(self.wfile, 'w', zipfile.ZIP_STORED) as archive:
+                for root, _, files in os.walk(path):
+                    for name in sorted(files):
+                        archive.write(os.path.join(root, name), os.path.relpath(os.path.join(root, name), path))
+
+        def send_events(self, job_id):
+            # Server-sent events: "event: <state>" with the job as data on every change, comments keep the
+            # connection open while nothing changes, the stream ends with the job
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            version = None
+            try:
+                while True:
+                    job, new_version = manager.wait_for_change(job_id, version, timeout=keepalive)
+                    if job is None:
+                        break
+                    if new_version == version:
+                        self.wfile.write(b': keepalive\n\n')
+                    else:
+                        version = new_version
+                        self.wfile.write(f"event: {job['state']}\ndata: {json.dumps(job)}\n\n".encode('utf-8'))
+                    self.wfile.flush()
+                    if job['state'] in FINAL_STATES:
+                        break
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def serve(manager, host='127.0.0.1', port=8000):
+    # Blocks until Ctrl-C or SIGTERM, then cancels what is running and stops the workers
+    server = ThreadingHTTPServer((host, port), make_handler(manager))
+    server.daemon_threads = True
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt()
+    signal.signal(signal.SIGTERM, stop)  # stopped by a service manager, same as Ctrl-C
+    print(f"Serving on http://{server.server_address[0]}:{server.server_address[1]} with "
+          f"{manager.number_of_workers} workers, jobs in {manager.jobs_dir}")
+    with manager:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+
+class JobClient:
+    # Small client for the API, e.g. for scripts and for trying the server out locally
+    def __init__(self, base_url='http://127.0.0.1:8000', timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def request(self, method, path, data=None):
+        body = json.dumps(data).encode('utf-8') if data is not None else None
+        request = urllib.request.Request(self.base_url + path, data=body, method=method,
+                                         headers={'Content-Type': 'application/json'} if body else {})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            # The server explains the error in the body
+            message = json.loads(e.read() or b'{}').get('error', e.reason)
+            raise RuntimeError(f"{method} {path}: {e.code} {message}") from None
+
+    def submit(self, video, name=None, mode='streaming', stats_url=None):
+        return self.request('POST', '/jobs', {'video': os.path.abspath(video), 'name': name, 'mode': mode,
+                                              'stats_url': stats_url})
+
+    def get(self, job_id):
+        return self.request('GET', f'/jobs/{job_id}')
+
+    def list(self):
+        return self.request('GET', '/jobs')
+
+    def cancel(self, job_id):
+        return self.request('DELETE', f'/jobs/{job_id}')
+
+    def health(self):
+        return self.request('GET', '/health')
+
+    def events(self, job_id):
+        # Yields the job on every change until it ends
+        with urllib.request.urlopen(f"{self.base_url}/jobs/{job_id}/events", timeout=None) as response:
+            data = []
+            for line in response:
+                line = line.decode('utf-8').rstrip('\n')
+                if line.startswith('data: '):
+                    data.append(line[len('data: '):])
+                elif not line and data:
+                    yield json.loads('\n'.join(data))
+                    data = []
+
+    def wait(self, job_id, on_progress=None):
+        job = self.get(job_id)
+        for job in self.events(job_id):
+            if on_progress is not None:
+                on_progress(job)
+        return job
+
+    def download(self, job_id, what, path):
+        with urllib.request.urlopen(f"{self.base_url}/jobs/{job_id}/{what}", timeout=self.timeout) as response, \
+                open(path, 'wb') as f:
+            shutil.copyfileobj(response, f, 1024 * 1024)
+        return path
+
+
+def print_job(job):
+    total = f"/{job['total_frames']}" if job['total_frames'] else ''
+    stage = f" {job['stage']}" if job['stage'] else ''
+    error = f" {job['error']}" if job['error'] else ''
+    print(f"{job['id']} {job['name']}: {job['state']}{stage} {job['frames']}{total} frames, {job['fps']:.1f} fps{error}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Job API for video analysis")
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help="server for submit, status and cancel")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = commands.add_parser('serve', help="run the server")
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8000)
+    serve_parser.add_argument('--model', default=os.path.join(AI_DIR, 'models', 'basketbal_computer_vision.pt'))
+    serve_parser.add_argument('--jobs-dir', default='api_jobs', help="every job gets its output folder in here")
+    serve_parser.add_argument('--workers', type=int, default=1, help="clips analyzed at the same time")
+    serve_parser.add_argument('--max-queued', type=int, default=16, help="jobs that can wait for a worker")
+    serve_parser.add_argument('--backend', default='auto', help="auto, torch, onnx or openvino")
+    serve_parser.add_argument('--keyframe-interval', type=int, default=1, help="only used by jobs in batch mode")
+    serve_parser.add_argument('--court-roi', action='store_true')
+    serve_parser.add_argument('--cache-dir', default=os.path.join(AI_DIR, 'cache'))
+    serve_parser.add_argument('--database', help="also add every finished clip to this game database")
+
+    submit_parser = commands.add_parser('submit', help="queue a clip and follow it")
+    submit_parser.add_argument('video')
+    submit_parser.add_argument('--name')
+    submit_parser.add_argument('--mode', choices=MODES, default='streaming')
+    submit_parser.add_argument('--no-wait', action='store_true')
+
+    status_parser = commands.add_parser('status', help="one job or all of them")
+    status_parser.add_argument('job_id', nargs='?')
+
+    cancel_parser = commands.add_parser('cancel')
+    cancel_parser.add_argument('job_id')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        serve(JobManager(args.model, jobs_dir=args.jobs_dir, workers=args.workers, max_queued=args.max_queued,
+                         backend=args.backend, keyframe_interval=args.keyframe_interval, court_roi=args.court_roi,
+                         cache_dir=args.cache_dir, database=args.database),
+              host=args.host, port=args.port)
+    else:
+        client = JobClient(args.url)
+        if args.command == 'submit':
+            job = client.submit(args.video, name=args.name, mode=args.mode)
+            print_job(job)
+            if not args.no_wait:
+                job = client.wait(job['id'], on_progress=print_job)
+                if job['state'] != 'done':
+                    raise SystemExit(1)
+        elif args.command == 'status':
+            for job in [client.get(args.job_id)] if args.job_id else client.list():
+                print_job(job)
+        elif args.command == 'cancel':
+            print_job(client.cancel(args.job_id))
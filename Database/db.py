@@ -0,0 +1,435 @@
+# SQLite store for analyzed games: tracks, per frame positions/speeds, camera movement and reports
+# Every run can be added as a game, questions over many games are SQL queries instead of rerunning the pipeline
+#   db = GameDatabase('boltathletics.db')
+#   db.ingest_game('2025-04-07 houston-florida', tracks, fps=24, report=report, season='2024-25')
+#   db.get_track_frames('2025-04-07 houston-florida', track_id=7, start_time=60, end_time=90)
+#   db.get_season_player_stats('2024-25')
+# Positions are stored by (game, object, track_id, frame), so the frames of one player in a time range
+# are one index range scan; per track totals are computed when a game is added, so season level
+# aggregates only read the small tracks and reports tables
+import argparse
+import itertools
+import json
+import os
+import pickle
+import sqlite3
+import sys
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    season TEXT,
+    played_on TEXT,
+    video TEXT,
+    fps REAL NOT NULL,
+    num_frames INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS frames (
+    game_id INTEGER NOT NULL REFERENCES games(id) ON DELETE CASCADE,
+    frame INTEGER NOT NULL,
+    camera_dx REAL,
+    camera_dy REAL,
+    PRIMARY KEY (game_id, frame)
+) WITHOUT ROWID;
+
+-- One row per track with totals, filled when the game is added
+CREATE TABLE IF NOT EXISTS tracks (
+    game_id INTEGER NOT NULL REFERENCES games(id) ON DELETE CASCADE,
+    object TEXT NOT NULL,
+    track_id INTEGER NOT NULL,
+    team INTEGER,
+    first_frame INTEGER NOT NULL,
+    last_frame INTEGER NOT NULL,
+    frames INTEGER NOT NULL,
+    speed_count INTEGER NOT NULL,
+    speed_sum REAL NOT NULL,
+    max_speed REAL,
+    distance REAL NOT NULL,
+    PRIMARY KEY (game_id, object, track_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS positions (
+    game_id INTEGER NOT NULL REFERENCES games(id) ON DELETE CASCADE,
+    object TEXT NOT NULL,
+    track_id INTEGER NOT NULL,
+    frame INTEGER NOT NULL,
+    x1 REAL, y1 REAL, x2 REAL, y2 REAL,
+    court_x REAL,
+    court_y REAL,
+    speed REAL,
+    distance REAL,
+    team INTEGER,
+    PRIMARY KEY (game_id, object, track_id, frame)
+) WITHOUT ROWID;
+
+-- Everything in one frame, e.g. for drawing the court at a moment of the game
+CREATE INDEX IF NOT EXISTS positions_by_frame ON positions (game_id, frame);
+
+CREATE TABLE IF NOT EXISTS reports (
+    game_id INTEGER NOT NULL REFERENCES games(id) ON DELETE CASCADE,
+    player_id INTEGER NOT NULL,
+    team INTEGER,
+    average_speed REAL,
+    max_speed REAL,
+    speed_p90 REAL,
+    total_distance REAL,
+    frames_present INTEGER,
+    activity_level TEXT,
+    notes TEXT,
+    PRIMARY KEY (game_id, player_id)
+) WITHOUT ROWID;
+
+-- The whole report as it was written to scouting_report.json
+CREATE TABLE IF NOT EXISTS report_documents (
+    game_id INTEGER PRIMARY KEY REFERENCES games(id) ON DELETE CASCADE,
+    report TEXT NOT NULL
+);
+
+-- Which real player a track of a game is, track ids only mean something inside one game
+CREATE TABLE IF NOT EXISTS player_tracks (
+    game_id INTEGER NOT NULL REFERENCES games(id) ON DELETE CASCADE,
+    track_id INTEGER NOT NULL,
+    player TEXT NOT NULL,
+    PRIMARY KEY (game_id, track_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS player_tracks_by_player ON player_tracks (player);
+CREATE INDEX IF NOT EXISTS games_by_season ON games (season);
+"""
+
+POSITION_COLUMNS = ('game_id', 'object', 'track_id', 'frame', 'x1', 'y1', 'x2', 'y2',
+                    'court_x', 'court_y', 'speed', 'distance', 'team')
+
+
+class GameDatabase:
+    # batch_size: rows per executemany call while a game is added, all batches are one transaction
+    def __init__(self, path='boltathletics.db', batch_size=50000, timeout=30):
+        self.path = path
+        self.batch_size = batch_size
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # timeout: batch.py workers can add games at the same time, a writer waits for the others
+        self.connection = sqlite3.connect(path, timeout=timeout)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        self.connection.execute("PRAGMA temp_store=MEMORY")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # --- Adding games ---
+
+    def ingest_game(self, name, tracks, fps=24, camera_movement=None, report=None, video=None, season=None,
+                    played_on=None, replace=True):
+        # tracks is the tracks dict or a TrackStore, report the scouting report dict
+        # A game with the same name is replaced, returns the game id
+        start = time.perf_counter()
+        with self.connection:
+            if replace:
+                self.connection.execute("DELETE FROM games WHERE name = ?", (name,))
+            num_frames = max((len(object_tracks) for object_tracks in tracks.values()), default=0)
+            cursor = self.connection.execute(
+                "INSERT INTO games (name, season, played_on, video, fps, num_frames, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (name, season, played_on, video, fps, num_frames, time.time()))
+            game_id = cursor.lastrowid
+
+            rows = 0
+            summaries = []
+            for object in tracks:
+                object_rows = get_position_rows(game_id, object, tracks)
+                # Primary key order, SQLite appends to the b-tree instead of inserting all over it
+                object_rows.sort(key=lambda row: (row[2], row[3]))
+                self.insert_many("positions", POSITION_COLUMNS, object_rows)
+                summaries.extend(get_track_summaries(game_id, object, object_rows))
+                rows += len(object_rows)
+
+            self.insert_many("tracks", ('game_id', 'object', 'track_id', 'team', 'first_frame', 'last_frame', 'frames',
+                                        'speed_count', 'speed_sum', 'max_speed', 'distance'), summaries)
+
+            if camera_movement is not None:
+                self.insert_many("frames", ('game_id', 'frame', 'camera_dx', 'camera_dy'),
+                                 ((game_id, frame_num, float(dx), float(dy)) for frame_num, (dx, dy) in enumerate(camera_movement)))
+            else:
+                self.insert_many("frames", ('game_id', 'frame'), ((game_id, frame_num) for frame_num in range(num_frames)))
+
+            if report is not None:
+                self.insert_report(game_id, report)
+
+        print(f"Added game {name}: {num_frames} frames, {rows} positions in {time.perf_counter() - start:.2f}s")
+        return game_id
+
+    def insert_report(self, game_id, report):
+        self.connection.execute("DELETE FROM reports WHERE game_id = ?", (game_id,))
+        rows = []
+        for player_id, stats in report.items():
+            if player_id == "TEAM_AVERAGES":
+                continue
+            rows.append((game_id, int(player_id), stats.get("team"), stats.get("average_speed"), stats.get("max_speed"),
+                         stats.get("speed_p90"), stats.get("total_distance"), stats.get("frames_present"),
+                         stats.get("activity_level"), json.dumps(stats.get("notes", []))))
+        self.insert_many("reports", ('game_id', 'player_id', 'team', 'average_speed', 'max_speed', 'speed_p90',
+                                     'total_distance', 'frames_present', 'activity_level', 'notes'), rows)
+        self.connection.execute("INSERT OR REPLACE INTO report_documents (game_id, report) VALUES (?, ?)",
+                                (game_id, json.dumps({str(key): value for key, value in report.items()})))
+
+    def add_report(self, game, report):
+        with self.connection:
+            self.insert_report(self.get_game_id(game), report)
+
+    def insert_many(self, table, columns, rows):
+        # executemany in batches, so a generator of rows is never all in memory at once
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, self.batch_size))
+            if not batch:
+                break
+            self.connection.executemany(sql, batch)
+
+    def assign_player(self, game, track_id, player):
+        # Links a track of a game to a real player (name, jersey...), for the season queries
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO player_tracks (game_id, track_id, player) VALUES (?, ?, ?)",
+                                    (self.get_game_id(game), int(track_id), player))
+
+    def delete_game(self, game):
+        with self.connection:
+            self.connection.execute("DELETE FROM games WHERE id = ?", (self.get_game_id(game),))
+
+    # --- Queries ---
+
+    def get_game_id(self, game):
+        # Games can be passed by id or by name
+        if isinstance(game, int):
+            return game
+        row = self.connection.execute("SELECT id FROM games WHERE name = ?", (game,)).fetchone()
+        if row is None:
+            raise KeyError(f"No game named {game}")
+        return row['id']
+
+    def get_game(self, game):
+        row = self.connection.execute("SELECT * FROM games WHERE id = ?", (self.get_game_id(game),)).fetchone()
+        return dict(row) if row is not None else None
+
+    def list_games(self, season=None):
+        if season is None:
+            rows = self.connection.execute("SELECT * FROM games ORDER BY played_on, id")
+        else:
+            rows = self.connection.execute("SELECT * FROM games WHERE season = ? ORDER BY played_on, id", (season,))
+        return [dict(row) for row in rows]
+
+    def get_track_frames(self, game, track_id, start_time=None, end_time=None, object='players', columns=None):
+        # Rows of one track between start_time and end_time (seconds, inclusive), in frame order
+        game = self.get_game(game)
+        start_frame = int(start_time * game['fps']) if start_time is not None else 0
+        end_frame = int(end_time * game['fps']) if end_time is not None else game['num_frames']
+        columns = ', '.join(columns) if columns else '*'
+        rows = self.connection.execute(
+            f"SELECT {columns} FROM positions WHERE game_id = ? AND object = ? AND track_id = ? AND frame BETWEEN ? AND ? ORDER BY frame",
+            (game['id'], object, int(track_id), start_frame, end_frame))
+        return [dict(row) for row in rows]
+
+    def get_frame(self, game, frame):
+        # Every object in one frame
+        rows = self.connection.execute("SELECT * FROM positions INDEXED BY positions_by_frame WHERE game_id = ? AND frame = ? ORDER BY object, track_id",
+                                       (self.get_game_id(game), int(frame)))
+        return [dict(row) for row in rows]
+
+    def get_camera_movement(self, game):
+        rows = self.connection.execute("SELECT camera_dx, camera_dy FROM frames WHERE game_id = ? ORDER BY frame",
+                                       (self.get_game_id(game),))
+        return [[row['camera_dx'], row['camera_dy']] for row in rows]
+
+    def get_tracks_summary(self, game, object='players', min_frames=0):
+        rows = self.connection.execute(
+            "SELECT *, speed_sum / NULLIF(speed_count, 0) AS average_speed FROM tracks "
+            "WHERE game_id = ? AND object = ? AND frames >= ? ORDER BY track_id",
+            (self.get_game_id(game), object, min_frames))
+        return [dict(row) for row in rows]
+
+    def get_report(self, game):
+        # The report as it was added, None when the game has no report
+        row = self.connection.execute("SELECT report FROM report_documents WHERE game_id = ?", (self.get_game_id(game),)).fetchone()
+        return json.loads(row['report']) if row is not None else None
+
+    def get_player_games(self, player):
+        # Per game stats of one real player, from the report rows of its tracks
+        rows = self.connection.execute(
+            "SELECT g.name AS game, g.played_on, r.* FROM player_tracks p "
+            "JOIN games g ON g.id = p.game_id "
+            "JOIN reports r ON r.game_id = p.game_id AND r.player_id = p.track_id "
+            "WHERE p.player = ? ORDER BY g.played_on, g.id", (player,))
+        return [dict(row) for row in rows]
+
+    def get_season_player_stats(self, season=None, min_frames=0):
+        # Totals per real player over the season (or all games), from the per track totals
+        # Players without an assigned name are left out, their track ids differ from game to game
+        rows = self.connection.execute(
+            "SELECT p.player, COUNT(DISTINCT t.game_id) AS games, SUM(t.frames) AS frames, "
+            "SUM(t.distance) AS total_distance, SUM(t.speed_sum) / NULLIF(SUM(t.speed_count), 0) AS average_speed, "
+            "MAX(t.max_speed) AS max_speed, SUM(t.distance) / COUNT(DISTINCT t.game_id) AS distance_per_game "
+            "FROM player_tracks p "
+            "JOIN games g ON g.id = p.game_id "
+            "JOIN tracks t ON t.game_id = p.game_id AND t.object = 'players' AND t.track_id = p.track_id "
+            "WHERE (? IS NULL OR g.season = ?) AND t.frames >= ? "
+            "GROUP BY p.player ORDER BY total_distance DESC",
+            (season, season, min_frames))
+        return [dict(row) for row in rows]
+
+    def get_season_game_stats(self, season=None, min_frames=0):
+        # One row per game: players, team average speed and distance, top speed
+        rows = self.connection.execute(
+            "SELECT g.name AS game, g.played_on, COUNT(*) AS players, SUM(t.speed_sum) / NULLIF(SUM(t.speed_count), 0) AS average_speed, "
+            "AVG(t.distance) AS average_distance, MAX(t.max_speed) AS max_speed "
+            "FROM games g JOIN tracks t ON t.game_id = g.id AND t.object = 'players' "
+            "WHERE (? IS NULL OR g.season = ?) AND t.frames >= ? "
+            "GROUP BY g.id ORDER BY g.played_on, g.id",
+            (season, season, min_frames))
+        return [dict(row) for row in rows]
+
+    def query(self, sql, parameters=()):
+        # Anything else, rows as dicts
+        return [dict(row) for row in self.connection.execute(sql, parameters)]
+
+
+def get_position_rows(game_id, object, tracks):
+    # One tuple per detection in POSITION_COLUMNS order
+    # TrackStore tables are read by column, dict tracks one detection at a time
+    table = getattr(tracks, 'tables', {}).get(object)
+    if table is not None:
+        return get_table_rows(game_id, object, table)
+
+    rows = []
+    for frame_num, frame_tracks in enumerate(tracks[object]):
+        for track_id, track_info in frame_tracks.items():
+            bbox = track_info.get("bbox") or (None, None, None, None)
+            court = track_info.get("position_transformed")
+            court_x, court_y = (float(court[0]), float(court[1])) if court is not None else (None, None)
+            speed = track_info.get("speed")
+            distance = track_info.get("distance")
+            team = track_info.get("team")
+            rows.append((game_id, object, int(track_id), frame_num,
+                         *(float(value) if value is not None else None for value in bbox), court_x, court_y,
+                         float(speed) if speed is not None else None, float(distance) if distance is not None else None,
+                         int(team) if team is not None else None))
+    return rows
+
+
+def get_table_rows(game_id, object, table):
+    def column(name, index=None):
+        # Python values with None where the row has no value
+        values = table.column(name) if index is None else table.column(name)[:, index]
+        return [value if has else None for value, has in zip(values.tolist(), table.has_column(name).tolist())]
+
+    size = table.size
+    return list(zip([game_id] * size, [object] * size, table.track_id.tolist(), table.frame.tolist(),
+                    column('bbox', 0), column('bbox', 1), column('bbox', 2), column('bbox', 3),
+                    column('position_transformed', 0), column('position_transformed', 1),
+                    column('speed'), column('distance'), column('team')))
+
+
+def get_track_summaries(game_id, object, rows):
+    # rows sorted by (track_id, frame), one tracks row per track id
+    # 'distance' is cumulative per track, the total is the sum of its increases (it can start over)
+    summaries = []
+    for track_id, track_rows in itertools.groupby(rows, key=lambda row: row[2]):
+        track_rows = list(track_rows)
+        speeds = [row[10] for row in track_rows if row[10] is not None]
+        distance = 0.0
+        last_distance = None
+        for row in track_rows:
+            if row[11] is None:
+                continue
+            distance += row[11] - last_distance if last_distance is not None and row[11] >= last_distance else row[11]
+            last_distance = row[11]
+        teams = [row[12] for row in track_rows if row[12] is not None]
+        team = max(set(teams), key=teams.count) if teams else None
+        summaries.append((game_id, object, track_id, team, track_rows[0][3], track_rows[-1][3], len(track_rows),
+                          len(speeds), sum(speeds), max(speeds) if speeds else None, distance))
+    return summaries
+
+
+def load_tracks(path):
+    # Pickled tracks (stubs) or a track file folder written by track_store.save_track_file
+    if os.path.isdir(path):
+        sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'AI'))
+        from track_store import load_track_file
+        return load_track_file(path).to_track_store()
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+if __name__ == '__main__':
+    # python Database/db.py add AI/output_tracks/Bolt_atletics_analyzed.tracks --name "game 1" --report AI/output_reports/scouting_report.json
+    # python Database/db.py season --season 2024-25
+    parser = argparse.ArgumentParser(description="Game database")
+    parser.add_argument('--db', default='boltathletics.db')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    add = commands.add_parser('add', help="add a game from its tracks")
+    add.add_argument('tracks', help="pickled tracks or a .tracks folder")
+    add.add_argument('--name', required=True)
+    add.add_argument('--fps', type=float, default=24)
+    add.add_argument('--report', help="scouting_report.json of the game")
+    add.add_argument('--camera-movement', help="pickled camera movement per frame")
+    add.add_argument('--season')
+    add.add_argument('--played-on')
+    add.add_argument('--video')
+
+    games = commands.add_parser('games', help="list the games")
+    games.add_argument('--season')
+
+    season = commands.add_parser('season', help="per player totals over the season")
+    season.add_argument('--season')
+    season.add_argument('--min-frames', type=int, default=0)
+
+    track = commands.add_parser('track', help="frames of one track")
+    track.add_argument('game')
+    track.add_argument('track_id', type=int)
+    track.add_argument('--start', type=float)
+    track.add_argument('--end', type=float)
+
+    assign = commands.add_parser('assign', help="link a track of a game to a player")
+    assign.add_argument('game')
+    assign.add_argument('track_id', type=int)
+    assign.add_argument('player')
+
+    args = parser.parse_args()
+    with GameDatabase(args.db) as db:
+        if args.command == 'add':
+            report = None
+            if args.report:
+                with open(args.report) as f:
+                    report = json.load(f)
+            camera_movement = None
+            if args.camera_movement:
+                with open(args.camera_movement, 'rb') as f:
+                    camera_movement = pickle.load(f)
+            db.ingest_game(args.name, load_tracks(args.tracks), fps=args.fps, camera_movement=camera_movement,
+                           report=report, video=args.video, season=args.season, played_on=args.played_on)
+        elif args.command == 'games':
+            for game in db.list_games(args.season):
+                print(f"{game['id']:>4}  {game['name']}  {game['played_on'] or '-'}  {game['num_frames']} frames")
+        elif args.command == 'season':
+            for row in db.get_season_player_stats(args.season, args.min_frames):
+                print(f"{row['player']:<24} {row['games']:>3} games  {row['total_distance']:>8.1f} m  "
+                      f"{row['average_speed'] or 0:>5.2f} km/h average  {row['max_speed'] or 0:>5.2f} km/h top")
+        elif args.command == 'track':
+            for row in db.get_track_frames(args.game, args.track_id, args.start, args.end):
+                print(row)
+        elif args.command == 'assign':
+            db.assign_player(args.game, args.track_id, args.player)